@@ -0,0 +1,241 @@
+"""
+Chạy pipeline không cần Streamlit (cron / systemd / server không màn hình).
+
+VD:
+    python cli.py Du_An_1 Du_An_2 --steps 2,3 --threads 4 --tabs 2
+    python cli.py --all --summary workspace/last_run.json
+
+Log chạy in ra stderr, tổng kết JSON in ra stdout.
+Mã thoát: 0 = mọi file thành công, 1 = có file lỗi / còn thiếu (Step 2 thiếu dòng = "partial"), 2 = sai tham số.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import contextlib
+
+from config.settings import WORKSPACE, PROFILES_DIR, MAX_TABS_PER_PROFILE, LEAN_MODE, CAPTURE_FROM_BROWSER, PACING_PROFILES, get_project_structure
+from config.selectors import GEMINI_CONFIG, VISUAL_CONFIGS
+from services.batch_scheduler import PromptBatchScheduler, VisualBatchScheduler
+from services.transcribe_service import list_audio_files, srt_output_path, transcribe_audio
+from services.merge_service import render_final_video
+from utils.helpers import get_projects
+from utils.profiles_setup import get_available_profiles
+from utils.driver_pool import DRIVER_POOL
+from utils.pacing import get_pacing_profile, set_pacing_profile
+from utils.prompt_journal import journal_path_for
+from utils.progress import ThrottledListener, describe
+
+STEPS = (1, 2, 3, 4)
+# Trạng thái gộp: file / bước / dự án lấy trạng thái tệ nhất của các phần con
+STATUS_RANK = {"skipped": 0, "success": 0, "partial": 1, "failed": 2}
+STATUS_ICONS = {"success": "✅", "skipped": "✅", "partial": "⚠️"}
+
+# ==========================================
+# 1. THAM SỐ DÒNG LỆNH
+# ==========================================
+def parse_steps(value):
+    """"1,2,3" / "2-4" -> (1, 2, 3) / (2, 3, 4)"""
+    steps = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part: continue
+        try:
+            if "-" in part:
+                a, b = part.split("-", 1)
+                steps.update(range(int(a), int(b) + 1))
+            else:
+                steps.add(int(part))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Bước không hợp lệ: {part}")
+    if not steps or not steps.issubset(STEPS):
+        raise argparse.ArgumentTypeError(f"Chỉ có các bước {STEPS}")
+    return tuple(sorted(steps))
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Chạy Step 1-4 cho 1 hoặc nhiều dự án trong WORKSPACE (không cần Streamlit).")
+    parser.add_argument("projects", nargs="*", help="Tên dự án (folder trong WORKSPACE)")
+    parser.add_argument("--all", action="store_true", help="Chạy mọi dự án trong WORKSPACE")
+    parser.add_argument("--steps", type=parse_steps, default=STEPS, help="VD: 1,2,3,4 hoặc 2-3 (mặc định: tất cả)")
+    parser.add_argument("--profiles", nargs="+", help="Tên file profile (.json) trong PROFILES_DIR (mặc định: tất cả)")
+    parser.add_argument("--threads", type=int, help="Số profile chạy song song (mặc định: số profile)")
+    parser.add_argument("--tabs", type=int, default=1, help=f"Số tab / profile (1-{MAX_TABS_PER_PROFILE})")
+    parser.add_argument("--force", action="store_true", help="Step 1/2: chạy lại cả file đã có kết quả (Step 2: bỏ nhật ký + cache, gửi lại Gemini mọi dòng)")
+    # Step 2
+    parser.add_argument("--chunk-size", type=int, help="Step 2: cố định N dòng / chunk (bỏ trống = tự điều chỉnh theo số ký tự)")
+    parser.add_argument("--reuse-chat", action="store_true", help="Step 2: giữ hội thoại Gemini giữa các chunk")
+    parser.add_argument("--max-turns", type=int, default=GEMINI_CONFIG["MAX_TURNS_PER_CHAT"], help="Step 2: số lượt / chat khi giữ hội thoại")
+    # Step 3
+    parser.add_argument("--engine", choices=["flow", "google_veo"], default="flow", help="Step 3: model vẽ ảnh")
+    parser.add_argument("--depth", type=int, default=VISUAL_CONFIGS["flow"]["PIPELINE_DEPTH"], help="Step 3 (Flow): số prompt gửi trước")
+    parser.add_argument("--capture", action=argparse.BooleanOptionalAction, default=CAPTURE_FROM_BROWSER, help="Step 3: lấy ảnh từ trình duyệt thay vì tải lại")
+    # Chung
+    parser.add_argument("--no-lean", dest="lean", action="store_false", default=LEAN_MODE, help="Không chặn ảnh/font/analytics")
+    parser.add_argument("--pacing", choices=list(PACING_PROFILES), default=get_pacing_profile(), help="Nhịp thao tác")
+    parser.add_argument("--summary", help="Ghi thêm tổng kết JSON ra file này")
+    return parser
+
+def resolve_profiles(args, parser):
+    """Tên profile -> đường dẫn (giống Sidebar: PROFILES_DIR/<tên>.json)"""
+    available = get_available_profiles()
+    names = args.profiles or available
+    missing = [n for n in names if n not in available]
+    if missing:
+        parser.error(f"Không tìm thấy profile: {', '.join(missing)}")
+    return [os.path.join(PROFILES_DIR, n) for n in names]
+
+# ==========================================
+# 2. TỪNG BƯỚC (GỌI ĐÚNG SERVICE CỦA GIAO DIỆN)
+# ==========================================
+def run_step1(paths, args):
+    results = []
+    for audio in list_audio_files(paths["0_audio_raw"]):
+        name = os.path.basename(audio)
+        if not args.force and os.path.exists(srt_output_path(audio, paths["1_input"])):
+            results.append({"file": name, "status": "skipped", "msg": "Đã có SRT"})
+            continue
+        try:
+            out = transcribe_audio(audio, paths["1_input"])
+            results.append({"file": name, "status": "success", "msg": os.path.basename(out)})
+        except Exception as e:
+            results.append({"file": name, "status": "failed", "msg": str(e)})
+    return results
+
+def run_step2(paths, args, profile_paths):
+    files, results = [], []
+    for path in sorted(glob.glob(os.path.join(paths["1_input"], "*.srt"))):
+        name = os.path.basename(path)
+        output = os.path.join(paths["2_prompts"], f"{os.path.splitext(name)[0]}_prompts.json")
+        # Còn nhật ký = lần trước chạy dở -> chạy tiếp phần còn thiếu
+        if not args.force and os.path.exists(output) and not os.path.exists(journal_path_for(output)):
+            results.append({"file": name, "status": "skipped", "msg": "Đã có prompts"})
+            continue
+        files.append({"name": name, "path": path})
+    if not files: return results, {}
+
+    scheduler = PromptBatchScheduler(
+        files, profile_paths, paths["2_prompts"],
+        chunk_size=args.chunk_size,
+        gemini_url=GEMINI_CONFIG["URL"],
+        reuse_conversation=args.reuse_chat,
+        max_turns_per_chat=args.max_turns,
+        tabs_per_profile=args.tabs,
+        lean_mode=args.lean,
+        force=args.force,
+        max_workers=args.threads,
+        driver_pool=DRIVER_POOL
+    )
+    results.extend(_collect(_watch(scheduler).run(), ("file", "status", "profile", "msg")))
+    return results, {"pacing": scheduler.pacing_summary()}
+
+def run_step3(paths, args, profile_paths):
+    files = [{"name": os.path.basename(p), "path": p} for p in sorted(glob.glob(os.path.join(paths["2_prompts"], "*.json")))]
+    if not files: return [], {}
+
+    scheduler = VisualBatchScheduler(
+        files, profile_paths, paths["3_assets"],
+        engine=args.engine,
+        capture_in_browser=args.capture,
+        pipeline_depth=args.depth,
+        tabs_per_profile=args.tabs if args.engine == "flow" else 1,
+        lean_mode=args.lean,
+        max_workers=args.threads,
+        driver_pool=DRIVER_POOL
+    )
+    results = _collect(_watch(scheduler).run(), ("file", "status", "profile", "msg"))
+    return results, {"pacing": scheduler.pacing_summary(), "image_store": scheduler.image_summary()}
+
+def run_step4(paths, args):
+    try:
+        out = render_final_video(os.path.join(paths["4_final"], "final_video.mp4"))
+        return [{"file": os.path.basename(out), "status": "success", "msg": out}]
+    except Exception as e:
+        return [{"file": "final_video.mp4", "status": "failed", "msg": str(e)}]
+
+def _watch(scheduler):
+    """In tiến độ trong file ra stderr (mỗi file tối đa 1 dòng / 15 giây)"""
+    scheduler.progress.subscribe(ThrottledListener(lambda snap: print(f"[Progress] {snap['file']}: {describe(snap)}"), interval=15))
+    return scheduler
+
+def _collect(results, keys):
+    """Kết quả scheduler -> chỉ giữ các trường cần cho tổng kết, log từng file ra stderr"""
+    out = []
+    for data in results:
+        icon = STATUS_ICONS.get(data["status"], "❌")
+        print(f"[CLI] {icon} {data['file']} ({data.get('profile', '-')}) - {data['msg']}")
+        out.append({k: data.get(k) for k in keys})
+    return out
+
+# ==========================================
+# 3. CHẠY CẢ PIPELINE
+# ==========================================
+def worst_status(statuses):
+    """Trạng thái tệ nhất (failed > partial > success, skipped tính là success). Rỗng -> success"""
+    worst = max(statuses, key=lambda s: STATUS_RANK.get(s, 2), default="success")
+    return worst if STATUS_RANK.get(worst, 2) else "success"
+
+def run_project(project, args, profile_paths):
+    paths = get_project_structure(project)
+    summary = {"project": project, "steps": {}}
+    for step in args.steps:
+        print(f"[CLI] ▶️ {project}: Step {step}")
+        started = time.time()
+        extra = {}
+        if step in (2, 3) and not profile_paths:
+            results = [{"file": "-", "status": "failed", "msg": "Không có profile nào"}]
+        elif step == 1:
+            results = run_step1(paths, args)
+        elif step == 2:
+            results, extra = run_step2(paths, args, profile_paths)
+        elif step == 3:
+            results, extra = run_step3(paths, args, profile_paths)
+        else:
+            results = run_step4(paths, args)
+        summary["steps"][str(step)] = {
+            "status": worst_status([r["status"] for r in results]),
+            "seconds": round(time.time() - started, 1),
+            "files": results,
+            **{k: v for k, v in extra.items() if v},
+        }
+    summary["status"] = worst_status([s["status"] for s in summary["steps"].values()])
+    return summary
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    projects = get_projects() if args.all else args.projects
+    if not projects:
+        parser.error("Chưa chọn dự án (truyền tên dự án hoặc --all)")
+    unknown = [p for p in projects if not os.path.isdir(os.path.join(WORKSPACE, p))]
+    if unknown:
+        parser.error(f"Không có dự án trong WORKSPACE: {', '.join(unknown)}")
+    if not 1 <= args.tabs <= MAX_TABS_PER_PROFILE:
+        parser.error(f"--tabs phải trong khoảng 1-{MAX_TABS_PER_PROFILE}")
+    profile_paths = resolve_profiles(args, parser) if {2, 3} & set(args.steps) else []
+    set_pacing_profile(args.pacing)
+
+    started = time.time()
+    report = {"status": "success", "projects": []}
+    # Mọi print của service/scheduler -> stderr, stdout chỉ chứa JSON tổng kết
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            for project in projects:
+                report["projects"].append(run_project(project, args, profile_paths))
+        finally:
+            # Ctrl+C / lỗi giữa chừng -> tắt cả trình duyệt đang chạy, không để sót tiến trình
+            DRIVER_POOL.shutdown(include_busy=True)
+    report["status"] = worst_status([p["status"] for p in report["projects"]])
+    report["seconds"] = round(time.time() - started, 1)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 0 if report["status"] == "success" else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
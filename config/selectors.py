@@ -20,7 +20,14 @@ GEMINI_CONFIG = {
     # Google dùng thẻ custom <model-response> để bao quanh câu trả lời.
     # Đây là cách định danh chắc chắn nhất hiện nay.
     "RESPONSE_TEXT": "model-response",
-    "WAIT_TIME": 120
+    # Nút Dừng chỉ hiện khi AI đang viết -> còn nút này là chưa xong
+    "STOP_BUTTON": "button[aria-label*='Stop'], button[aria-label*='Dừng']",
+    # Câu trả lời không đổi trong bao nhiêu ms thì coi là viết xong
+    "QUIET_MS": 1500,
+    "WAIT_TIME": 120,
+
+    # 5. GIỮ HỘI THOẠI: số chunk tối đa gửi trong 1 chat trước khi mở chat mới
+    "MAX_TURNS_PER_CHAT": 8
 }
 
 VISUAL_CONFIGS = {
@@ -29,7 +36,11 @@ VISUAL_CONFIGS = {
         # Các selector bên dưới class đã tự xử lý bằng XPath rồi, 
         # nhưng cứ để RESULT_ELEMENT để quét ảnh/video
         "RESULT_ELEMENT": "img", 
-        "WAIT_TIME": 120
+        "WAIT_TIME": 120,
+        # Chế độ nối đuôi: gửi trước tối đa N prompt trong cùng 1 dự án (1 = tuần tự, chờ xong mới gửi tiếp)
+        "PIPELINE_DEPTH": 1,
+        # Số ảnh Flow trả về cho 1 prompt (ảnh thừa được bỏ qua khi ghép ảnh <-> prompt)
+        "OUTPUTS_PER_PROMPT": 1
     },
     "google_veo": {
         # Đây là link Google Gemini (chứa Imagen 3/Veo)
@@ -46,4 +57,16 @@ VISUAL_CONFIGS = {
         
         "WAIT_TIME": 120
     },
-}
\ No newline at end of file
+}
+
+# Thông báo giới hạn (regex, so trên text viết thường) -> profile bị cho nghỉ, việc chuyển profile khác
+LIMIT_PATTERNS = {
+    "quota": [
+        r"reached (your|the) (daily |usage )?limit", r"usage limit", r"quota", r"limit reached",
+        r"try again tomorrow", r"hết lượt", r"đạt (đến )?giới hạn", r"hạn mức",
+    ],
+    "rate_limit": [
+        r"too many requests", r"rate.?limit", r"unusual traffic", r"slow down",
+        r"quá nhiều (yêu cầu|lượt)", r"\b429\b",
+    ],
+}
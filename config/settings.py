@@ -33,6 +33,157 @@ PROFILES_DIR = os.path.join(ROOT_PATH, "profiles")
 # PATHS
 ORBITA_PATH = r"C:\Users\CLV_SEO\Documents\orbita-browser-141\chrome.exe"
 DRIVER_PATH = r"C:\Users\CLV_SEO\Documents\orbita-browser-141\chromedriver.exe"
+
+# =========================================================
+# [DRIVER POOL] GIỮ TRÌNH DUYỆT "ẤM" GIỮA CÁC FILE
+# =========================================================
+# Mỗi driver chạy tối đa N việc (1 chunk Step 2 / 1 cảnh Step 3) rồi tắt để mở lại bản mới (tránh Chrome phình RAM)
+# Scheduler đếm từng việc và thay driver ngay giữa lô, không đợi hết file
+DRIVER_POOL_MAX_TASKS = 200
+# Driver rảnh quá lâu (giây) sẽ bị tắt khi có người mượn lại
+DRIVER_POOL_IDLE_TIMEOUT = 15 * 60
+# Số tab tối đa mỗi profile (mỗi tab 1 hội thoại Gemini / 1 dự án Flow, chung 1 trình duyệt)
+MAX_TABS_PER_PROFILE = 4
+# Profile đang bận (VD: Step 2 và Step 3 cùng dùng) -> mở thêm bản sao tạm (chỉ chép trạng thái đăng nhập)
+PROFILE_CLONES_ENABLED = True
+MAX_CLONES_PER_PROFILE = 2
+CLONES_DIR = os.path.join(PROFILES_DIR, "_clones")
+# Bản sao bị bỏ lại (app crash...) quá bao lâu (giây) thì dọn
+CLONE_GC_AGE = 60 * 60
+
+# =========================================================
+# [CHUNK] CHIA SRT THEO SỐ KÝ TỰ (STEP 2)
+# =========================================================
+# Gom dòng tới khi đủ START ký tự. Gemini trả đủ -> +STEP, trả thiếu/lỗi -> giảm 1 nửa (trong khoảng MIN..MAX)
+CHUNK_BUDGET = {
+    "ADAPTIVE": True,   # False -> chia cố định theo Chunk Size như cũ
+    "START": 2500,
+    "MIN": 400,
+    "MAX": 10000,
+    "STEP": 500,
+    "MAX_LINES": 150,   # Trần số dòng / chunk (dòng rất ngắn)
+}
+
+# =========================================================
+# [CACHE] CÂU TRẢ LỜI GEMINI (STEP 2)
+# =========================================================
+# Chunk SRT giống hệt lần trước (cùng luật, cùng link Gem) -> lấy kết quả cũ, không gửi lại Gemini
+PROMPT_CACHE_ENABLED = True
+# Thư mục ẩn trong workspace (không hiện thành dự án)
+PROMPT_CACHE_DIR = os.path.join(WORKSPACE, ".cache", "prompts")
+# Vượt dung lượng này (MB) -> xóa các entry lâu không dùng nhất
+PROMPT_CACHE_MAX_MB = 200
+
+# =========================================================
+# [CACHE] KHO ẢNH THEO PROMPT (STEP 3)
+# =========================================================
+# Cảnh có prompt trùng (cùng engine) ở bất kỳ file/dự án nào -> lấy ảnh cũ bằng hardlink, không vẽ lại
+IMAGE_STORE_ENABLED = True
+IMAGE_STORE_DIR = os.path.join(WORKSPACE, ".cache", "images")
+# Vượt dung lượng này (MB) -> xóa ảnh lâu không dùng nhất trong kho
+IMAGE_STORE_MAX_MB = 2000
+
+# =========================================================
+# [QUEUE] HÀNG ĐỢI JOB (STEP 2 + STEP 3 CHẠY Ở worker.py)
+# =========================================================
+# Giao diện chỉ xếp job vào hàng đợi (SQLite), worker.py lấy task ra chạy -> đóng tab / khởi động lại không mất việc
+JOB_QUEUE_DB = os.path.join(WORKSPACE, ".queue", "jobs.sqlite3")
+# Worker giữ task bao lâu (giây) mà không báo còn sống -> task trả lại hàng đợi cho worker khác
+JOB_LEASE_SECONDS = 120
+# Số lần thử tối đa của 1 task (worker chết / lỗi giữa chừng) trước khi đánh dấu thất bại
+JOB_MAX_ATTEMPTS = 3
+# Hàng đợi rỗng -> worker hỏi lại sau N giây
+JOB_POLL_SECONDS = 5
+# Giao diện tự cập nhật tiến độ job mỗi N giây
+JOB_UI_REFRESH_SECONDS = 3
+# Task đang chạy mà không có sự kiện tiến độ nào quá N giây -> cảnh báo có thể bị treo
+JOB_STALL_SECONDS = 5 * 60
+
+# =========================================================
+# [DOWNLOAD] TẢI ẢNH NỀN (STEP 3)
+# =========================================================
+# Bật: trình duyệt gửi prompt tiếp ngay, ảnh được tải ở luồng nền
+DOWNLOAD_ASYNC = True
+# Số luồng tải song song cho mỗi profile
+DOWNLOAD_WORKERS = 4
+# Sau bao lâu (giây) thì chép lại Cookies từ trình duyệt (401/403 cũng ép chép lại)
+DOWNLOAD_COOKIE_TTL = 10 * 60
+# Lấy byte ảnh ngay trong trình duyệt (ảnh đã load sẵn) thay vì tải lại qua proxy.
+# Ảnh blob: luôn lấy theo cách này (requests không tải được blob:)
+CAPTURE_FROM_BROWSER = False
+
+# =========================================================
+# [LEAN] CHẶN TÀI NGUYÊN THỪA (TIẾT KIỆM PROXY)
+# =========================================================
+# Bật: chặn font, analytics... qua DevTools (Network.setBlockedURLs) -> ít byte qua proxy, load trang nhanh hơn
+LEAN_MODE = True
+# Loại tài nguyên -> mẫu URL (setBlockedURLs chỉ nhận mẫu URL có dấu *)
+LEAN_RESOURCE_PATTERNS = {
+    "Image": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*googleusercontent.com/*"],
+    "Font":  ["*.woff2", "*.woff", "*.ttf", "*.otf", "*fonts.googleapis.com/*", "*fonts.gstatic.com/*"],
+    "Media": ["*.mp4", "*.webm", "*.mp3", "*.m4a"],
+}
+# Mẫu URL chặn chung (analytics / quảng cáo / log)
+LEAN_COMMON_URLS = [
+    "*google-analytics.com/*", "*googletagmanager.com/*", "*doubleclick.net/*",
+    "*play.google.com/log*", "*/gen_204*", "*/csi?*",
+]
+# Blocklist theo loại task
+LEAN_BLOCKLISTS = {
+    # Step 2: chỉ cần chữ -> chặn cả ảnh, video
+    "text":   {"urls": LEAN_COMMON_URLS, "types": ["Image", "Font", "Media"]},
+    # Step 3: PHẢI giữ ảnh/video kết quả -> chỉ chặn font + analytics
+    "visual": {"urls": LEAN_COMMON_URLS, "types": ["Font"]},
+}
+
+# =========================================================
+# [PACING] NHỊP THAO TÁC TRÊN TRANG (thay cho sleep cố định)
+# =========================================================
+# Mỗi action: delay = chờ cố định sau thao tác, gap = cách nhau tối thiểu giữa 2 lần (theo profile),
+# jitter = cộng ngẫu nhiên 0..jitter giây. Nhanh hơn = dễ bị chặn hơn.
+PACING_PROFILES = {
+    # Giống nhịp cũ (mặc định)
+    "safe": {
+        "page_load": {"delay": 2, "jitter": 3},   # Sau khi vào trang / F5
+        "scroll":    {"delay": 1, "jitter": 1},   # Sau khi cuộn tới ô nhập
+        "click":     {"delay": 0.5},              # Sau click / xóa ô nhập
+        "menu":      {"delay": 1.5, "jitter": 0.5},  # Mở menu Tool / Model
+        "type":      {"delay": 2, "jitter": 1},   # Sau khi nhập prompt
+        "submit":    {"gap": 5, "jitter": 2},     # Giữa 2 lần gửi prompt
+        "poll":      {"delay": 2, "jitter": 1},   # Giữa 2 lần quét kết quả (dự phòng)
+        "retry":     {"delay": 2, "jitter": 2},   # Trước khi thử lại
+    },
+    "balanced": {
+        "page_load": {"delay": 1.5, "jitter": 1.5},
+        "scroll":    {"delay": 0.5, "jitter": 0.5},
+        "click":     {"delay": 0.3},
+        "menu":      {"delay": 1, "jitter": 0.5},
+        "type":      {"delay": 1, "jitter": 0.5},
+        "submit":    {"gap": 3, "jitter": 1},
+        "poll":      {"delay": 1.5, "jitter": 0.5},
+        "retry":     {"delay": 1.5, "jitter": 1},
+    },
+    "fast": {
+        "page_load": {"delay": 1, "jitter": 0.5},
+        "scroll":    {"delay": 0.2},
+        "click":     {"delay": 0.2},
+        "menu":      {"delay": 0.7},
+        "type":      {"delay": 0.3, "jitter": 0.3},
+        "submit":    {"gap": 1, "jitter": 0.5},
+        "poll":      {"delay": 1},
+        "retry":     {"delay": 1, "jitter": 0.5},
+    },
+}
+PACING_PROFILE = "safe"
+
+# =========================================================
+# [COOLDOWN] PROFILE DÍNH GIỚI HẠN
+# =========================================================
+# Trang báo hết quota / quá nhiều yêu cầu -> profile nghỉ bao lâu (giây), việc chuyển sang profile khác
+PROFILE_COOLDOWNS = {
+    "rate_limit": 10 * 60,
+    "quota": 6 * 60 * 60,
+}
 # =========================================================
 # 3. CẤU TRÚC DỰ ÁN (Project Structure)
 # =========================================================
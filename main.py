@@ -3,13 +3,15 @@ import os
 import time
 
 # 👇 Import cấu hình & Service mới tách
-from config.settings import PROJECT_NAME, WORKSPACE
+from config.settings import PROJECT_NAME, WORKSPACE, PACING_PROFILES
 from utils.helpers import get_projects 
 from utils.profiles_setup import (
     get_available_profiles, 
     save_uploaded_profile, 
     delete_profiles_data
 )
+from utils.pacing import get_pacing_profile, set_pacing_profile
+from utils.profile_health import PROFILE_HEALTH
 import views 
 
 st.set_page_config(page_title=PROJECT_NAME, layout="wide")
@@ -113,10 +115,22 @@ def main():
         
         count = len(st.session_state.selected_profiles)
         st.sidebar.caption(f"Đang chọn: **{count}** / {len(available)}")
+
+        # Profile dính quota / rate limit -> scheduler tự bỏ qua cho tới khi hết giờ nghỉ
+        # (lưu trong DB hàng đợi job -> thấy được profile do worker.py / cli.py cho nghỉ, Bỏ nghỉ áp dụng cho mọi worker)
+        cooling = PROFILE_HEALTH.cooling()
+        if cooling:
+            st.sidebar.warning("😴 Đang nghỉ:\n" + "\n".join(f"- {p}: {k}, còn {left / 60:.0f} phút" for p, (left, k) in cooling.items()))
+            st.sidebar.button("🔓 Bỏ nghỉ", on_click=PROFILE_HEALTH.clear, use_container_width=True)
         
     else:
         st.sidebar.info("Chưa có profile nào.")
 
+    # 3. Nhịp thao tác (nhanh hơn = dễ bị chặn hơn)
+    pacing_names = list(PACING_PROFILES)
+    pacing = st.sidebar.selectbox("🐢 Nhịp thao tác:", pacing_names, index=pacing_names.index(get_pacing_profile()))
+    set_pacing_profile(pacing)
+
     st.sidebar.markdown("---")
 
     # --- CONTENT ---
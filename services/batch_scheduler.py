@@ -0,0 +1,800 @@
+import os
+import json
+import queue
+import time
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import Future
+
+from config.selectors import GEMINI_CONFIG, VISUAL_CONFIGS
+from config.settings import CAPTURE_FROM_BROWSER, LEAN_MODE
+from services.prompt_generator import VisualPromptGenerator, load_srt_lines, serve_cached_lines, cache_chunk_result, match_items, ordered_items, item_index
+from services.visual_generator import VisualGenerator, load_scenes, scene_output_path
+from utils.prompt_journal import PromptJournal
+from utils.prompt_cache import PROMPT_CACHE
+from utils.image_store import IMAGE_STORE, image_key, link_or_copy
+from utils.driver_pool import DRIVER_POOL
+from utils.pacing import get_pacer, pacing_report
+from utils.srt_parser import attach_timings
+from utils.chunk_budget import ChunkBudget
+from utils.profile_health import ProfileLimited, PROFILE_HEALTH
+from utils.progress import ProgressTracker
+
+# ==========================================
+# CLASS CHA (BASE SCHEDULER)
+# ==========================================
+class BaseBatchScheduler:
+    """
+    Scheduler kiểu work-stealing:
+    - Cắt toàn bộ công việc thành task nhỏ, bỏ chung vào 1 hàng đợi.
+    - Mỗi profile = 1 luồng worker, rảnh là tự lấy task tiếp theo.
+    - run() là generator chạy ở luồng chính (Streamlit), trả kết quả từng file khi file đó xong.
+    """
+    MAX_REQUEUES = 3
+    def __init__(self, profile_paths, max_workers=None, driver_pool=DRIVER_POOL, status_callback=None, progress=None):
+        if max_workers: profile_paths = profile_paths[:max_workers]
+        self.profile_paths = profile_paths
+        self.driver_pool = driver_pool
+        self.status_callback = status_callback
+        # Tiến độ trong từng file (chunk / cảnh, lượt thử, tốc độ, ETA) -> subscribe để nhận sự kiện
+        self.progress = progress or ProgressTracker()
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._requeues = {}  # id(task) -> số lần bị trả lại hàng đợi do driver chết
+        self._inflight = 0   # task đã xong phần trình duyệt, đang chờ kết quả nền (VD: tải ảnh)
+        self._running = 0    # task đang nằm trong tay worker (có thể bị trả lại hàng đợi)
+        self._abandoned = set()  # tên file đã bị bỏ giữa chừng (VD: worker hết quyền thuê task) -> không chạy tiếp
+        self._sweeping = False   # hết worker, đang chốt thất bại các task còn sót (không còn ai chạy lại)
+        self.files = {}  # file_key -> state (do class con định nghĩa)
+
+    def _log(self, msg):
+        print(f"[Scheduler] {msg}")
+        if self.status_callback:
+            self.status_callback(f"[Scheduler] {msg}")
+
+    # --- Các hàm class con phải viết lại (Override) ---
+    def _prepare(self):
+        """Tạo self.files + đẩy task vào self._tasks"""
+        raise NotImplementedError
+
+    def _make_worker(self, profile_path):
+        """Tạo worker (đã mượn driver) cho 1 profile. Trả về None nếu không mở được."""
+        raise NotImplementedError
+
+    def _release_worker(self, worker):
+        raise NotImplementedError
+
+    def _run_task(self, worker, task):
+        """Chạy 1 task. Trả về (kết quả hoặc Future kết quả, driver_còn_sống)"""
+        raise NotImplementedError
+
+    def _revive_worker(self, worker):
+        """Driver chết sau 1 task -> thử mở lại. Mặc định: bỏ cuộc (worker tự hồi sinh bên trong)"""
+        return False
+
+    def _complete_task(self, task, result):
+        """Ghi nhận kết quả 1 task. Trả về dict kết quả file nếu file đó vừa xong, ngược lại None"""
+        raise NotImplementedError
+
+    def _label(self, task):
+        """Tên ngắn của task trong log / tiến độ"""
+        return str(task[1])
+
+    def _file_name(self, task):
+        # Mọi task đều bắt đầu bằng file_key (key của self.files)
+        return self.files[task[0]]["name"]
+
+    # --- Vòng lặp worker (mỗi profile 1 luồng) ---
+    def _worker_loop(self, profile_path):
+        profile_name = os.path.basename(profile_path)
+        worker = None
+        try:
+            cooldown = PROFILE_HEALTH.cooldown_left(os.path.splitext(profile_name)[0])
+            if cooldown > 0:
+                self._log(f"😴 {profile_name}: Đang nghỉ do bị giới hạn (còn {cooldown / 60:.0f} phút) -> Bỏ qua.")
+                return
+
+            worker = self._make_worker(profile_path)
+            if worker is None:
+                self._log(f"❌ {profile_name}: Không mở được trình duyệt -> Nhường task cho profile khác.")
+                return
+
+            self._drain(worker)
+        except Exception as e:
+            self._log(f"🔥 Worker {profile_name} lỗi: {e}")
+            traceback.print_exc()
+        finally:
+            if worker is not None:
+                self._release_worker(worker)
+
+    def _take_task(self, wait=False):
+        """
+        Lấy 1 task. wait=True: hàng đợi rỗng nhưng worker khác còn task đang chạy
+        -> chờ (task đó có thể bị trả lại do profile dính giới hạn / driver chết).
+        """
+        while True:
+            self._refill()
+            with self._lock:
+                try:
+                    task = self._tasks.get_nowait()
+                    if self._file_name(task) in self._abandoned: continue
+                    self._running += 1
+                    return task
+                except queue.Empty:
+                    if not wait or self._running == 0:
+                        return None
+            time.sleep(0.5)
+
+    def _wait_for_work(self):
+        """
+        Hàng đợi rỗng nhưng worker khác còn task đang chạy -> chờ (task đó có thể bị trả lại).
+        Trả về True nếu có task mới, False nếu đã hết việc hẳn.
+        """
+        while True:
+            self._refill()
+            with self._lock:
+                if not self._tasks.empty(): return True
+                if self._running == 0: return False
+            time.sleep(0.5)
+
+    def abandon(self, names):
+        """Bỏ các file này: task còn trong hàng đợi không chạy nữa, cũng không bị chốt thất bại"""
+        with self._lock: self._abandoned.update(names)
+        if names: self._log(f"🚫 Bỏ {len(names)} file: {', '.join(sorted(names))}")
+
+    def _refill(self):
+        """Hàng đợi cạn -> class con có thể tạo thêm task (VD: cắt chunk tiếp theo). Mặc định: không làm gì"""
+        pass
+
+    def _task_left_worker(self):
+        with self._lock: self._running -= 1
+
+    def _count_work(self, worker):
+        """1 chunk / cảnh vừa xong trên driver của worker. True = driver đã đủ DRIVER_POOL_MAX_TASKS việc, nên thay bản mới"""
+        driver = getattr(worker, "driver", None)
+        if driver is None or self.driver_pool is None: return False
+        return self.driver_pool.add_work(driver)
+
+    def _recycle_worker(self, worker):
+        """Driver đủ số việc -> tắt, mở bản mới ngay giữa lô (không đợi hết file) để Chrome không phình RAM"""
+        self._log(f"♻️ {worker.profile_name}: Trình duyệt đã chạy đủ {self.driver_pool.max_tasks_per_driver} việc -> Mở bản mới.")
+        return worker.revive()
+
+    def _on_limited(self, worker, tasks, err):
+        """Profile dính quota / rate limit -> cho nghỉ, trả task về hàng đợi cho profile khác (không tính lượt)"""
+        cooldown = PROFILE_HEALTH.mark_limited(worker.profile_name, err.kind)
+        self._log(f"🛑 {worker.profile_name}: {err.kind} -> Nghỉ {cooldown / 60:.0f} phút, chuyển {len(tasks)} task sang profile khác.")
+        for task in tasks:
+            self._task_left_worker()
+            self._tasks.put(task)
+
+    def _drain(self, worker):
+        """Worker lấy từng task trong hàng đợi cho tới khi hết việc (hoặc driver chết hẳn)"""
+        due = False  # driver đã đủ số việc -> thay bản mới trước task tiếp theo
+        while True:
+            if due:
+                # Hết việc thì thôi (trả về pool là tự tắt), còn việc mới mở trình duyệt mới
+                if not self._wait_for_work(): break
+                due = False
+                if not self._recycle_worker(worker): break
+            task = self._take_task(wait=True)
+            if task is None:
+                break
+
+            try:
+                result, alive = self._run_task(worker, task)
+            except ProfileLimited as e:
+                self._on_limited(worker, [task], e)
+                break
+            except Exception:
+                # Lỗi bất ngờ -> task phải rời tay worker này, nếu không các worker khác chờ mãi (_running không về 0)
+                self._requeue_or_fail(task)
+                raise
+            if not alive:
+                self._requeue_or_fail(task)
+                if not self._revive_worker(worker):
+                    break
+                continue
+            self._handle_result(task, result)
+            due = self._count_work(worker)
+
+    def _requeue_or_fail(self, task):
+        """Driver chết giữa chừng -> trả task lại hàng đợi (tối đa MAX_REQUEUES lần)"""
+        with self._lock:
+            self._running -= 1
+            requeues = self._requeues.get(id(task), 0) + 1
+            self._requeues[id(task)] = requeues
+        if requeues <= self.MAX_REQUEUES:
+            self.progress.attempt(self._file_name(task), self._label(task), requeues + 1)
+            self._tasks.put(task)
+        else:
+            file_result = self._complete_task(task, None)
+            if file_result: self._results.put(file_result)
+
+    def _handle_result(self, task, result):
+        self._task_left_worker()
+        if isinstance(result, Future):
+            # Phần nền (tải ảnh) chạy tiếp, worker lấy task mới luôn
+            with self._lock: self._inflight += 1
+            result.add_done_callback(lambda fut, task=task: self._finish_async(task, fut))
+            return
+        file_result = self._complete_task(task, result)
+        if file_result: self._results.put(file_result)
+
+    def _finish_async(self, task, fut):
+        try:
+            result = fut.result()
+        except Exception:
+            result = None
+        try:
+            file_result = self._complete_task(task, result)
+            if file_result: self._results.put(file_result)
+        finally:
+            with self._lock: self._inflight -= 1
+
+    def _next_leftover(self):
+        """Hết worker: lấy task còn sót để đánh dấu thất bại"""
+        self._refill()
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                return None
+            if self._file_name(task) not in self._abandoned: return task
+
+    def _has_inflight(self):
+        with self._lock: return self._inflight > 0
+
+    def _profile_names(self):
+        return [os.path.splitext(os.path.basename(p))[0] for p in self.profile_paths]
+
+    def pacing_summary(self):
+        """Thời gian đã chờ theo nhịp (pacing) của từng profile trong lần chạy này"""
+        return pacing_report(self._profile_names())
+
+    def run(self):
+        """Generator: yield dict kết quả của từng file ngay khi file đó hoàn tất"""
+        for name in self._profile_names():
+            get_pacer(name).reset_stats()
+
+        # File rỗng (không có task) được trả về ngay trong _prepare
+        for file_result in self._prepare() or []:
+            yield file_result
+
+        threads = []
+        if not self._tasks.empty():
+            for prof in self.profile_paths:
+                t = threading.Thread(target=self._worker_loop, args=(prof,), daemon=True)
+                t.start()
+                threads.append(t)
+
+        while True:
+            try:
+                yield self._results.get(timeout=0.5)
+                continue
+            except queue.Empty:
+                pass
+            if not any(t.is_alive() for t in threads) and not self._has_inflight() and self._results.empty():
+                break
+
+        # Không còn worker nào sống mà vẫn còn task -> đánh dấu thất bại để chốt file
+        cooling = [p for p in self._profile_names() if not PROFILE_HEALTH.is_healthy(p)]
+        if cooling and not self._tasks.empty():
+            self._log(f"😴 Còn {self._tasks.qsize()} task nhưng các profile đang nghỉ: {', '.join(cooling)}")
+        self._sweeping = True
+        while True:
+            task = self._next_leftover()
+            if task is None:
+                break
+            file_result = self._complete_task(task, None)
+            if file_result: yield file_result
+        # File được chốt hộ bởi task khác (VD: cảnh trùng prompt thất bại theo cảnh gốc)
+        while not self._results.empty():
+            yield self._results.get_nowait()
+
+        summary = self.pacing_summary()
+        if summary: self._log(f"⏱️ Thời gian chờ nhịp: {summary}")
+
+
+# ==========================================
+# SCHEDULER 1: STEP 2 - PROMPT THEO CHUNK
+# ==========================================
+class PromptBatchScheduler(BaseBatchScheduler):
+    """
+    Chia mọi file SRT đã chọn thành chunk, profile nào rảnh thì lấy chunk tiếp theo.
+    Chunk được cắt dần khi cần (ngân sách ký tự tự điều chỉnh theo câu trả lời của Gemini).
+    Kết quả được gộp lại theo từng file (sắp xếp theo `index`) rồi ghi _prompts.json.
+    """
+    def __init__(self, files, profile_paths, dir_output, chunk_size=20, gemini_url=GEMINI_CONFIG["URL"],
+                 reuse_conversation=False, max_turns_per_chat=GEMINI_CONFIG["MAX_TURNS_PER_CHAT"], tabs_per_profile=1,
+                 lean_mode=LEAN_MODE, prompt_cache=PROMPT_CACHE, force=False, **kwargs):
+        super().__init__(profile_paths, **kwargs)
+        self.input_files = files
+        self.dir_output = dir_output
+        # chunk_size = None -> chia theo số ký tự (tự điều chỉnh), N -> cố định N dòng
+        self.budget = ChunkBudget(chunk_size)
+        self._backlog = deque()  # [file_key, list dòng chưa gửi, vị trí đã cắt tới]
+        self.gemini_url = gemini_url
+        self.reuse_conversation = reuse_conversation
+        self.max_turns_per_chat = max_turns_per_chat
+        # Mỗi profile mở N tab Gemini (N hội thoại) -> tổng số luồng = profile x tab
+        self.tabs_per_profile = tabs_per_profile
+        # Chặn tài nguyên thừa (ảnh, font, analytics) -> ít byte qua proxy
+        self.lean_mode = lean_mode
+        # Cache câu trả lời theo nội dung chunk (dùng chung mọi dự án)
+        self.prompt_cache = prompt_cache
+        # force: bỏ nhật ký + không lấy từ cache -> gửi lại Gemini mọi dòng (kết quả mới vẫn ghi vào cache)
+        self.force = force
+
+    def _prepare(self):
+        done_now = []
+        for f_info in self.input_files:
+            base_name = os.path.splitext(f_info["name"])[0]
+            output_path = os.path.join(self.dir_output, f"{base_name}_prompts.json")
+            try:
+                cues, lines = load_srt_lines(f_info["path"])
+            except Exception as e:
+                done_now.append({"file": f_info["name"], "path": output_path, "status": "failed", "msg": str(e), "profile": "-"})
+                continue
+
+            # Nhật ký cạnh _prompts.json: dòng đã xong ở lần chạy trước không gửi lại
+            journal = PromptJournal(output_path)
+            if self.force: journal.remove()
+            pending = [line for line in lines if not journal.has_chunk([line])]
+            in_journal = len(lines) - len(pending)
+            # Dòng giống hệt lần trước (cache) -> ghi thẳng vào nhật ký, không gửi lại
+            if not self.force:
+                pending = serve_cached_lines(pending, journal, self.gemini_url, self.prompt_cache)
+            cached = len(lines) - in_journal - len(pending)
+
+            state = {
+                "name": f_info["name"],
+                "path": output_path,
+                "blocks": lines,
+                "cues": cues,
+                "journal": journal,
+                "lines": len(lines),
+                "left": len(pending),  # số dòng chưa có kết quả (0 -> chốt file)
+                "chunks": 0,
+                "failed": 0,           # số dòng thất bại
+                "profiles": set(),
+            }
+            self.files[f_info["path"]] = state
+            self.progress.start(f_info["name"], len(lines), done=len(lines) - len(pending), unit="dòng")
+
+            if not pending:
+                done_now.append(self._finalize(state))
+                continue
+            self._backlog.append([f_info["path"], pending, 0])
+
+            skipped = f" ({in_journal} dòng đã có trong nhật ký)" if in_journal else ""
+            if cached: skipped += f" ({cached} dòng lấy từ cache)"
+            self._log(f"📥 {f_info['name']}: {len(pending)} dòng chờ gửi{skipped}.")
+        # Cắt sẵn chunk đầu tiên (các chunk sau cắt khi có worker rảnh, theo ngân sách mới nhất)
+        self._refill()
+        return done_now
+
+    def _refill(self):
+        """Hàng đợi rỗng -> cắt chunk tiếp theo từ backlog theo ngân sách hiện tại"""
+        with self._lock:
+            if not self._tasks.empty(): return
+            while self._backlog:
+                entry = self._backlog[0]
+                file_key, lines, pos = entry
+                if pos >= len(lines):
+                    self._backlog.popleft()
+                    continue
+                count = self.budget.take(lines, pos)
+                entry[2] = pos + count
+                state = self.files[file_key]
+                state["chunks"] += 1
+                self._tasks.put((file_key, state["chunks"] - 1, lines[pos:pos + count]))
+                return
+
+    def _label(self, task):
+        state = self.files[task[0]]
+        return f"{state['name']} - Chunk {task[1] + 1} ({len(task[2])} dòng)"
+
+    def _make_worker(self, profile_path):
+        gen = VisualPromptGenerator(
+            status_callback=self.status_callback,
+            driver_pool=self.driver_pool,
+            reuse_conversation=self.reuse_conversation,
+            max_turns_per_chat=self.max_turns_per_chat,
+            lean_mode=self.lean_mode
+        )
+        return gen if gen.attach(profile_path) else None
+
+    def _release_worker(self, worker):
+        worker.detach()
+
+    def _run_task(self, worker, task):
+        file_key, _, chunk = task
+        state = self.files[file_key]
+        label = self._label(task)
+        worker._log(f"🔄 {label}, {self.budget.describe()}...")
+        # Tự điều chỉnh: lỗi nhiều lần -> chia nhỏ chunk thay vì thử lại mãi cả chunk dài
+        items = worker.process_chunk(chunk, self.gemini_url, label=label, max_retries=3 if self.budget.adaptive else 7,
+                                     on_attempt=lambda n: self.progress.attempt(state["name"], label, n))
+        if items is not None:
+            with self._lock: state["profiles"].add(worker.profile_name)
+        return items, worker.driver is not None
+
+    def _drain(self, worker):
+        if self.tabs_per_profile <= 1:
+            return super()._drain(worker)
+
+        due = {"recycle": False}  # driver đủ số việc -> ngừng nhận chunk mới, xong các tab thì thay bản mới
+        while True:
+            failed = []
+            inflight = {}  # chunk đã giao cho tab, chưa có kết quả
+
+            def next_chunk():
+                if due["recycle"]: return None
+                task = self._take_task()
+                if task is None: return None
+                inflight[id(task)] = task
+                return task, task[2], self._label(task)
+
+            def on_result(task, items):
+                inflight.pop(id(task), None)
+                if self._count_work(worker): due["recycle"] = True
+                if items is None:
+                    failed.append(task)
+                    return
+                with self._lock: self.files[task[0]]["profiles"].add(worker.profile_name)
+                self._handle_result(task, items)
+
+            def on_attempt(task, label, n):
+                self.progress.attempt(self._file_name(task), label, n)
+
+            try:
+                alive = worker.process_chunks_in_tabs(next_chunk, on_result, self.tabs_per_profile, self.gemini_url, on_attempt=on_attempt)
+            except ProfileLimited as e:
+                # Chỉ trả lại chunk đang chạy dở; chunk đã hết lượt thử trước đó vẫn tính thất bại
+                for task in failed: self._handle_result(task, None)
+                self._on_limited(worker, list(inflight.values()), e)
+                break
+            except Exception:
+                for task in failed: self._handle_result(task, None)
+                for task in inflight.values(): self._requeue_or_fail(task)
+                raise
+            for task in failed:
+                if alive:
+                    self._handle_result(task, None)
+                else:
+                    self._requeue_or_fail(task)
+            if alive:
+                # Hết chunk tạm thời -> chờ chunk bị profile khác trả lại (dính giới hạn / driver chết)
+                if not self._wait_for_work(): break
+                if due["recycle"]:
+                    due["recycle"] = False
+                    if not self._recycle_worker(worker): break
+                continue
+            due["recycle"] = False  # driver mới sau khi hồi sinh
+            if not worker.revive():
+                break
+
+    def _complete_task(self, task, result):
+        file_key, _, chunk = task
+        state = self.files[file_key]
+        if result is None:
+            # Task còn sót lúc hết worker: chưa từng chạy -> không tính vào ngân sách, không chia đôi (không ai chạy lại)
+            if not self._sweeping: self.budget.incomplete()
+            if self.budget.adaptive and len(chunk) > 1 and not self._sweeping:
+                # Chunk dài thất bại -> chia đôi, gửi lại từng nửa (tới 1 dòng vẫn lỗi mới tính thất bại)
+                mid = len(chunk) // 2
+                with self._lock:
+                    for part in (chunk[:mid], chunk[mid:]):
+                        state["chunks"] += 1
+                        self._tasks.put((file_key, state["chunks"] - 1, part))
+                self._log(f"✂️ {state['name']}: Chunk {len(chunk)} dòng lỗi -> Chia đôi, ngân sách còn {self.budget.describe()}.")
+                return None
+            missing = chunk
+        else:
+            # Chỉ nhận object khớp index đã gửi. Thiếu dòng -> giảm ngân sách, đủ -> tăng
+            answered, missing = match_items(chunk, result)
+            if missing: self.budget.incomplete()
+            else: self.budget.success()
+            # Ghi nhật ký ngay khi chunk xong (chỉ các dòng đã có kết quả -> dòng thiếu chạy lại sẽ gửi bù)
+            done_lines = [line for line in chunk if line not in missing]
+            if done_lines:
+                state["journal"].record(done_lines, ordered_items(done_lines, answered))
+                cache_chunk_result(done_lines, result, self.gemini_url, self.prompt_cache)
+        with self._lock:
+            state["left"] -= len(chunk)
+            state["failed"] += len(missing)
+            finished = state["left"] <= 0
+        self.progress.advance(state["name"], done=len(chunk) - len(missing), failed=len(missing))
+        if not finished:
+            return None
+        return self._finalize(state)
+
+    @staticmethod
+    def _sort_by_index(merged):
+        """Sắp xếp theo `index` (giữ thứ tự gốc nếu index không phải số), index trùng chỉ giữ object đầu"""
+        def sort_key(pair):
+            pos, item = pair
+            try:
+                return (0, int(str(item.get("index")).strip()), pos)
+            except (AttributeError, TypeError, ValueError):
+                return (1, 0, pos)
+        result, seen = [], set()
+        for _, item in sorted(enumerate(merged), key=sort_key):
+            idx = item_index(item) if isinstance(item, dict) and item.get("index") is not None else None
+            if idx is not None:
+                if idx in seen: continue
+                seen.add(idx)
+            result.append(item)
+        return result
+
+    def _finalize(self, state):
+        result = {
+            "file": state["name"],
+            "path": state["path"],
+            "status": "failed",
+            "msg": "Unknown Error",
+            "profile": ", ".join(sorted(state["profiles"])) or "-",
+        }
+        if state["lines"] and not len(state["journal"]):
+            result["msg"] = "Tất cả chunk đều thất bại"
+            return result
+        try:
+            # Dựng file cuối từ nhật ký (gồm cả các chunk của lần chạy trước)
+            final_data = self._sort_by_index(state["journal"].items_for(state["blocks"]))
+            # Gắn timing từ SRT (Gemini chỉ nhận chữ) -> bước sau không cần đọc lại SRT
+            attach_timings(final_data, state["cues"])
+            with open(state["path"], "w", encoding="utf-8") as f:
+                json.dump(final_data, f, ensure_ascii=False, indent=4)
+            if state["failed"]:
+                # Đã lưu file nhưng thiếu dòng -> "partial" (không tính là thành công). Giữ nhật ký -> chạy lại chỉ tốn các chunk còn thiếu
+                result["status"] = "partial"
+                result["msg"] = f"Thiếu {state['failed']}/{state['lines']} dòng (chạy lại để bù)"
+            else:
+                state["journal"].remove()
+                result["status"] = "success"
+                result["msg"] = "OK"
+            self._log(f"🎉 {state['name']}: Đã lưu {len(final_data)} items.")
+        except Exception as e:
+            result["msg"] = str(e)
+        return result
+
+
+# ==========================================
+# SCHEDULER 2: STEP 3 - ẢNH THEO CẢNH
+# ==========================================
+class VisualBatchScheduler(BaseBatchScheduler):
+    """
+    Chia mọi cảnh của mọi file prompts vào chung 1 hàng đợi -> 1 file dài cũng chạy song song trên tất cả profile.
+    Cảnh nào đã có {index}.png thì bỏ qua (chạy lại an toàn, ảnh chỉ xuất hiện khi đã tải xong).
+    Prompt đã có trong kho ảnh -> link ảnh cũ. Prompt trùng trong lần chạy -> chỉ vẽ 1 lần, cảnh còn lại link theo.
+    """
+    def __init__(self, files, profile_paths, dir_output, engine="flow", capture_in_browser=CAPTURE_FROM_BROWSER,
+                 pipeline_depth=VISUAL_CONFIGS["flow"]["PIPELINE_DEPTH"], tabs_per_profile=1, lean_mode=LEAN_MODE,
+                 image_store=IMAGE_STORE, **kwargs):
+        super().__init__(profile_paths, **kwargs)
+        self.input_files = files
+        self.dir_output = dir_output
+        self.engine = engine
+        self.capture_in_browser = capture_in_browser
+        # Flow: số prompt gửi trước cùng lúc trong 1 dự án (1 = tuần tự như cũ)
+        self.pipeline_depth = pipeline_depth
+        # Flow: mỗi profile mở N tab (N dự án) -> tổng số luồng = profile x tab
+        self.tabs_per_profile = tabs_per_profile
+        # Chặn font/analytics, giữ ảnh kết quả
+        self.lean_mode = lean_mode
+        # Kho ảnh theo engine + prompt (dùng chung cả workspace)
+        self.image_store = image_store
+        self._followers = {}  # key prompt -> list cảnh trùng prompt đang chờ cảnh gốc vẽ xong
+
+    def _prepare(self):
+        done_now = []
+        self.image_store.reset_stats()
+        for f_info in self.input_files:
+            # Tạo folder chứa ảnh riêng cho từng file JSON
+            base_name = os.path.splitext(f_info["name"])[0]
+            assets_folder = os.path.join(self.dir_output, f"{base_name}_assets")
+            os.makedirs(assets_folder, exist_ok=True)
+
+            state = {
+                "name": f_info["name"],
+                "folder": assets_folder,
+                "total": 0,
+                "done": 0,
+                "skipped": 0,
+                "cached": 0,
+                "failed": 0,
+                "profiles": set(),
+            }
+            try:
+                scenes = load_scenes(f_info["path"])
+            except Exception as e:
+                done_now.append({"file": f_info["name"], "profile": "-", "status": "failed", "msg": str(e)})
+                continue
+
+            pending = []
+            for index, prompt in scenes:
+                output_path = scene_output_path(assets_folder, index)
+                if os.path.exists(output_path):
+                    state["skipped"] += 1
+                elif self.image_store.materialize(self.engine, prompt, output_path):
+                    state["skipped"] += 1
+                    state["cached"] += 1
+                else:
+                    pending.append((f_info["path"], index, prompt, output_path))
+
+            state["total"] = len(pending)
+            self.files[f_info["path"]] = state
+            self.progress.start(f_info["name"], len(scenes), done=state["skipped"], unit="cảnh")
+            from_store = f", {state['cached']} lấy từ kho ảnh" if state["cached"] else ""
+            self._log(f"📥 {f_info['name']}: {len(pending)} cảnh cần vẽ ({state['skipped']} cảnh đã có{from_store}).")
+
+            if not pending:
+                done_now.append(self._finalize(state))
+                continue
+            for task in pending:
+                key = image_key(self.engine, task[2])
+                if key in self._followers:
+                    # Cùng prompt với cảnh đã xếp hàng (file này hoặc file khác) -> chờ ảnh của cảnh đó
+                    self._followers[key].append(task)
+                else:
+                    self._followers[key] = []
+                    self._tasks.put(task)
+        return done_now
+
+    def image_summary(self):
+        """Thống kê kho ảnh trong lần chạy này"""
+        return self.image_store.report()
+
+    def _make_worker(self, profile_path):
+        gen = VisualGenerator(
+            engine=self.engine,
+            status_callback=self.status_callback,
+            driver_pool=self.driver_pool,
+            capture_in_browser=self.capture_in_browser,
+            pipeline_depth=self.pipeline_depth,
+            tabs=self.tabs_per_profile,
+            lean_mode=self.lean_mode
+        )
+        return gen if gen.attach(profile_path, download_dir=self.dir_output) else None
+
+    def _release_worker(self, worker):
+        worker.detach()
+
+    def _revive_worker(self, worker):
+        return worker.revive()
+
+    def _drain(self, worker):
+        if not worker.uses_pipeline():
+            return super()._drain(worker)
+
+        # PIPELINE: worker tự kéo cảnh từ hàng đợi mỗi khi còn chỗ trống trong Flow (mọi tab)
+        broken = 0  # số lần liền pipeline hỏng (không mở được dự án ở tab nào / lỗi fatal)
+        due = {"recycle": False}  # driver đủ số việc -> ngừng lấy cảnh mới, vẽ xong cảnh dở thì thay bản mới
+        while True:
+            failed = []
+            inflight = {}  # cảnh đã gửi vào Flow, chưa có kết quả
+
+            def next_scene():
+                while True:
+                    if due["recycle"]: return None
+                    task = self._take_task()
+                    if task is None: return None
+                    if os.path.exists(task[3]):
+                        self._handle_result(task, True)
+                        continue
+                    inflight[id(task)] = task
+                    return task, task[1], task[2], task[3]
+
+            def on_attempt(task, n):
+                # Lượt gửi lại bên trong driver (lỗi / timeout) -> hiện "Cảnh X lần n"
+                self.progress.attempt(self._file_name(task), self._label(task), n)
+
+            def on_result(task, ok):
+                inflight.pop(id(task), None)
+                if self._count_work(worker): due["recycle"] = True
+                if ok:
+                    with self._lock: self.files[task[0]]["profiles"].add(worker.profile_name)
+                    self._handle_result(task, ok)
+                else:
+                    failed.append(task)
+
+            try:
+                ok = worker.generate_pipeline(next_scene, on_result, on_attempt=on_attempt)
+            except ProfileLimited as e:
+                # Chỉ trả lại cảnh đang vẽ dở; cảnh đã thất bại trước đó vẫn tính thất bại
+                for task in failed: self._handle_result(task, False)
+                self._on_limited(worker, list(inflight.values()), e)
+                break
+            except Exception:
+                for task in failed: self._handle_result(task, False)
+                for task in inflight.values(): self._requeue_or_fail(task)
+                raise
+
+            alive = worker.is_alive()
+            for task in failed:
+                if alive:
+                    self._handle_result(task, False)
+                else:
+                    self._requeue_or_fail(task)
+            if alive and ok:
+                broken = 0
+                # Hết cảnh tạm thời -> chờ cảnh bị profile khác trả lại (dính giới hạn / driver chết)
+                if not self._wait_for_work(): break
+                if due["recycle"]:
+                    due["recycle"] = False
+                    if not self._recycle_worker(worker): break
+                continue
+            due["recycle"] = False  # driver mới sau khi hồi sinh
+            # Driver chết / pipeline hỏng (VD: không tab nào mở được dự án) -> hồi sinh, quá MAX_REQUEUES lần thì nhường việc
+            broken += 1
+            if broken > self.MAX_REQUEUES:
+                self._log(f"❌ {worker.profile_name}: Pipeline hỏng {broken} lần liền -> Nhường cảnh cho profile khác.")
+                break
+            if not self._revive_worker(worker):
+                break
+
+    def _run_task(self, worker, task):
+        file_key, index, prompt, output_path = task
+        # Profile khác có thể đã vẽ xong cảnh này (VD: task bị trả lại hàng đợi)
+        if os.path.exists(output_path):
+            return True, True
+        label = self._label(task)
+        ok = worker.generate_scene(index, prompt, output_path,
+                                   on_attempt=lambda n: self.progress.attempt(self._file_name(task), label, n))
+        if ok:
+            with self._lock: self.files[file_key]["profiles"].add(worker.profile_name)
+            # ok có thể là Future (ảnh đang tải nền) -> scheduler chốt sau khi tải xong
+            return ok, True
+        return False, worker.is_alive()
+
+    def _complete_task(self, task, result):
+        _, _, prompt, output_path = task
+        with self._lock:
+            followers = self._followers.pop(image_key(self.engine, prompt), [])
+        if result:
+            self.image_store.add(self.engine, prompt, output_path)
+        # Cảnh trùng prompt: link ảnh vừa vẽ (cảnh gốc lỗi -> lỗi theo, chạy lại sẽ vẽ bù)
+        for follower in followers:
+            ok = bool(result) and self._link_scene(output_path, follower[3])
+            file_result = self._count_scene(follower, ok)
+            if file_result: self._results.put(file_result)
+        return self._count_scene(task, result)
+
+    @staticmethod
+    def _link_scene(src, dst):
+        try:
+            link_or_copy(src, dst)
+        except FileExistsError:
+            pass
+        except OSError:
+            return False
+        return True
+
+    def _label(self, task):
+        return f"Cảnh {task[1]}"
+
+    def _count_scene(self, task, result):
+        state = self.files[task[0]]
+        with self._lock:
+            if result:
+                state["done"] += 1
+            else:
+                state["failed"] += 1
+            finished = state["done"] + state["failed"] >= state["total"]
+        self.progress.advance(state["name"], done=1 if result else 0, failed=0 if result else 1)
+        if not finished:
+            return None
+        return self._finalize(state)
+
+    def _finalize(self, state):
+        ok = state["done"] + state["skipped"]
+        total = state["total"] + state["skipped"]
+        return {
+            "file": state["name"],
+            "profile": ", ".join(sorted(state["profiles"])) or "-",
+            "status": "success" if not state["failed"] else "failed",
+            "msg": f"Lưu tại: {os.path.basename(state['folder'])} ({ok}/{total} ảnh)",
+        }
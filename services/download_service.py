@@ -0,0 +1,92 @@
+import os
+import time
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from config.settings import DOWNLOAD_WORKERS, DOWNLOAD_COOKIE_TTL
+
+def write_atomic(save_path, chunks):
+    """Ghi vào file .part rồi mới đổi tên -> không bao giờ có file tải dở mang tên thật"""
+    tmp_path = f"{save_path}.part"
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                if chunk: f.write(chunk)
+        os.replace(tmp_path, save_path)
+    except Exception:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+
+class DownloadService:
+    """
+    Dịch vụ tải file cho 1 profile:
+    - 1 requests.Session dùng lại kết nối (pool), Cookies/User-Agent chỉ chép từ trình duyệt khi hết hạn hoặc bị 401/403.
+    - Tải ở thread pool nền -> trình duyệt gửi prompt tiếp theo ngay, không đứng chờ byte chạy qua proxy.
+    - submit() trả về Future (kết quả True/False), file được ghi nguyên tử.
+    """
+    def __init__(self, max_workers=DOWNLOAD_WORKERS, cookie_ttl=DOWNLOAD_COOKIE_TTL):
+        self.cookie_ttl = cookie_ttl
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+        self._lock = threading.Lock()
+        self._identity_at = 0      # 0 = phải chép lại Cookies ở lần submit tới
+        self._user_agent = None
+
+    def refresh_identity(self, driver, force=False):
+        """Chép Cookies + User-Agent từ Selenium. PHẢI gọi ở luồng đang điều khiển trình duyệt."""
+        with self._lock:
+            fresh = self._user_agent and time.time() - self._identity_at < self.cookie_ttl
+            if fresh and not force: return
+        cookies = driver.get_cookies()
+        user_agent = driver.execute_script("return navigator.userAgent;")
+        with self._lock:
+            self.session.cookies.clear()
+            for cookie in cookies:
+                self.session.cookies.set(cookie['name'], cookie['value'])
+            self._user_agent = user_agent
+            self._identity_at = time.time()
+
+    def submit(self, driver, url, save_path, log=print):
+        """Lấy danh tính + Referer ở luồng trình duyệt, rồi đẩy việc tải sang luồng nền"""
+        self.refresh_identity(driver)
+        referer = driver.current_url
+        return self._executor.submit(self._fetch, url, save_path, referer, log)
+
+    def _fetch(self, url, save_path, referer, log):
+        try:
+            headers = {"User-Agent": self._user_agent, "Referer": referer}
+            # Stream mode cho file lớn
+            with self.session.get(url, headers=headers, stream=True, timeout=60) as response:
+                if response.status_code in (401, 403):
+                    # Cookies hết hạn -> lần submit sau chép lại từ trình duyệt
+                    with self._lock: self._identity_at = 0
+                if response.status_code != 200:
+                    log(f"⚠️ Lỗi tải HTTP: {response.status_code}")
+                    return False
+                write_atomic(save_path, response.iter_content(chunk_size=65536))
+            log(f"✅ Đã lưu file: {os.path.basename(save_path)}")
+            return True
+        except Exception as e:
+            log(f"❌ Lỗi khi lưu file: {e}")
+            return False
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        self.session.close()
+
+
+# Mỗi profile 1 service (giữ Session + Cookies qua nhiều file / nhiều lần chạy)
+_SERVICES = {}
+_SERVICES_LOCK = threading.Lock()
+
+def get_download_service(profile_name):
+    with _SERVICES_LOCK:
+        if profile_name not in _SERVICES:
+            _SERVICES[profile_name] = DownloadService()
+        return _SERVICES[profile_name]
@@ -0,0 +1,15 @@
+import time
+
+def render_final_video(output_path, status_callback=None):
+    """
+    Step 4: Ghép ảnh/video của dự án thành video cuối. Dùng chung cho giao diện Streamlit và cli.py.
+    Trả về đường dẫn video.
+    """
+    print("[Merge] Đang chạy FFmpeg...")
+    if status_callback: status_callback("Đang chạy FFmpeg...")
+    time.sleep(2)
+    # --- LOGIC GỌI FFMPEG THỰC TẾ Ở ĐÂY ---
+    # Giả lập tạo video
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("fake_video_content")
+    return output_path
@@ -2,24 +2,130 @@ import time
 import os
 import json
 import traceback
-import random
+from collections import deque
 # 👇 Giữ lại các thư viện Selenium để thao tác trên trang web
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import WebDriverException
+from selenium.common.exceptions import WebDriverException, TimeoutException
 
 # Import cấu hình
 from config.selectors import GEMINI_CONFIG
-from utils.helpers import extract_json_from_text, split_srt_blocks
+from config.settings import LEAN_MODE
+from utils.helpers import extract_json_from_text
+from utils.srt_parser import iter_srt, attach_timings
+from utils.prompt_journal import PromptJournal
+from utils.prompt_cache import PROMPT_CACHE
+from utils.chunk_budget import ChunkBudget
+from utils.page_scripts import WAIT_FOR_NEW_RESPONSE_JS, PEEK_RESPONSE_JS, NOTICE_TEXT_JS
+from utils.tabs import open_tabs, close_extra_tabs
+from utils.pacing import get_pacer
+from utils.profile_health import ProfileLimited, PROFILE_HEALTH, classify_limit
 
 # 👇 IMPORT HÀM SETUP TRÌNH DUYỆT TỪ MODULE MỚI
 from utils.browser_setup import init_driver_from_profile
 
+BASE_SYSTEM_PROMPT = f"""
+            You are an expert Visual Prompt Creator for AI Video generation.
+            Task: Read the subtitle lines below (format "index: text", one per line) and generate a visual illustration description (Visual Prompt) for each line.
+            MANDATORY REQUIREMENTS:
+            1. Return strictly pure JSON format (Array of Objects).
+            2. Each object must follow this structure: {{"index": "keep the original index from input", "text": "original srt content", "visual_prompt": "detailed, artistic image description in English"}}
+            3. NO explanations, NO Markdown code blocks, return ONLY the raw JSON string.
+            DATA TO PROCESS:
+            """
+
+# [CHẾ ĐỘ GIỮ HỘI THOẠI] Các lượt sau chỉ gửi câu nhắc ngắn + dữ liệu (luật đã gửi ở lượt đầu)
+FOLLOWUP_PROMPT = "Same rules as before. Return ONLY the raw JSON array for these lines:"
+
+def load_srt_lines(input_srt_path):
+    """
+    Đọc SRT -> (cues, lines). Mỗi dòng = "index: text" (chỉ gửi chữ, timing giữ lại ở cues).
+    cues: {index dạng chuỗi: SrtCue} -> gắn lại timing vào kết quả bằng attach_timings.
+    Chia chunk do ChunkBudget quyết định (cố định N dòng hoặc theo số ký tự).
+    """
+    cues, lines = {}, []
+    for cue in iter_srt(input_srt_path):
+        cues[str(cue.index)] = cue
+        lines.append(cue.prompt_line())
+    return cues, lines
+
+def line_index(line):
+    """ "12: text" -> "12" """
+    return line.split(":", 1)[0].strip()
+
+def line_text(line):
+    """ "12: text" -> "text" (khóa cache: thêm / bớt 1 câu SRT làm đổi số thứ tự các câu sau, nội dung thì không)"""
+    return line.split(":", 1)[-1].strip()
+
+def item_index(item):
+    """index trong object Gemini trả về -> chuỗi để so khớp ("12", 12, "12:" đều là "12")"""
+    return str(item.get("index")).strip().rstrip(":").strip()
+
+def match_items(chunk, items):
+    """
+    Khớp object Gemini trả về với các dòng đã gửi theo index.
+    Trả về (answered, missing):
+    - answered: {index: object} của các dòng đã có kết quả (trùng index do thử lại -> giữ object đầu có visual_prompt)
+    - missing: list dòng chưa có kết quả (chỉ gửi lại các dòng này)
+    Object có index lạ (không thuộc chunk) bị bỏ.
+    """
+    wanted = {line_index(line) for line in chunk}
+    answered = {}
+    for item in items or []:
+        if not isinstance(item, dict): continue
+        idx = item_index(item)
+        if idx not in wanted: continue
+        if idx not in answered or (not answered[idx].get("visual_prompt") and item.get("visual_prompt")):
+            answered[idx] = item
+    missing = [line for line in chunk if line_index(line) not in answered]
+    return answered, missing
+
+def ordered_items(chunk, answered):
+    """Object theo đúng thứ tự dòng trong chunk (dòng thiếu bị bỏ qua)"""
+    return [answered[line_index(line)] for line in chunk if line_index(line) in answered]
+
+def serve_cached_lines(lines, journal, gemini_url, cache=PROMPT_CACHE):
+    """
+    Dòng nào đã có câu trả lời trong cache -> ghi thẳng vào nhật ký (không cần trình duyệt).
+    Cache theo NỘI DUNG TỪNG DÒNG (không kèm số thứ tự) -> chia chunk khác lần trước (ngân sách tự điều chỉnh)
+    hay SRT bị thêm / bớt câu (đánh số lại) vẫn dùng lại được. Lấy ra thì gán lại index của dòng hiện tại.
+    Trả về list dòng còn phải gửi lên Gemini.
+    """
+    misses = []
+    for line in lines:
+        items = cache.get([line_text(line)], BASE_SYSTEM_PROMPT, gemini_url)
+        if items is None:
+            misses.append(line)
+        else:
+            journal.record([line], [{**item, "index": line_index(line)} for item in items])
+    return misses
+
+def cache_chunk_result(chunk, items, gemini_url, cache=PROMPT_CACHE):
+    """Tách kết quả 1 chunk theo index -> lưu cache từng dòng (dòng Gemini bỏ sót thì không lưu)"""
+    answered, _ = match_items(chunk, items)
+    for line in chunk:
+        found = answered.get(line_index(line))
+        if found: cache.put([line_text(line)], BASE_SYSTEM_PROMPT, gemini_url, [found])
+
 class VisualPromptGenerator:
-    def __init__(self, status_callback=None):
+    def __init__(self, status_callback=None, driver_pool=None, reuse_conversation=False, max_turns_per_chat=GEMINI_CONFIG["MAX_TURNS_PER_CHAT"],
+                 lean_mode=LEAN_MODE, prompt_cache=PROMPT_CACHE):
         self.status_callback = status_callback
+        # Nếu có pool -> mượn/trả driver ấm thay vì mở/tắt Orbita mỗi file
+        self.driver_pool = driver_pool
+        # Giữ hội thoại: mồi luật 1 lần, các chunk sau gửi tiếp trong cùng chat
+        # Đủ max_turns_per_chat lượt -> mở chat mới để DOM không phình to
+        self.reuse_conversation = reuse_conversation
+        self.max_turns_per_chat = max(1, int(max_turns_per_chat))
+        self._chat_turns = 0  # 0 = chưa có chat nào được mồi luật
+        # Chỉ cần chữ -> chặn ảnh/font/analytics (blocklist "text")
+        self.lean = "text" if lean_mode else None
+        # Chunk giống hệt lần trước -> lấy kết quả từ cache, không gửi lại
+        self.prompt_cache = prompt_cache
+        # Nhịp thao tác theo profile (gắn đúng profile khi attach)
+        self.pacer = get_pacer("default")
         self.driver = None 
         self.current_profile_json = None 
         self.profile_name = "Unknown" 
@@ -30,158 +136,427 @@ class VisualPromptGenerator:
         if self.status_callback:
             self.status_callback(f"{tag} {msg}")
 
-    def _wait_for_gemini_finish(self, timeout=120):
-        if not self.driver: return False
-        wait = WebDriverWait(self.driver, timeout)
+    def _open_driver(self, profile_json_path):
+        if self.driver_pool:
+            return self.driver_pool.acquire(profile_json_path, log_callback=self._log, lean=self.lean)
+        return init_driver_from_profile(profile_json_path, log_callback=self._log, lean=self.lean)
+
+    def _count_work(self):
+        """1 chunk xong -> báo pool (đủ DRIVER_POOL_MAX_TASKS việc thì lúc trả về driver bị tắt, lần sau mở bản mới)"""
+        if self.driver_pool and self.driver: self.driver_pool.add_work(self.driver)
+
+    def _close_driver(self, discard=False):
+        """Trả driver về pool (hoặc tắt hẳn nếu chạy không có pool)"""
+        if not self.driver: return
+        if self.driver_pool:
+            self.driver_pool.release(self.driver, discard=discard)
+        else:
+            try: self.driver.quit()
+            except: pass
+        self.driver = None
+
+    def _wait_for_gemini_finish(self, old_count=0, timeout=120):
+        """
+        Chờ câu trả lời MỚI viết xong bằng observer cài trong trang (execute_async_script):
+        trả về ngay khi text ngừng thay đổi, không sleep cố định.
+        Trả về text câu trả lời, hoặc None nếu timeout.
+        """
+        if not self.driver: return None
         try:
-            wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, GEMINI_CONFIG["SEND_BUTTON"])))
-            time.sleep(random.randint(2,4)) 
-            return True
+            self.driver.set_script_timeout(timeout + 10)
+            result = self.driver.execute_async_script(
+                WAIT_FOR_NEW_RESPONSE_JS,
+                GEMINI_CONFIG["RESPONSE_TEXT"], old_count,
+                GEMINI_CONFIG["QUIET_MS"], timeout * 1000,
+                GEMINI_CONFIG["STOP_BUTTON"]
+            )
+            if result and result.get("status") == "done":
+                return result.get("text")
+            return None
+        except Exception as e:
+            # Observer lỗi (CSP, trang đổi...) -> quay về cách cũ: chờ nút Gửi sáng lại
+            self._log(f"⚠️ Observer lỗi ({str(e)[:50]}) -> Chờ theo nút Gửi.")
+            return self._wait_for_send_button(old_count, timeout)
+
+    def _wait_for_send_button(self, old_count, timeout):
+        """Cách chờ cũ (dự phòng): nút Gửi bấm được lại + đợi thêm chút cho text ổn định"""
+        try:
+            WebDriverWait(self.driver, timeout).until(EC.element_to_be_clickable((By.CSS_SELECTOR, GEMINI_CONFIG["SEND_BUTTON"])))
+        except TimeoutException:
+            return None
+        self.pacer.wait("poll")
+        responses = self.driver.find_elements(By.CSS_SELECTOR, GEMINI_CONFIG["RESPONSE_TEXT"])
+        return responses[-1].text if len(responses) > old_count else None
+
+    def _check_limit(self, response_text=None, old_count=None):
+        """
+        Câu trả lời / thông báo trên trang báo hết quota hoặc rate limit -> ném ProfileLimited
+        (scheduler cho profile nghỉ và chuyển chunk sang profile khác thay vì thử lại vô ích).
+        Alert / snackbar luôn được xét. Câu trả lời chỉ xét khi ngắn và không có JSON nào
+        (câu trả lời có JSON là Gemini vẫn làm việc, chữ "slow down" / "429" trong đó là phụ đề được chép lại).
+        """
+        notices, responses = [], [response_text]
+        try:
+            selector = GEMINI_CONFIG["RESPONSE_TEXT"] if old_count is not None else None
+            found = self.driver.execute_script(NOTICE_TEXT_JS, selector, old_count or 0) or {}
+            notices += found.get("notices") or []
+            responses.append(found.get("response"))
         except Exception:
-            return False
+            pass
+        texts = notices + [r for r in responses if r and len(r) <= 1000 and not extract_json_from_text(r)]
+        for text in texts:
+            kind = classify_limit(text)
+            if kind:
+                self._log(f"🛑 Profile bị giới hạn ({kind}): {text[:80]}")
+                raise ProfileLimited(kind, text)
 
     # =========================================================================
-    # HÀM CHÍNH: GENERATE PROMPT
+    # MƯỢN / TRẢ TRÌNH DUYỆT (Dùng chung cho chạy theo file & scheduler theo chunk)
     # =========================================================================
-    def generate_via_gemini_web(self, input_srt_path, output_json_path, profile_json_path, chunk_size=15, gemini_url=GEMINI_CONFIG["URL"]):
-        
+    def attach(self, profile_json_path):
+        """Gắn generator vào 1 profile và mở (mượn) driver. Trả về True nếu OK."""
         # Cập nhật tên profile để log
         self.profile_name = os.path.splitext(os.path.basename(profile_json_path))[0]
         self.current_profile_json = profile_json_path
-        
-        self._log(f"🎬 Bắt đầu xử lý file: {os.path.basename(input_srt_path)}")
+        self.pacer = get_pacer(self.profile_name)
 
-        # 👇 [THAY ĐỔI 1] GỌI HÀM TỪ utils.browser_setup
+        # 👇 [THAY ĐỔI 1] Mượn driver từ pool (hoặc mở mới qua utils.browser_setup)
         # Truyền self._log vào để nó in log ra UI của class này
-        self.driver = init_driver_from_profile(profile_json_path, log_callback=self._log)
-        
-        if not self.driver: return False
+        self.driver = self._open_driver(profile_json_path)
+        self._chat_turns = 0
+        return self.driver is not None
 
-        wait = WebDriverWait(self.driver, 40)
+    def detach(self):
+        self._close_driver()
+
+    def _submit_chunk(self, chunk, gemini_url, wait):
+        """
+        Nhập + gửi 1 chunk ở tab hiện tại (chat mới hoặc gửi tiếp trong chat cũ).
+        Trả về số câu trả lời cũ -> chỉ đọc câu trả lời MỚI (quan trọng khi giữ hội thoại).
+        """
+        chunk_text = "\n".join(chunk)
+        fresh_chat = (not self.reuse_conversation
+                      or self._chat_turns == 0
+                      or self._chat_turns >= self.max_turns_per_chat)
+
+        if fresh_chat:
+            # Mở chat mới + gửi đầy đủ luật (lượt đầu cũng mang luôn dữ liệu chunk)
+            self._chat_turns = 0
+            self.driver.get(gemini_url)
+            full_message = f"{BASE_SYSTEM_PROMPT}\n\n{chunk_text}"
+        else:
+            # Cùng chat: không tải lại trang, chỉ gửi dữ liệu
+            self._log(f"💬 Gửi tiếp trong chat hiện tại (lượt {self._chat_turns + 1}/{self.max_turns_per_chat}).")
+            full_message = f"{FOLLOWUP_PROMPT}\n\n{chunk_text}"
+        
+        prompt_box = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, GEMINI_CONFIG["INPUT_BOX"])))
+        # Đếm câu trả lời cũ -> chỉ đọc câu trả lời MỚI (quan trọng khi giữ hội thoại)
+        old_count = len(self.driver.find_elements(By.CSS_SELECTOR, GEMINI_CONFIG["RESPONSE_TEXT"]))
         
+        # JS Injection
+        self.driver.execute_script(
+            """
+            var elm = arguments[0];
+            elm.focus();
+            document.execCommand('insertText', false, arguments[1]);
+            elm.dispatchEvent(new Event('input', { bubbles: true }));
+            """, prompt_box, full_message
+        )
+
+        # Giữ khoảng cách tối thiểu giữa 2 lần gửi trên cùng profile (mọi tab)
+        self.pacer.wait("submit")
+
+        # Chờ nút Gửi sáng lên (thay cho sleep cố định sau khi nhập)
         try:
-            blocks = split_srt_blocks(input_srt_path)
-            chunks = [blocks[i:i + chunk_size] for i in range(0, len(blocks), chunk_size)]
-            final_data = []
+            send_btn = WebDriverWait(self.driver, 10).until(EC.element_to_be_clickable((By.CSS_SELECTOR, GEMINI_CONFIG["SEND_BUTTON"])))
+            send_btn.click()
+        except:
+            prompt_box.send_keys(Keys.ENTER)
+        return old_count
 
-            BASE_SYSTEM_PROMPT = f"""
-            You are an expert Visual Prompt Creator for AI Video generation.
-            Task: Read the subtitle (SRT) lines below and generate a visual illustration description (Visual Prompt) for each line.
-            MANDATORY REQUIREMENTS:
-            1. Return strictly pure JSON format (Array of Objects).
-            2. Each object must follow this structure: {{"index": "keep the original index from input", "text": "original srt content", "visual_prompt": "detailed, artistic image description in English"}}
-            3. NO explanations, NO Markdown code blocks, return ONLY the raw JSON string.
-            DATA TO PROCESS:
-            """
+    # =========================================================================
+    # XỬ LÝ 1 CHUNK (Có retry + hồi sinh Chrome)
+    # =========================================================================
+    def process_chunk(self, chunk, gemini_url=GEMINI_CONFIG["URL"], label="Chunk", max_retries=7, on_attempt=None):
+        """
+        Gửi 1 chunk lên Gemini và trả về list object đã parse (đúng thứ tự dòng, mỗi index 1 object).
+        Gemini trả thiếu dòng -> chỉ gửi lại các dòng thiếu. Hết lượt thử mà vẫn thiếu -> trả về phần đã có.
+        on_attempt(n): báo lượt thử hiện tại (tiến độ trên giao diện).
+        Trả về None nếu thất bại (nếu self.driver == None -> hồi sinh thất bại, driver đã mất).
+        """
+        wait = WebDriverWait(self.driver, 40)
+        retry_count = 0
+        answered, remaining = {}, list(chunk)
+
+        while retry_count < max_retries:
+            try:
+                # Kiểm tra driver sống hay chết
+                try:
+                    _ = self.driver.window_handles
+                except Exception:
+                    raise WebDriverException("Chrome died")
 
-            for index, chunk in enumerate(chunks):
-                self._log(f"🔄 Chunk {index + 1}/{len(chunks)}...")
+                if on_attempt: on_attempt(retry_count + 1)
+                old_count = self._submit_chunk(remaining, gemini_url, wait)
+                
+                self._log(f"⏳ Đợi AI (Thử lần {retry_count + 1})...")
                 
-                chunk_success = False
-                retry_count = 0
-                max_retries = 7
+                latest_response = self._wait_for_gemini_finish(old_count, timeout=GEMINI_CONFIG["WAIT_TIME"])
+                if latest_response:
+                    got, remaining_now = match_items(remaining, extract_json_from_text(latest_response))
+                    
+                    if got:
+                        answered.update(got)
+                        self._chat_turns += 1
+                        if not remaining_now:
+                            self._log(f"✅ {label} OK: {len(answered)} items.")
+                            return ordered_items(chunk, answered)
+                        # Thiếu dòng (JSON bị cắt cụt, AI bỏ sót...) -> lượt sau chỉ gửi các dòng còn thiếu
+                        self._log(f"🧩 {label}: Thiếu {len(remaining_now)}/{len(chunk)} dòng -> Gửi lại riêng các dòng thiếu.")
+                        remaining = remaining_now
+                        retry_count += 1
+                        continue
+                    else:
+                        self._check_limit(latest_response)
+                        self._log("⚠️ AI trả về rỗng. Thử lại...")
+                else:
+                    self._check_limit(old_count=old_count)
+                    self._log("⚠️ Timeout / Không thấy phản hồi.")
 
-                while retry_count < max_retries:
-                    try:
-                        # Kiểm tra driver sống hay chết
-                        try:
-                            _ = self.driver.window_handles
-                        except Exception:
-                            raise WebDriverException("Chrome died")
-
-                        self.driver.get(gemini_url)
-                        time.sleep(random.randint(2,4))
-                        
-                        prompt_box = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, GEMINI_CONFIG["INPUT_BOX"])))
-                        
-                        chunk_text = "\n".join(chunk)
-                        full_message = f"{BASE_SYSTEM_PROMPT}\n\n{chunk_text}"
-                        
-                        # JS Injection
-                        self.driver.execute_script(
-                            """
-                            var elm = arguments[0];
-                            elm.focus();
-                            document.execCommand('insertText', false, arguments[1]);
-                            elm.dispatchEvent(new Event('input', { bubbles: true }));
-                            """, prompt_box, full_message
-                        )
-                        time.sleep(random.randint(2,4))
+            except (WebDriverException, ConnectionError) as e:
+                self._chat_turns = 0
+                self._log(f"🔥 CẢNH BÁO: Chrome Sập! ({str(e)[:50]}...)")
+                self._log("🚑 Đang HỒI SINH trình duyệt...")
+                
+                # Driver hỏng -> bỏ khỏi pool, không trả lại cho người khác dùng
+                self._close_driver(discard=True)
+                
+                self.pacer.wait("retry")
+                
+                # 👇 [THAY ĐỔI 2] MỞ DRIVER MỚI ĐỂ HỒI SINH
+                self.driver = self._open_driver(self.current_profile_json)
+                
+                if not self.driver:
+                    self._log("❌ Hồi sinh thất bại.")
+                    return None
+                
+                wait = WebDriverWait(self.driver, 40)
+                self._log(f"✅ Hồi sinh xong. Re-run {label}.")
+                continue 
+
+            except ProfileLimited:
+                raise
 
+            except Exception as e:
+                 self._log(f"⚠️ Lỗi logic: {e}")
+                 self._chat_turns = 0
+                 retry_count += 1
+                 self.pacer.wait("retry")
+                 continue
+
+            # Lượt lỗi -> lần thử sau mở chat mới cho sạch
+            self._chat_turns = 0
+            retry_count += 1
+            self.pacer.wait("retry")
+
+        if answered:
+            self._log(f"⚠️ {label}: Hết lượt thử, còn thiếu {len(remaining)} dòng.")
+            return ordered_items(chunk, answered)
+        return None
+
+    # =========================================================================
+    # NHIỀU TAB / 1 PROFILE (mỗi tab 1 hội thoại, chuyển tab lần lượt)
+    # =========================================================================
+    def process_chunks_in_tabs(self, next_chunk, on_result, tabs=2, gemini_url=GEMINI_CONFIG["URL"], on_attempt=None):
+        """
+        Chạy nhiều chunk cùng lúc trên nhiều tab của CÙNG 1 trình duyệt.
+        - next_chunk() -> (key, chunk, label) hoặc None khi hết việc
+        - on_result(key, items): items là list đã parse, hoặc None nếu thất bại
+        - on_attempt(key, label, n): báo lượt thử hiện tại của 1 chunk
+        Tab rảnh thì gửi chunk mới, tab đang chờ thì chỉ "ghé" xem câu trả lời (không chờ chặn).
+        Trả về False nếu Chrome sập giữa chừng (mọi chunk dở dang được báo None).
+        """
+        max_retries = 3
+        quiet_s = GEMINI_CONFIG["QUIET_MS"] / 1000
+        wait = WebDriverWait(self.driver, 40)
+        lanes = [{"handle": h, "job": None, "turns": 0} for h in open_tabs(self.driver, tabs)]
+        retries = deque()
+        source = {"exhausted": False}
+        self._log(f"🗂️ Chạy {len(lanes)} tab song song.")
+
+        def fail(lane, reason):
+            self._check_limit(lane["job"].get("text"), lane["job"].get("old_count"))
+            job, lane["job"], lane["turns"] = lane["job"], None, 0  # Lần sau mở chat mới cho sạch
+            self._log(f"⚠️ {job['label']}: {reason}")
+            if job["attempt"] < max_retries:
+                retries.append(job)
+            else:
+                # Hết lượt -> trả phần đã có (dòng thiếu được scheduler tính là thất bại)
+                on_result(job["key"], ordered_items(job["full"], job["answered"]) or None)
+
+        def take_job():
+            if retries: return retries.popleft()
+            if source["exhausted"]: return None
+            nxt = next_chunk()
+            if nxt is None:
+                source["exhausted"] = True
+                return None
+            key, chunk, label = nxt
+            # chunk = các dòng còn phải gửi (thiếu dòng -> chỉ gửi lại phần thiếu), full = chunk gốc
+            return {"key": key, "chunk": chunk, "full": chunk, "answered": {}, "label": label, "attempt": 0}
+
+        try:
+            while True:
+                busy = False
+                for lane in lanes:
+                    self.driver.switch_to.window(lane["handle"])
+
+                    # 1. TAB RẢNH -> GỬI CHUNK MỚI
+                    if lane["job"] is None:
+                        job = take_job()
+                        if job is None: continue
+                        job["attempt"] += 1
+                        lane["job"] = job
+                        if on_attempt: on_attempt(job["key"], job["label"], job["attempt"])
+                        self._chat_turns = lane["turns"]
                         try:
-                            send_btn = self.driver.find_element(By.CSS_SELECTOR, GEMINI_CONFIG["SEND_BUTTON"])
-                            send_btn.click()
-                        except:
-                            prompt_box.send_keys(Keys.ENTER)
-                        
-                        self._log(f"⏳ Đợi AI (Thử lần {retry_count + 1})...")
-                        
-                        if self._wait_for_gemini_finish(timeout=GEMINI_CONFIG["WAIT_TIME"]):
-                            responses = self.driver.find_elements(By.CSS_SELECTOR, GEMINI_CONFIG["RESPONSE_TEXT"])
-                            if responses:
-                                latest_response = responses[-1].text
-                                parsed_objects = extract_json_from_text(latest_response)
-                                
-                                if len(parsed_objects) > 0:
-                                    self._log(f"✅ Chunk {index + 1} OK: {len(parsed_objects)} items.")
-                                    final_data.extend(parsed_objects)
-                                    chunk_success = True
-                                    break 
-                                else:
-                                    self._log("⚠️ AI trả về rỗng. Thử lại...")
-                            else:
-                                self._log("⚠️ Không thấy phản hồi.")
+                            job["old_count"] = self._submit_chunk(job["chunk"], gemini_url, wait)
+                        except WebDriverException:
+                            if not self.driver.window_handles: raise
+                            fail(lane, "Không gửi được chunk")
+                            continue
+                        lane["turns"] = self._chat_turns
+                        job.update(sent=time.time(), text=None, changed=time.time())
+                        self._log(f"📤 {job['label']} -> tab {lanes.index(lane) + 1} (lần {job['attempt']}).")
+
+                    busy = True
+                    job = lane["job"]
+
+                    # 2. GHÉ XEM CÂU TRẢ LỜI (không chờ)
+                    state = self.driver.execute_script(
+                        PEEK_RESPONSE_JS, GEMINI_CONFIG["RESPONSE_TEXT"], job["old_count"], GEMINI_CONFIG["STOP_BUTTON"]
+                    ) or {}
+                    text = state.get("text")
+                    if text is not None and text != job["text"]:
+                        job["text"], job["changed"] = text, time.time()
+
+                    if text and text.strip() and not state.get("busy") and time.time() - job["changed"] >= quiet_s:
+                        got, missing = match_items(job["chunk"], extract_json_from_text(text))
+                        if not got:
+                            fail(lane, "AI trả về rỗng")
+                        elif not missing:
+                            job["answered"].update(got)
+                            self._log(f"✅ {job['label']} OK: {len(job['answered'])} items.")
+                            lane["job"] = None
+                            lane["turns"] += 1
+                            on_result(job["key"], ordered_items(job["full"], job["answered"]))
                         else:
-                            self._log("⚠️ Timeout.")
+                            job["answered"].update(got)
+                            job["chunk"] = missing
+                            lane["turns"] += 1
+                            fail(lane, f"Thiếu {len(missing)}/{len(job['full'])} dòng -> Gửi lại riêng các dòng thiếu")
+                    elif time.time() - job["sent"] > GEMINI_CONFIG["WAIT_TIME"]:
+                        fail(lane, "Timeout / Không thấy phản hồi")
 
-                    except (WebDriverException, ConnectionError) as e:
-                        self._log(f"🔥 CẢNH BÁO: Chrome Sập! ({str(e)[:50]}...)")
-                        self._log("🚑 Đang HỒI SINH trình duyệt...")
-                        
-                        try:
-                            self.driver.quit()
-                        except: pass
-                        
-                        time.sleep(random.randint(2,3))
-                        
-                        # 👇 [THAY ĐỔI 2] GỌI HÀM TỪ utils.browser_setup ĐỂ HỒI SINH
-                        self.driver = init_driver_from_profile(self.current_profile_json, log_callback=self._log)
-                        
-                        if not self.driver:
-                            self._log("❌ Hồi sinh thất bại.")
-                            return False
-                        
-                        wait = WebDriverWait(self.driver, 40)
-                        self._log("✅ Hồi sinh xong. Re-run chunk.")
-                        continue 
-
-                    except Exception as e:
-                         self._log(f"⚠️ Lỗi logic: {e}")
-                         retry_count += 1
-                         time.sleep(random.randint(2,3))
-                    
-                    if not chunk_success and self.driver:
-                        retry_count += 1
-                        time.sleep(random.randint(2,3))
+                if not busy and not retries:
+                    return True
+                time.sleep(0.5)
+
+        except ProfileLimited:
+            # Chunk dở dang không báo kết quả -> scheduler trả đúng các chunk này về hàng đợi cho profile khác
+            raise
+        except (WebDriverException, ConnectionError) as e:
+            self._log(f"🔥 CẢNH BÁO: Chrome Sập! ({str(e)[:50]}...)")
+            for job in [lane["job"] for lane in lanes if lane["job"]] + list(retries):
+                on_result(job["key"], None)
+            return False
+        finally:
+            self._chat_turns = 0
+            if self.driver: close_extra_tabs(self.driver)
+
+    def revive(self):
+        """Chrome sập -> bỏ driver cũ khỏi pool, mở lại driver mới"""
+        self._log("🚑 Đang HỒI SINH trình duyệt...")
+        self._close_driver(discard=True)
+        return self.attach(self.current_profile_json)
+
+    # =========================================================================
+    # HÀM CHÍNH: GENERATE PROMPT (1 FILE / 1 PROFILE)
+    # =========================================================================
+    def generate_via_gemini_web(self, input_srt_path, output_json_path, profile_json_path, chunk_size=15, gemini_url=GEMINI_CONFIG["URL"]):
+        """chunk_size = None -> chia theo số ký tự, tự điều chỉnh theo câu trả lời (ChunkBudget)"""
+        
+        self.profile_name = os.path.splitext(os.path.basename(profile_json_path))[0]
+        self._log(f"🎬 Bắt đầu xử lý file: {os.path.basename(input_srt_path)}")
+
+        try:
+            cues, blocks = load_srt_lines(input_srt_path)
+            budget = ChunkBudget(chunk_size)
 
-                if not chunk_success:
-                    self._log(f"❌ Thất bại Chunk {index + 1}. Bỏ qua.")
+            # Nhật ký cạnh _prompts.json: dòng nào đã xong ở lần chạy trước thì bỏ qua
+            journal = PromptJournal(output_json_path)
+            pending = [b for b in blocks if not journal.has_chunk([b])]
+            if len(pending) < len(blocks):
+                self._log(f"📒 Nhật ký: {len(blocks) - len(pending)}/{len(blocks)} dòng đã xong -> Bỏ qua.")
+            cached = len(pending)
+            pending = serve_cached_lines(pending, journal, gemini_url, self.prompt_cache)
+            cached -= len(pending)
+            if cached:
+                self._log(f"🗃️ Cache: {cached} dòng giống lần trước -> Dùng lại kết quả, không gửi Gemini.")
+
+            failed = 0
+            # Chỉ mở trình duyệt khi thật sự còn dòng phải gửi
+            if pending and not self.attach(profile_json_path): return False
+
+            pos, chunk_no = 0, 0
+            while pos < len(pending):
+                count = budget.take(pending, pos)
+                chunk = pending[pos:pos + count]
+                pos += count
+                chunk_no += 1
+                self._log(f"🔄 Chunk {chunk_no}: {count} dòng ({pos}/{len(pending)}, {budget.describe()})...")
                 
-                time.sleep(random.randint(2,3))
+                parsed_objects = self.process_chunk(chunk, gemini_url, label=f"Chunk {chunk_no}")
+                self._count_work()
+
+                if parsed_objects is None:
+                    if not self.driver: return False
+                    self._log(f"❌ Thất bại Chunk {chunk_no}. Bỏ qua.")
+                    budget.incomplete()
+                    failed += 1
+                else:
+                    answered, missing = match_items(chunk, parsed_objects)
+                    if missing:
+                        budget.incomplete()
+                        failed += 1
+                    else:
+                        budget.success()
+                    # Chỉ ghi các dòng đã có kết quả -> dòng thiếu không bị coi là xong
+                    done_lines = [line for line in chunk if line not in missing]
+                    if done_lines:
+                        journal.record(done_lines, ordered_items(done_lines, answered))
+                        cache_chunk_result(done_lines, parsed_objects, gemini_url, self.prompt_cache)
+
+            # Dựng file cuối từ nhật ký (gồm cả các chunk của lần chạy trước)
+            final_data = attach_timings(journal.items_for(blocks), cues)
 
             self._log(f"💾 Đang lưu file...")
             with open(output_json_path, "w", encoding="utf-8") as f:
                 json.dump(final_data, f, ensure_ascii=False, indent=4)
+
+            # Đủ hết chunk -> không cần nhật ký nữa. Thiếu -> giữ lại để lần sau chỉ chạy phần thiếu
+            if not failed: journal.remove()
             
             self._log(f"🎉 Hoàn tất!")
             return True
 
+        except ProfileLimited as e:
+            cooldown = PROFILE_HEALTH.mark_limited(self.profile_name, e.kind)
+            self._log(f"🛑 Dừng file: profile nghỉ {cooldown // 60} phút ({e.kind}). Chạy lại để làm tiếp phần còn thiếu.")
+            return False
         except Exception as e:
             self._log(f"❌ Lỗi Critical: {str(e)}")
             traceback.print_exc()
             return False
         finally:
-            if self.driver:
-                try: self.driver.quit()
-                except: pass
-                self.driver = None
\ No newline at end of file
+            self.detach()
\ No newline at end of file
@@ -1,72 +1,125 @@
 import time
-import requests
 import base64
 import os
-import random
+from collections import deque
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import StaleElementReferenceException
+from selenium.common.exceptions import StaleElementReferenceException, WebDriverException
 from config.selectors import VISUAL_CONFIGS
+from utils.page_scripts import INSTALL_MEDIA_WATCHER_JS, WAIT_FOR_NEW_MEDIA_JS, DOM_SNAPSHOT_JS, FETCH_AS_DATA_URL_JS
+from services.download_service import get_download_service, write_atomic
+from utils.tabs import open_tabs, close_extra_tabs
+from utils.pacing import get_pacer
+from utils.profile_health import ProfileLimited, classify_limit, limit_regex
 # ==========================================
 # CLASS CHA (BASE DRIVER)
 # ==========================================
 class BaseVisualDriver:
-    def __init__(self, driver, log_callback=None):
+    def __init__(self, driver, log_callback=None, downloader=None, async_download=False, capture_in_browser=False, pacer=None):
         self.driver = driver
         self.log = log_callback if log_callback else print
-
-    def generate(self, prompt, output_path):
-        """Hàm này sẽ được các class con viết lại (Override)"""
+        # Nhịp thao tác theo profile (thay cho sleep cố định). Không truyền -> pacer mặc định
+        self.pacer = pacer or get_pacer("default")
+        # Lấy ảnh từ chính trình duyệt (không đi qua proxy lần 2). Lỗi -> tự tải qua mạng như cũ
+        self.capture_in_browser = capture_in_browser
+        # Dịch vụ tải theo profile (Session + Cookies dùng lại). Không truyền -> dùng service mặc định
+        self.downloader = downloader or get_download_service("default")
+        # Tải nền: _download() trả True ngay sau khi giao việc, kết quả thật nằm ở pending_download
+        self.async_download = async_download
+        self.pending_download = None
+
+    def take_pending_download(self):
+        """Lấy Future của lần tải nền gần nhất (None nếu đã tải đồng bộ / không có)"""
+        fut, self.pending_download = self.pending_download, None
+        return fut
+
+    def generate(self, prompt, output_path, on_attempt=None):
+        """
+        Hàm này sẽ được các class con viết lại (Override).
+        on_attempt(n): gọi mỗi lượt thử (lần 2, 3... = đang thử lại) -> báo tiến độ.
+        """
         raise NotImplementedError
 
+    def _dom_snapshot(self, media=None, ids=None, id_child=None, alerts=None, popups=None):
+        """
+        Lấy mọi thứ 1 lần poll cần trong ĐÚNG 1 lần execute_script (JSON thuần):
+        - media: CSS ảnh -> [{src, width (naturalWidth), visible}]
+        - ids / id_child: CSS khối có id (+ ảnh con bên trong) -> [{id, child: {src, width}}]
+        - alerts: CSS thông báo -> [text]
+        - popups: list XPath nút đóng popup -> bấm luôn những nút đang hiện
+        Thay cho việc find_elements rồi gọi get_attribute / is_displayed từng phần tử.
+        """
+        opts = {"media": media, "ids": ids, "id_child": id_child, "alerts": alerts, "popups": popups}
+        try:
+            snap = self.driver.execute_script(DOM_SNAPSHOT_JS, opts)
+            if snap: return snap
+        except Exception:
+            pass
+        return {"media": [], "ids": [], "alerts": [], "popups_closed": 0}
+
+    def _check_limit(self, text):
+        """Thông báo là hết quota / rate limit -> ném ProfileLimited để scheduler chuyển việc sang profile khác"""
+        kind = classify_limit(text) if text and len(text) <= 1000 else None
+        if kind:
+            self.log(f"   🛑 Profile bị giới hạn ({kind}): {text[:80]}")
+            raise ProfileLimited(kind, text)
+
+    def _capture_from_page(self, url, save_path):
+        """
+        Đọc byte ảnh ngay trong trang (fetch blob / HTTP cache của trình duyệt) rồi ghi thẳng ra file.
+        Ảnh đã được trang tải 1 lần -> không tốn thêm 1 lượt qua proxy.
+        """
+        try:
+            self.driver.set_script_timeout(60)
+            result = self.driver.execute_async_script(FETCH_AS_DATA_URL_JS, url) or {}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)[:80]}
+
+        data_url = result.get("data") or ""
+        if result.get("ok") and data_url.startswith("data:") and "," in data_url:
+            write_atomic(save_path, [base64.b64decode(data_url.split(",", 1)[1])])
+            size_kb = (result.get("size") or 0) / 1024
+            self.log(f"✅ Lấy ảnh từ trình duyệt ({size_kb:.0f} KB): {os.path.basename(save_path)}")
+            return True
+
+        self.log(f"⚠️ Không lấy được ảnh từ trình duyệt ({result.get('error')}).")
+        return False
+
     def _download(self, url, save_path):
         """
         Hàm tải file đa năng (All-in-One):
         1. Hỗ trợ ảnh Base64 (data:image/...)
-        2. Hỗ trợ link HTTP bảo mật (tự động nạp Cookies từ Selenium)
+        2. Ảnh blob: / ảnh đã load -> lấy thẳng từ trình duyệt (capture)
+        3. Hỗ trợ link HTTP bảo mật (Cookies từ Selenium, qua DownloadService của profile)
+        File luôn được ghi nguyên tử (.part -> đổi tên).
         """
         try:
             # TRƯỜNG HỢP 1: ẢNH BASE64 (Dữ liệu ảnh nằm trực tiếp trong link)
             if url.startswith("data:image"):
                 self.log("⬇️ Phát hiện ảnh Base64, đang giải mã...")
                 header, encoded = url.split(",", 1)
-                data = base64.b64decode(encoded)
-                with open(save_path, "wb") as f:
-                    f.write(data)
+                write_atomic(save_path, [base64.b64decode(encoded)])
                 self.log(f"✅ Đã lưu ảnh Base64: {os.path.basename(save_path)}")
                 return True
 
-            # TRƯỜNG HỢP 2: LINK HTTP (Cần Cookie để tải từ Google/Flow)
-            else:
-                self.log(f"⬇️ Đang tải file từ URL: {url[:50]}...")
-                
-                # 1. Mượn danh tính (Cookies) từ Selenium
-                selenium_cookies = self.driver.get_cookies()
-                session = requests.Session()
-                for cookie in selenium_cookies:
-                    session.cookies.set(cookie['name'], cookie['value'])
-                
-                # 2. Giả lập trình duyệt (Headers)
-                headers = {
-                    "User-Agent": self.driver.execute_script("return navigator.userAgent;"),
-                    "Referer": self.driver.current_url  # Lấy luôn URL hiện tại làm Referer cho chuẩn
-                }
-
-                # 3. Tải file (Stream mode cho file lớn)
-                response = session.get(url, headers=headers, stream=True, timeout=60)
-                
-                if response.status_code == 200:
-                    with open(save_path, "wb") as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                    self.log(f"✅ Đã lưu file: {os.path.basename(save_path)}")
+            # TRƯỜNG HỢP 2: LẤY TỪ TRÌNH DUYỆT (blob: bắt buộc, http: khi bật capture)
+            if url.startswith("blob:") or self.capture_in_browser:
+                if self._capture_from_page(url, save_path):
                     return True
-                else:
-                    self.log(f"⚠️ Lỗi tải HTTP: {response.status_code}")
+                if url.startswith("blob:"):
                     return False
 
+            # TRƯỜNG HỢP 3: LINK HTTP (Cần Cookie để tải từ Google/Flow)
+            self.log(f"⬇️ Đang tải file từ URL: {url[:50]}...")
+            fut = self.downloader.submit(self.driver, url, save_path, log=self.log)
+            if self.async_download:
+                # Trình duyệt làm prompt tiếp theo luôn, việc tải chạy ở luồng nền
+                self.pending_download = fut
+                return True
+            return fut.result()
+
         except Exception as e:
             self.log(f"❌ Lỗi khi lưu file: {e}")
             return False
@@ -75,13 +128,17 @@ class BaseVisualDriver:
 # DRIVER 2: FLOW (WEB UI)
 # ==========================================
 class FlowDriver(BaseVisualDriver):
-    def generate(self, prompt, output_path):
+    @staticmethod
+    def _prompt_text(prompt):
+        if isinstance(prompt, dict):
+            return prompt.get("visual_prompt", prompt.get("prompt", str(prompt)))
+        return str(prompt)
+
+    def generate(self, prompt, output_path, on_attempt=None):
         cfg = VISUAL_CONFIGS["flow"]
         timeout = cfg.get("WAIT_TIME", 180)
         
-        prompt_text = str(prompt)
-        if isinstance(prompt, dict):
-            prompt_text = prompt.get("visual_prompt", prompt.get("prompt", str(prompt)))
+        prompt_text = self._prompt_text(prompt)
 
         # 1. ĐIỀU HƯỚNG & SNAPSHOT BAN ĐẦU
         if not self._navigate_to_project(cfg):
@@ -89,24 +146,27 @@ class FlowDriver(BaseVisualDriver):
 
         # [QUAN TRỌNG] Lấy danh sách ảnh gốc TRƯỚC KHI LÀM BẤT CỨ GÌ
         # Để sau này dù có F5 bao nhiêu lần, ta vẫn so sánh với mốc này
-        initial_media_srcs = self._get_current_media_srcs(cfg["RESULT_ELEMENT"])
+        # Đồng thời cài watcher trong trang để bắt ảnh mới ngay khi xuất hiện
+        initial_media_srcs = self._install_media_watcher(cfg["RESULT_ELEMENT"])
         self.log(f"📸 Snapshot ban đầu: {len(initial_media_srcs)} media.")
 
         # 2. VÒNG LẶP THỰC HIỆN
         MAX_RETRIES = 5
         for attempt in range(1, MAX_RETRIES + 1):
             self.log(f"🔄 [Lần {attempt}/{MAX_RETRIES}] Bắt đầu...")
+            if on_attempt: on_attempt(attempt)
             
             try:
                 # --- LOGIC XỬ LÝ KHI RETRY (F5) ---
                 if attempt > 1:
                     self.log("   -> ⚠️ Refresh để kiểm tra lại...")
                     self.driver.refresh()
-                    time.sleep(random.randint(3, 5)) # Chờ load lại history
+                    self.pacer.wait("page_load") # Chờ load lại history
                     self._close_blocking_popups()
 
                     # [CHECK THÔNG MINH] Kiểm tra ngay xem sau khi F5, ảnh của lần trước có hiện ra không?
-                    current_srcs = self._get_current_media_srcs(cfg["RESULT_ELEMENT"])
+                    # (F5 xóa watcher cũ -> cài lại, lấy ảnh hiện có làm mốc cho lần tạo mới)
+                    current_srcs = self._install_media_watcher(cfg["RESULT_ELEMENT"])
                     ghost_items = list(current_srcs - initial_media_srcs)
                     
                     # Lọc lấy ảnh hợp lệ
@@ -140,13 +200,159 @@ class FlowDriver(BaseVisualDriver):
                 else:
                      self.log(f"   ⚠️ Lần {attempt} thất bại (Timeout/Lỗi).")
 
+            except ProfileLimited:
+                raise
             except Exception as e:
                 self.log(f"   ❌ Lỗi Fatal: {e}")
-                time.sleep(random.randint(2, 4))
+                self.pacer.wait("retry")
 
         self.log("❌ THẤT BẠI TOÀN TẬP.")
         return False
 
+    def generate_pipeline(self, next_job, on_result, depth=3, tabs=1, on_attempt=None):
+        """
+        Chế độ NỐI ĐUÔI: mỗi tab (1 dự án Flow) luôn giữ tối đa `depth` prompt đang chạy.
+        tabs > 1: mở thêm tab trong cùng trình duyệt, worker chuyển tab lần lượt (không thêm profile/proxy).
+        - next_job() -> (key, prompt, output_path) hoặc None khi hết việc
+        - on_result(key, ok): ok là bool, hoặc Future(bool) nếu ảnh đang tải nền
+        - on_attempt(key, n): mỗi lần gửi prompt (lần 2, 3... = gửi lại sau lỗi / timeout)
+        Ảnh mới được ghép với prompt theo alt text, không khớp -> theo thứ tự gửi (FIFO).
+        Prompt lỗi/timeout được gửi lại (tối đa MAX_RETRIES lần). Trả về False nếu phải bỏ ngang.
+        """
+        cfg = VISUAL_CONFIGS["flow"]
+        timeout = cfg.get("WAIT_TIME", 180) + 30
+        outputs = max(1, cfg.get("OUTPUTS_PER_PROMPT", 1))
+        MAX_RETRIES = 3
+        retries = deque()   # prompt lỗi chờ gửi lại (tab nào rảnh thì nhận)
+        source = {"exhausted": False}
+        lanes = []          # mỗi tab: {"handle", "inflight": prompt đã gửi, cũ nhất ở đầu}
+
+        def fail(job, reason):
+            self.log(f"   ⚠️ {reason}: {job['prompt'][:40]}...")
+            if job["attempt"] < MAX_RETRIES:
+                retries.append(job)
+            else:
+                self.log(f"   ❌ Bỏ prompt sau {MAX_RETRIES} lần.")
+                on_result(job["key"], False)
+
+        def take_job():
+            if retries:
+                return retries.popleft()
+            if source["exhausted"]:
+                return None
+            nxt = next_job()
+            if nxt is None:
+                source["exhausted"] = True
+                return None
+            key, prompt, output_path = nxt
+            return {"key": key, "prompt": self._prompt_text(prompt), "path": output_path, "attempt": 0}
+
+        try:
+            # 0. MỖI TAB 1 DỰ ÁN RIÊNG
+            for handle in open_tabs(self.driver, max(1, tabs)):
+                self.driver.switch_to.window(handle)
+                if not self._navigate_to_project(cfg):
+                    continue
+                self._install_media_watcher(cfg["RESULT_ELEMENT"])
+                lanes.append({"handle": handle, "inflight": deque()})
+            if not lanes:
+                return False
+            if len(lanes) > 1:
+                self.log(f"   🗂️ Chạy {len(lanes)} tab x {depth} prompt.")
+
+            while True:
+                busy = False
+                for lane in lanes:
+                    inflight = lane["inflight"]
+                    if len(lanes) > 1:
+                        self.driver.switch_to.window(lane["handle"])
+
+                    # 1. BƠM PROMPT CHO ĐỦ `depth`
+                    while len(inflight) < depth:
+                        job = take_job()
+                        if job is None: break
+                        job["attempt"] += 1
+                        if on_attempt: on_attempt(job["key"], job["attempt"])
+                        self._close_blocking_popups()
+                        if self._input_prompt(job["prompt"]) and self._click_generate():
+                            job.update(sent=time.time(), left=outputs, saved=False)
+                            inflight.append(job)
+                            self.log(f"   📤 Đã gửi ({len(inflight)}/{depth}): {job['prompt'][:40]}...")
+                        else:
+                            fail(job, "Không gửi được prompt")
+
+                    if not inflight: continue
+                    busy = True
+
+                    # 2. CHỜ SỰ KIỆN TIẾP THEO (ảnh mới / alert lỗi)
+                    # 1 tab: chờ tối đa 15s. Nhiều tab: chỉ ghé qua 1s rồi sang tab khác
+                    max_wait = 15 if len(lanes) == 1 else 1
+                    wait_s = min(max_wait, max(1, inflight[0]["sent"] + timeout - time.time()))
+                    try:
+                        self.driver.set_script_timeout(wait_s + 10)
+                        result = self.driver.execute_async_script(WAIT_FOR_NEW_MEDIA_JS, int(wait_s * 1000)) or {}
+                    except WebDriverException:
+                        if not self.driver.window_handles: raise
+                        result = {"status": "no_watcher"}
+
+                    status = result.get("status")
+                    if status == "media":
+                        item = result["item"]
+                        job = self._match_job(inflight, item.get("alt"))
+                        job["left"] -= 1
+                        if not job["saved"]:
+                            if self._download(item["src"], job["path"]):
+                                job["saved"] = True
+                                pending = self.take_pending_download()
+                                on_result(job["key"], pending if pending is not None else True)
+                            else:
+                                inflight.remove(job)
+                                fail(job, "Tải lỗi")
+                                continue
+                        if job["left"] <= 0:
+                            inflight.remove(job)
+                    elif status == "error":
+                        # Alert không nói rõ prompt nào -> tính cho prompt cũ nhất chưa có ảnh
+                        self._check_limit(result.get("text", ""))
+                        job = next((j for j in inflight if not j["saved"]), inflight[0])
+                        inflight.remove(job)
+                        if not job["saved"]:
+                            fail(job, f"Flow báo lỗi ({result.get('text', '')[:40]})")
+                    elif status == "no_watcher":
+                        # Trang bị tải lại -> cài lại watcher
+                        self._install_media_watcher(cfg["RESULT_ELEMENT"])
+
+                    if inflight and time.time() - inflight[0]["sent"] > timeout:
+                        job = inflight.popleft()
+                        if not job["saved"]:
+                            fail(job, "Timeout")
+
+                if not busy and not retries:
+                    return True
+
+        except Exception as e:
+            # Dính giới hạn: cảnh dở dang không báo kết quả -> scheduler trả đúng các cảnh này về hàng đợi cho profile khác
+            if isinstance(e, ProfileLimited): raise
+            self.log(f"   ❌ Lỗi Fatal (pipeline): {e}")
+            for job in [j for lane in lanes for j in lane["inflight"]] + list(retries):
+                if not job.get("saved"): on_result(job["key"], False)
+            return False
+        finally:
+            if len(lanes) > 1 or tabs > 1:
+                close_extra_tabs(self.driver)
+
+    @staticmethod
+    def _match_job(inflight, alt):
+        """Ghép ảnh mới với prompt đang chờ: theo alt text nếu có, không thì prompt gửi sớm nhất"""
+        def norm(text): return " ".join(str(text or "").lower().split())
+        alt = norm(alt)
+        if len(alt) >= 12:
+            for job in inflight:
+                text = norm(job["prompt"])
+                if alt[:60] in text or text[:60] in alt:
+                    return job
+        return inflight[0]
+
     # --- CÁC HÀM HỖ TRỢ RIÊNG ---
 
     def _navigate_to_project(self, cfg):
@@ -155,13 +361,13 @@ class FlowDriver(BaseVisualDriver):
                 self.log("✅ Đang ở trong dự án.")
                 return True
             self.driver.get(cfg["URL"])
-            time.sleep(random.randint(2,5))
+            self.pacer.wait("page_load")
             self._close_blocking_popups()
             wait = WebDriverWait(self.driver, 10)
             new_proj_btn = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'Dự án mới') or contains(., 'New project')]")))
             self._human_click(new_proj_btn)
             WebDriverWait(self.driver, 15).until(EC.url_contains("/project/"))
-            time.sleep(random.randint(2,5))
+            self.pacer.wait("page_load")
             return True
         except: return False
 
@@ -175,7 +381,7 @@ class FlowDriver(BaseVisualDriver):
                 input_box = wait.until(EC.presence_of_element_located((By.TAG_NAME, "textarea")))
 
             self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", input_box)
-            time.sleep(random.randint(2,3))
+            self.pacer.wait("scroll")
             
             # Xóa sạch
             try: input_box.clear() 
@@ -188,7 +394,7 @@ class FlowDriver(BaseVisualDriver):
             
             self.log(f"   ⌨️ Nhập prompt...")
             input_box.send_keys(text)
-            time.sleep(random.randint(2,3))
+            self.pacer.wait("type")
             return True
         except: return False
 
@@ -201,13 +407,52 @@ class FlowDriver(BaseVisualDriver):
             except:
                 input_box = self.driver.find_element(By.TAG_NAME, "textarea")
             
+            # Giữ khoảng cách tối thiểu giữa 2 lần gửi prompt trên cùng profile
+            self.pacer.wait("submit")
             input_box.send_keys(Keys.ENTER)
             return True
         except: return False
 
+    def _install_media_watcher(self, selector, baseline=None):
+        """
+        Cài MutationObserver trong trang: ghi lại mọi ảnh mới + alert lỗi ngay khi xuất hiện.
+        Trả về set src hiện có (dùng làm snapshot). Lỗi JS -> quay về quét kiểu cũ.
+        """
+        try:
+            srcs = self.driver.execute_script(INSTALL_MEDIA_WATCHER_JS, selector, list(baseline) if baseline else None, limit_regex())
+            return set(srcs or [])
+        except Exception:
+            return self._get_current_media_srcs(selector)
+
     def _wait_for_result(self, selector, initial_srcs, timeout):
         """
-        Chờ kết quả mới dựa trên sự khác biệt với initial_srcs (Snapshot ban đầu)
+        Chờ ảnh mới bằng watcher trong trang: 1 lệnh async trả về ngay khi có ảnh mới hoặc alert lỗi
+        (không còn poll get_attribute từng ảnh mỗi 2-4s).
+        """
+        try:
+            # Như logic cũ: chờ loading (timeout) + quét thêm 30s
+            self.driver.set_script_timeout(timeout + 40)
+            result = self.driver.execute_async_script(WAIT_FOR_NEW_MEDIA_JS, (timeout + 30) * 1000) or {}
+        except Exception as e:
+            self.log(f"   ⚠️ Watcher lỗi ({str(e)[:40]}) -> Quét kiểu cũ.")
+            result = {"status": "no_watcher"}
+
+        status = result.get("status")
+        if status == "media":
+            src = result["item"]["src"]
+            self.log(f"   🎉 Có hàng mới: {src[:50]}...")
+            return src
+        if status == "error":
+            self._check_limit(result.get("text", ""))
+            self.log(f"   ⚠️ Flow báo lỗi: {result.get('text', '')[:80]}")
+            return None
+        if status == "timeout":
+            return None
+        return self._poll_for_result(selector, initial_srcs, timeout)
+
+    def _poll_for_result(self, selector, initial_srcs, timeout):
+        """
+        [DỰ PHÒNG] Chờ kết quả mới dựa trên sự khác biệt với initial_srcs (Snapshot ban đầu)
         """
         start_time = time.time()
         
@@ -219,17 +464,17 @@ class FlowDriver(BaseVisualDriver):
             WebDriverWait(self.driver, timeout).until_not(
                 EC.presence_of_element_located((By.XPATH, "//div[contains(text(), '%') or contains(text(), 'Generating')]"))
             )
-            time.sleep(random.randint(2,3))
+            self.pacer.wait("poll")
         except: pass
 
-        # 2. Quét ảnh
+        # 2. Quét ảnh (ảnh + alert lấy chung 1 lần gọi)
         while time.time() - start_time < 30: # Quét thêm 30s sau khi loading xong
-            try:
-                err = self.driver.find_element(By.XPATH, "//div[contains(@role, 'alert')]")
-                if "Failed" in err.text or "lỗi" in err.text.lower(): return None
-            except: pass
+            snap = self._dom_snapshot(media=selector, alerts="div[role*='alert']")
+            for err_text in snap["alerts"]:
+                self._check_limit(err_text)
+                if "Failed" in err_text or "lỗi" in err_text.lower(): return None
 
-            current_srcs = self._get_current_media_srcs(selector)
+            current_srcs = {m["src"] for m in snap["media"] if m["src"]}
             
             # So sánh với SNAPSHOT BAN ĐẦU (initial_srcs)
             new_items = list(current_srcs - initial_srcs)
@@ -238,39 +483,33 @@ class FlowDriver(BaseVisualDriver):
                 if src and ("blob:" in src or "http" in src):
                     self.log(f"   🎉 Có hàng mới: {src[:50]}...")
                     return src
-            time.sleep(random.randint(2,4))
+            self.pacer.wait("poll")
         return None
 
     def _close_blocking_popups(self):
-        try:
-            xpaths = ["//button[contains(@aria-label, 'Close')]", "//button[contains(., 'Got it')]", "//div[contains(@class, 'toast')]//button"]
-            for xp in xpaths:
-                els = self.driver.find_elements(By.XPATH, xp)
-                for el in els:
-                    if el.is_displayed(): self.driver.execute_script("arguments[0].click();", el)
-        except: pass
+        xpaths = ["//button[contains(@aria-label, 'Close')]", "//button[contains(., 'Got it')]", "//div[contains(@class, 'toast')]//button"]
+        self._dom_snapshot(popups=xpaths)
 
     def _human_click(self, element):
         try:
             self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", element)
-            time.sleep(random.randint(1 ,2))
+            self.pacer.wait("scroll")
             element.click()
         except: self.driver.execute_script("arguments[0].click();", element)
 
     def _get_current_media_srcs(self, selector_css):
-        try:
-            elements = self.driver.find_elements(By.CSS_SELECTOR, f"{selector_css}")
-            srcs = set()
-            for el in elements:
-                src = el.get_attribute("src")
-                if src: srcs.add(src)
-            return srcs
-        except: return set()      
+        snap = self._dom_snapshot(media=selector_css)
+        return {m["src"] for m in snap["media"] if m["src"]}
 
 # ==========================================
 # DRIVER 2: GOOGLE VEO (OPTIMIZED LOGIC)
 # ==========================================
 class GoogleVeoDriver(BaseVisualDriver):
+    def __init__(self, driver, log_callback=None, **kwargs):
+        super().__init__(driver, log_callback, **kwargs)
+        # Driver ấm từ pool có thể đang đứng ở trang Gemini của Step 2 (chưa chọn Tool)
+        # -> Không dựa vào URL nữa, mỗi worker mới luôn setup lại 1 lần
+        self._tools_ready = False
     
     def _js_click(self, element):
         """Hàm click cưỡng chế bằng JS"""
@@ -279,10 +518,10 @@ class GoogleVeoDriver(BaseVisualDriver):
     def _setup_gemini_tools(self, wait):
         """
         Cấu hình Tool & Model.
-        Hàm này có sẵn thời gian chờ 5s ở đầu để trang ổn định sau khi F5.
+        Hàm này có sẵn 1 nhịp chờ "page_load" ở đầu để trang ổn định sau khi F5.
         """
-        self.log("   ⏳ Đợi 5s cho trang ổn định...")
-        time.sleep(5) 
+        self.log("   ⏳ Đợi trang ổn định...")
+        self.pacer.wait("page_load")
         
         self.log("   ⚙️ Đang cấu hình Tool & Model...")
         
@@ -291,13 +530,13 @@ class GoogleVeoDriver(BaseVisualDriver):
             xpath_tool_menu = "//toolbox-drawer//button" 
             btn_tool_menu = wait.until(EC.presence_of_element_located((By.XPATH, xpath_tool_menu)))
             self._js_click(btn_tool_menu)
-            time.sleep(1.5)
+            self.pacer.wait("menu")
 
             xpath_gen_img = "//*[contains(text(), 'Generate image') or contains(text(), 'Tạo hình ảnh')]"
             btn_gen_img = wait.until(EC.presence_of_element_located((By.XPATH, xpath_gen_img)))
             self._js_click(btn_gen_img)
             self.log("      ✅ Đã chọn Tool: Tạo hình ảnh.")
-            time.sleep(2)
+            self.pacer.wait("menu")
         except Exception as e: self.log(f"      ⚠️ Warning Tool: {e}")
 
         # --- 2. CHỌN CHẾ ĐỘ PRO ---
@@ -305,16 +544,16 @@ class GoogleVeoDriver(BaseVisualDriver):
             xpath_model_menu = "//bard-mode-switcher//button"
             btn_model_menu = wait.until(EC.presence_of_element_located((By.XPATH, xpath_model_menu)))
             self._js_click(btn_model_menu)
-            time.sleep(1.5)
+            self.pacer.wait("menu")
 
             xpath_pro = "//*[contains(text(), 'Pro') or contains(text(), 'Advanced') or contains(text(), 'Nâng cao')]"
             btn_pro = wait.until(EC.presence_of_element_located((By.XPATH, xpath_pro)))
             self._js_click(btn_pro)
             self.log("      ✅ Đã chọn Model: Pro/Advanced.")
-            time.sleep(2)
+            self.pacer.wait("menu")
         except Exception as e: self.log(f"      ⚠️ Warning Model: {e}")
 
-    def generate(self, prompt, output_path):
+    def generate(self, prompt, output_path, on_attempt=None):
         cfg = VISUAL_CONFIGS["google_veo"]
         MAX_RETRIES = 3 
         
@@ -328,6 +567,7 @@ class GoogleVeoDriver(BaseVisualDriver):
 
         for attempt in range(1, MAX_RETRIES + 1):
             self.log(f"🔄 [Lần {attempt}/{MAX_RETRIES}] Bắt đầu...")
+            if on_attempt: on_attempt(attempt)
             
             try:
                 wait = WebDriverWait(self.driver, 60)
@@ -339,7 +579,7 @@ class GoogleVeoDriver(BaseVisualDriver):
                 if attempt > 1:
                     self.log("   -> ⚠️ Refresh trang...")
                     self.driver.refresh()
-                    # Không cần sleep ở đây nữa vì hàm _setup_gemini_tools đã có sleep(5) ở đầu
+                    # Không cần chờ ở đây nữa vì hàm _setup_gemini_tools đã chờ "page_load" ở đầu
                     need_setup = True 
                 
                 # TRƯỜNG HỢP 2: Chưa vào đúng trang -> Vào trang -> Bắt buộc Setup
@@ -348,8 +588,9 @@ class GoogleVeoDriver(BaseVisualDriver):
                     need_setup = True
                 
                 # 👇 CHỈ CHẠY SETUP KHI CẦN THIẾT
-                if need_setup:
+                if need_setup or not self._tools_ready:
                     self._setup_gemini_tools(wait)
+                    self._tools_ready = True
                 else:
                     self.log("   ⏩ Môi trường ổn định, bỏ qua bước chọn Tool.")
 
@@ -357,10 +598,7 @@ class GoogleVeoDriver(BaseVisualDriver):
                 # BƯỚC 1: SNAPSHOT ID CŨ
                 # ====================================================
                 id_selector = "[id^='model-response-message-content']"
-                try:
-                    elements = self.driver.find_elements(By.CSS_SELECTOR, id_selector)
-                    old_ids = set([e.get_attribute("id") for e in elements if e.get_attribute("id")])
-                except: old_ids = set()
+                old_ids = {item["id"] for item in self._dom_snapshot(ids=id_selector)["ids"] if item["id"]}
                 self.log(f"   📸 Đã nhớ {len(old_ids)} tin nhắn cũ.")
 
                 # ====================================================
@@ -370,11 +608,11 @@ class GoogleVeoDriver(BaseVisualDriver):
                     input_box = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, cfg["INPUT_BOX"])))
                     
                     self.driver.execute_script("arguments[0].click();", input_box)
-                    time.sleep(0.5)
+                    self.pacer.wait("click")
                     
                     input_box.send_keys(Keys.CONTROL + "a")
                     input_box.send_keys(Keys.DELETE)
-                    time.sleep(0.5)
+                    self.pacer.wait("click")
                     
                     full_prompt = f"Generate an image: {prompt_str}"
                     self.driver.execute_script(
@@ -384,7 +622,8 @@ class GoogleVeoDriver(BaseVisualDriver):
                         elm.dispatchEvent(new Event('input', { bubbles: true }));
                         """, input_box, full_prompt
                     )
-                    time.sleep(random.randint(1, 2))
+                    self.pacer.wait("type")
+                    self.pacer.wait("submit")
                     
                     try:
                         btn = self.driver.find_element(By.CSS_SELECTOR, cfg["CREATE_BTN"])
@@ -406,38 +645,46 @@ class GoogleVeoDriver(BaseVisualDriver):
                 
                 while time.time() - start_time < timeout:
                     try:
-                        current_elements = self.driver.find_elements(By.CSS_SELECTOR, id_selector)
+                        # 1 lần gọi: mọi id tin nhắn + ảnh (src, naturalWidth) bên trong từng tin
+                        snap = self._dom_snapshot(ids=id_selector, id_child="generated-image img")
                         
-                        target_id = None
-                        for el in reversed(current_elements):
-                            eid = el.get_attribute("id")
-                            if eid and eid not in old_ids:
-                                target_id = eid
+                        target = None
+                        for item in reversed(snap["ids"]):
+                            if item["id"] and item["id"] not in old_ids:
+                                target = item
                                 break 
                         
-                        if target_id:
-                            target_xpath = f"//*[@id='{target_id}']//generated-image//img"
-                            try:
-                                img_element = self.driver.find_element(By.XPATH, target_xpath)
-                                self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", img_element)
-                                
-                                src = img_element.get_attribute("src")
-                                w = self.driver.execute_script("return arguments[0].naturalWidth;", img_element)
-                                
-                                if src and "http" in src and w and int(w) > 300:
-                                    self.log(f"   🔍 Bắt được ảnh: {w}px")
-                                    if self._download(src, output_path):
-                                        return True
-                            except: pass
+                        if target and not target.get("child"):
+                            # Tin nhắn mới không có ảnh -> có thể là thông báo hết lượt
+                            self._check_limit(target.get("text", ""))
+
+                        if target and target.get("child"):
+                            src = target["child"]["src"]
+                            w = target["child"]["width"]
+                            
+                            if src and "http" in src and w and int(w) > 300:
+                                self.log(f"   🔍 Bắt được ảnh: {w}px")
+                                if self._download(src, output_path):
+                                    return True
+                            else:
+                                # Ảnh chưa load đủ -> cuộn tới để trang tải ảnh (lazy load)
+                                self.driver.execute_script(
+                                    "var img = document.querySelector(arguments[0]);"
+                                    "if (img) img.scrollIntoView({behavior: 'smooth', block: 'center'});",
+                                    f"[id='{target['id']}'] generated-image img"
+                                )
                                 
+                    except ProfileLimited: raise
                     except Exception: pass
-                    time.sleep(2)
+                    self.pacer.wait("poll")
 
                 self.log(f"   ⚠️ Timeout lần {attempt}.")
             
+            except ProfileLimited:
+                raise
             except Exception as e:
                 self.log(f"   ❌ Lỗi Fatal: {e}")
             
-            if attempt < MAX_RETRIES: time.sleep(random.randint(3, 5))
+            if attempt < MAX_RETRIES: self.pacer.wait("retry")
 
         return False
\ No newline at end of file
@@ -1,18 +1,73 @@
 import os
 import json
 import traceback
-import time
-import random
 from utils.browser_setup import init_driver_from_profile
+from concurrent.futures import Future
+from config.settings import DOWNLOAD_ASYNC, CAPTURE_FROM_BROWSER, LEAN_MODE
+from config.selectors import VISUAL_CONFIGS
 from services.visual_drivers import FlowDriver, GoogleVeoDriver
+from services.download_service import get_download_service
+from utils.pacing import get_pacer
+from utils.image_store import IMAGE_STORE
+from utils.profile_health import ProfileLimited, PROFILE_HEALTH
+
+def load_scenes(input_prompts_path):
+    """
+    Đọc file prompts JSON -> list (index, prompt).
+    Cảnh không có nội dung bị bỏ qua, index trùng chỉ giữ lần xuất hiện đầu.
+    """
+    with open(input_prompts_path, 'r', encoding='utf-8') as f:
+        prompts_data = json.load(f)
+
+    scenes, seen = [], set()
+    for i, item in enumerate(prompts_data):
+        # Logic lấy prompt (đơn giản hóa để không bị lỗi Key)
+        prompt = ""
+        index = i + 1
+        
+        if isinstance(item, dict):
+            index = item.get("index", i+1)
+            # Thử lấy visual_prompt, nếu không có thì lấy prompt, text...
+            prompt = item.get("visual_prompt") or item.get("prompt") or item.get("text")
+        else:
+            prompt = str(item)
+
+        if not prompt: 
+            print(f"[VisualGen] ⚠️ Cảnh {index} không có nội dung -> Skip")
+            continue
+        if str(index) in seen: continue
+        seen.add(str(index))
+        scenes.append((index, prompt))
+    return scenes
+
+def scene_output_path(output_folder, index):
+    return os.path.join(output_folder, f"{index}.png")
 
 class VisualGenerator:
-    def __init__(self, engine="flow", status_callback=None):
+    def __init__(self, engine="flow", status_callback=None, driver_pool=None, async_download=DOWNLOAD_ASYNC,
+                 capture_in_browser=CAPTURE_FROM_BROWSER, pipeline_depth=VISUAL_CONFIGS["flow"]["PIPELINE_DEPTH"],
+                 tabs=1, lean_mode=LEAN_MODE, image_store=IMAGE_STORE):
         self.engine = engine
         self.status_callback = status_callback
+        # Nếu có pool -> mượn/trả driver ấm thay vì mở/tắt Orbita mỗi file
+        self.driver_pool = driver_pool
+        # Tải ảnh ở luồng nền -> trình duyệt vẽ cảnh tiếp theo ngay
+        self.async_download = async_download
+        # Lấy byte ảnh từ trình duyệt thay vì tải lại qua proxy
+        self.capture_in_browser = capture_in_browser
+        # Flow: gửi trước tối đa N prompt cùng lúc (1 = tuần tự)
+        self.pipeline_depth = pipeline_depth
+        # Flow: số tab (dự án) chạy song song trong cùng 1 trình duyệt
+        self.tabs = max(1, int(tabs))
+        # Chặn font/analytics nhưng GIỮ ảnh/video kết quả (blocklist "visual")
+        self.lean = "visual" if lean_mode else None
+        # Kho ảnh theo engine + prompt: prompt đã vẽ ở file khác -> link ảnh cũ
+        self.image_store = image_store
         self.driver = None
         self.worker = None
         self.profile_name = "Unknown"
+        self.current_profile_json = None
+        self.download_dir = None
 
     def _log(self, msg):
         tag = f"[{self.profile_name}]"
@@ -20,85 +75,207 @@ class VisualGenerator:
         if self.status_callback: 
             self.status_callback(f"{tag} {msg}")
 
-    def generate_images(self, input_prompts_path, output_folder, profile_json_path):
+    def _open_driver(self, profile_json_path, download_dir):
+        if self.driver_pool:
+            return self.driver_pool.acquire(profile_json_path, log_callback=self._log, download_dir=download_dir, lean=self.lean)
+        return init_driver_from_profile(profile_json_path, log_callback=self._log, download_dir=download_dir, lean=self.lean)
+
+    def _count_work(self):
+        """1 cảnh xong -> báo pool (đủ DRIVER_POOL_MAX_TASKS việc thì lúc trả về driver bị tắt, lần sau mở bản mới)"""
+        if self.driver_pool and self.driver: self.driver_pool.add_work(self.driver)
+
+    def _close_driver(self, discard=False):
+        """Trả driver về pool (hoặc tắt hẳn nếu chạy không có pool)"""
+        if not self.driver: return
+        if self.driver_pool:
+            self.driver_pool.release(self.driver, discard=discard)
+        else:
+            try: self.driver.quit()
+            except: pass
+        self.driver = None
+
+    # =========================================================================
+    # MƯỢN / TRẢ TRÌNH DUYỆT (Dùng chung cho chạy theo file & scheduler theo cảnh)
+    # =========================================================================
+    def attach(self, profile_json_path, download_dir=None):
+        """Mở (mượn) driver + tạo worker theo engine. Trả về True nếu OK."""
         self.profile_name = os.path.splitext(os.path.basename(profile_json_path))[0]
+        self.current_profile_json = profile_json_path
+        self.download_dir = download_dir
         
-        # 1. MỞ TRÌNH DUYỆT (Hiện màn hình)
-        self.driver = init_driver_from_profile(
-            profile_json_path, 
-            log_callback=self._log, 
-            download_dir=output_folder
-        )
+        # 1. MỞ TRÌNH DUYỆT (Hiện màn hình) - hoặc mượn driver ấm từ pool
+        self.driver = self._open_driver(profile_json_path, download_dir=download_dir)
         
         if not self.driver: 
             self._log("❌ Không thể khởi tạo Driver.")
             return False
 
+        # 2. CHỌN WORKER (Logic cũ của bạn)
+        self._log(f"🔧 Engine đang chạy: {self.engine}")
+        worker_opts = {
+            "downloader": get_download_service(self.profile_name),
+            "async_download": self.async_download,
+            "capture_in_browser": self.capture_in_browser,
+            "pacer": get_pacer(self.profile_name),
+        }
+        if self.engine == "flow":
+            self.worker = FlowDriver(self.driver, self._log, **worker_opts)
+        elif self.engine == "google_veo":
+            self.worker = GoogleVeoDriver(self.driver, self._log, **worker_opts)
+        else:
+            self._log("❌ Engine không hợp lệ")
+            self._close_driver()
+            return False
+        return True
+
+    def detach(self):
+        self.worker = None
+        self._close_driver()
+
+    def is_alive(self):
         try:
-            # 2. CHỌN WORKER (Logic cũ của bạn)
-            self._log(f"🔧 Engine đang chạy: {self.engine}")
-            if self.engine == "flow":
-                self.worker = FlowDriver(self.driver, self._log)
-            elif self.engine == "google_veo":
-                self.worker = GoogleVeoDriver(self.driver, self._log)
-            else:
-                self._log("❌ Engine không hợp lệ")
-                return False
+            return bool(self.driver and self.driver.window_handles)
+        except Exception:
+            return False
+
+    def revive(self):
+        """Chrome sập -> bỏ driver cũ khỏi pool, mở lại driver + worker mới"""
+        self._log("🚑 Đang HỒI SINH trình duyệt...")
+        self.worker = None
+        self._close_driver(discard=True)
+        return self.attach(self.current_profile_json, download_dir=self.download_dir)
+
+    def generate_scene(self, index, prompt, output_path, on_attempt=None):
+        """
+        Vẽ 1 cảnh. Ảnh được ghi nguyên tử (.part -> {index}.png)
+        -> Chạy lại (resume) không bao giờ nhầm file tải dở là đã xong.
+        Trả về bool, hoặc Future(bool) nếu ảnh đang được tải nền.
+        on_attempt(n): lượt thử bên trong driver (lần 2, 3... = đang thử lại).
+        """
+        self._log(f"🎨 Đang vẽ cảnh {index}...")
+        
+        # GỌI HÀM CỦA BẠN ĐỂ VẼ
+        is_done = self.worker.generate(prompt, output_path, on_attempt=on_attempt)
+        pending = self.worker.take_pending_download()
+
+        if is_done and pending is not None:
+            def report(fut):
+                if not fut.result(): self._log(f"❌ Thất bại cảnh {index} (lỗi tải)")
+            pending.add_done_callback(report)
+            return pending
 
+        if not is_done:
+            self._log(f"❌ Thất bại cảnh {index}")
+        return is_done
+
+    def uses_pipeline(self):
+        return isinstance(self.worker, FlowDriver) and (self.pipeline_depth > 1 or self.tabs > 1)
+
+    def generate_pipeline(self, next_scene, on_result, on_attempt=None):
+        """
+        Vẽ liên tục các cảnh lấy từ next_scene() -> (key, index, prompt, output_path) hoặc None.
+        Kết quả từng cảnh trả qua on_result(key, ok) (ok là bool hoặc Future), lượt thử qua on_attempt(key, n).
+        Flow: gửi trước nhiều prompt / nhiều tab cùng lúc. Engine khác: vẽ tuần tự.
+        """
+        if not self.uses_pipeline():
+            while True:
+                scene = next_scene()
+                if scene is None: return True
+                key, index, prompt, output_path = scene
+                on_result(key, self.generate_scene(index, prompt, output_path,
+                                                   on_attempt=(lambda n, key=key: on_attempt(key, n)) if on_attempt else None))
+
+        self._log(f"🚀 Chế độ nối đuôi: {self.tabs} tab x tối đa {self.pipeline_depth} prompt cùng lúc.")
+
+        def next_job():
+            scene = next_scene()
+            if scene is None: return None
+            key, index, prompt, output_path = scene
+            self._log(f"🎨 Đang vẽ cảnh {index}...")
+            return (key, index), prompt, output_path
+
+        def report(job_key, ok):
+            key, index = job_key
+            if isinstance(ok, Future):
+                ok.add_done_callback(lambda fut: fut.result() or self._log(f"❌ Thất bại cảnh {index} (lỗi tải)"))
+            elif not ok:
+                self._log(f"❌ Thất bại cảnh {index}")
+            on_result(key, ok)
+
+        def attempt(job_key, n):
+            if on_attempt: on_attempt(job_key[0], n)
+
+        return self.worker.generate_pipeline(next_job, report, self.pipeline_depth, tabs=self.tabs, on_attempt=attempt)
+
+    # =========================================================================
+    # HÀM CHÍNH: 1 FILE PROMPTS / 1 PROFILE
+    # =========================================================================
+    def generate_images(self, input_prompts_path, output_folder, profile_json_path):
+        if not self.attach(profile_json_path, download_dir=output_folder):
+            return False
+
+        try:
             # 3. ĐỌC PROMPTS
-            with open(input_prompts_path, 'r', encoding='utf-8') as f:
-                prompts_data = json.load(f)
+            scenes = load_scenes(input_prompts_path)
 
-            self._log(f"🖼️ Bắt đầu xử lý {len(prompts_data)} ảnh...")
+            self._log(f"🖼️ Bắt đầu xử lý {len(scenes)} ảnh...")
             success_count = 0
+            downloads = []  # Future các ảnh đang tải nền
             
-            for i, item in enumerate(prompts_data):
-                # Logic lấy prompt (đơn giản hóa để không bị lỗi Key)
-                prompt = ""
-                index = i + 1
-                
-                if isinstance(item, dict):
-                    index = item.get("index", i+1)
-                    # Thử lấy visual_prompt, nếu không có thì lấy prompt, text...
-                    prompt = item.get("visual_prompt") or item.get("prompt") or item.get("text")
-                else:
-                    prompt = str(item)
-
-                if not prompt: 
-                    self._log(f"⚠️ Cảnh {index} không có nội dung -> Skip")
-                    continue
-
-                file_name = f"{index}.png" 
-                full_output_path = os.path.join(output_folder, file_name)
+            pending = []
+            for index, prompt in scenes:
+                full_output_path = scene_output_path(output_folder, index)
 
                 # Skip nếu đã có ảnh
                 if os.path.exists(full_output_path):
                     self._log(f"⏩ Cảnh {index} đã xong -> Skip.")
                     success_count += 1
                     continue
+                if self.image_store.materialize(self.engine, prompt, full_output_path):
+                    self._log(f"🗃️ Cảnh {index}: prompt đã vẽ trước đó -> Lấy ảnh từ kho.")
+                    success_count += 1
+                    continue
+                pending.append((index, index, prompt, full_output_path))
+            prompts = {index: (prompt, path) for index, _, prompt, path in pending}
 
-                self._log(f"🎨 Đang vẽ cảnh {index}...")
-                
-                # GỌI HÀM CỦA BẠN ĐỂ VẼ
-                is_done = self.worker.generate(prompt, full_output_path)
-                
-                if is_done:
+            def store(index, ok):
+                if ok: self.image_store.add(self.engine, *prompts[index])
+                return ok
+
+            def on_result(index, result):
+                nonlocal success_count
+                self._count_work()
+                if isinstance(result, Future):
+                    result.add_done_callback(lambda fut, index=index: store(index, fut.result()))
+                    downloads.append(result)
+                elif store(index, result):
                     success_count += 1
-                else:
-                    self._log(f"❌ Thất bại cảnh {index}")
-                
-                time.sleep(random.randint(2,3))
 
-            self._log(f"🏁 Hoàn tất: {success_count}/{len(prompts_data)} ảnh.")
+            if self.uses_pipeline():
+                scene_iter = iter(pending)
+                self.generate_pipeline(lambda: next(scene_iter, None), on_result)
+            else:
+                for key, index, prompt, full_output_path in pending:
+                    on_result(key, self.generate_scene(index, prompt, full_output_path))
+
+            # Chờ các ảnh còn đang tải nền
+            if downloads:
+                self._log(f"⬇️ Chờ {len(downloads)} ảnh tải nốt...")
+                success_count += sum(1 for fut in downloads if fut.result())
+
+            self._log(f"🏁 Hoàn tất: {success_count}/{len(scenes)} ảnh.")
+            self._log(f"⏱️ Thời gian chờ nhịp: {get_pacer(self.profile_name).report()}")
+            self._log(f"🗃️ Kho ảnh: {self.image_store.report()}")
             return True
 
+        except ProfileLimited as e:
+            cooldown = PROFILE_HEALTH.mark_limited(self.profile_name, e.kind)
+            self._log(f"🛑 Dừng file: profile nghỉ {cooldown // 60} phút ({e.kind}). Chạy lại để vẽ tiếp phần còn thiếu.")
+            return False
         except Exception as e:
             self._log(f"❌ Lỗi Critical: {e}")
             traceback.print_exc()
             return False
         finally:
-            # Tắt trình duyệt khi xong việc
-            if self.driver:
-                try: self.driver.quit()
-                except: pass
-                self.driver = None
\ No newline at end of file
+            # Trả trình duyệt về pool (hoặc tắt) khi xong việc
+            self.detach()
\ No newline at end of file
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.job_queue import JobQueue
+from utils.profile_health import PROFILE_HEALTH
+
+
+@pytest.fixture(autouse=True)
+def _isolated_profile_health(tmp_path, monkeypatch):
+    # Thời hạn nghỉ của profile lưu trong DB hàng đợi -> test dùng DB riêng, không đụng workspace thật
+    monkeypatch.setattr(PROFILE_HEALTH, "store", JobQueue(str(tmp_path / "jobs.sqlite3")))
+    monkeypatch.setattr(PROFILE_HEALTH, "_until", {})
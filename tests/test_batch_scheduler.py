@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.batch_scheduler import PromptBatchScheduler, VisualBatchScheduler
+from utils.image_store import ImageStore
+from utils.prompt_cache import PromptResponseCache
+
+
+class _BrokenPipelineWorker:
+    """Flow không mở được dự án ở tab nào: generate_pipeline trả False ngay, không lấy cảnh nào"""
+    def __init__(self, profile_name):
+        self.profile_name = profile_name
+        self.calls = 0
+        self.revives = 0
+
+    def uses_pipeline(self):
+        return True
+
+    def generate_pipeline(self, next_scene, on_result, on_attempt=None):
+        self.calls += 1
+        return False
+
+    def is_alive(self):
+        return True
+
+    def revive(self):
+        self.revives += 1
+        return True
+
+    def detach(self):
+        pass
+
+
+def _scheduler(tmp_path, workers):
+    prompts = tmp_path / "a.json"
+    prompts.write_text(json.dumps([{"index": 1, "visual_prompt": "a cat"}, {"index": 2, "visual_prompt": "a dog"}]), encoding="utf-8")
+
+    class Scheduler(VisualBatchScheduler):
+        def _make_worker(self, profile_path):
+            worker = _BrokenPipelineWorker(os.path.basename(profile_path))
+            workers.append(worker)
+            return worker
+
+    return Scheduler([{"name": "a.json", "path": str(prompts)}], [str(tmp_path / "p.json")], str(tmp_path / "out"),
+                     image_store=ImageStore(str(tmp_path / "store"), enabled=False))
+
+
+def test_pipeline_that_never_opens_a_project_does_not_loop_forever(tmp_path):
+    workers, results = [], []
+    scheduler = _scheduler(tmp_path, workers)
+    runner = threading.Thread(target=lambda: results.extend(scheduler.run()), daemon=True)
+    runner.start()
+    runner.join(timeout=30)
+
+    assert not runner.is_alive()
+    assert [r["status"] for r in results] == ["failed"]
+    worker = workers[0]
+    assert worker.revives == VisualBatchScheduler.MAX_REQUEUES
+    assert worker.calls == VisualBatchScheduler.MAX_REQUEUES + 1
+
+
+class _HalfAnsweringWorker:
+    """Gemini chỉ trả lời các dòng có index lẻ"""
+    driver = object()
+
+    def __init__(self, profile_name):
+        self.profile_name = profile_name
+
+    def process_chunk(self, chunk, gemini_url, label="", max_retries=3, on_attempt=None):
+        return [{"index": line.split(":")[0], "visual_prompt": "v"} for line in chunk if int(line.split(":")[0]) % 2]
+
+    def detach(self):
+        pass
+
+    def _log(self, msg):
+        pass
+
+
+def _srt(tmp_path, n):
+    path = tmp_path / "a.srt"
+    path.write_text("\n\n".join(f"{i}\n00:00:0{i},000 --> 00:00:0{i},500\nline {i}" for i in range(1, n + 1)), encoding="utf-8")
+    return str(path)
+
+
+def test_prompt_file_with_missing_lines_is_partial(tmp_path):
+    class Scheduler(PromptBatchScheduler):
+        def _make_worker(self, profile_path):
+            return _HalfAnsweringWorker(os.path.basename(profile_path))
+
+    scheduler = Scheduler([{"name": "a.srt", "path": _srt(tmp_path, 4)}], [str(tmp_path / "p.json")], str(tmp_path),
+                          chunk_size=2, gemini_url="u", prompt_cache=PromptResponseCache(str(tmp_path / "cache"), enabled=False))
+    results = list(scheduler.run())
+
+    assert [r["status"] for r in results] == ["partial"]
+    assert "2/4" in results[0]["msg"]
+    saved = json.loads((tmp_path / "a_prompts.json").read_text(encoding="utf-8"))
+    assert [str(item["index"]) for item in saved] == ["1", "3"]
+
+
+class _CountingWorker(_HalfAnsweringWorker):
+    """Trả lời đủ mọi dòng, đếm số dòng thực sự gửi lên"""
+    sent = 0
+
+    def process_chunk(self, chunk, gemini_url, label="", max_retries=3, on_attempt=None):
+        type(self).sent += len(chunk)
+        return [{"index": line.split(":")[0], "visual_prompt": "new"} for line in chunk]
+
+
+def test_force_resends_lines_already_in_journal_and_cache(tmp_path):
+    srt = _srt(tmp_path, 3)
+    cache = PromptResponseCache(str(tmp_path / "cache"))
+
+    class Scheduler(PromptBatchScheduler):
+        def _make_worker(self, profile_path):
+            return _CountingWorker(os.path.basename(profile_path))
+
+    def run(force):
+        _CountingWorker.sent = 0
+        scheduler = Scheduler([{"name": "a.srt", "path": srt}], [str(tmp_path / "p.json")], str(tmp_path),
+                              chunk_size=2, gemini_url="u", prompt_cache=cache, force=force)
+        return [r["status"] for r in scheduler.run()], _CountingWorker.sent
+
+    assert run(force=False) == (["success"], 3)
+    assert run(force=False) == (["success"], 0)  # mọi dòng lấy từ cache
+    assert run(force=True) == (["success"], 3)
+
+
+def test_driver_is_recycled_after_max_units_of_work(tmp_path):
+    from utils.driver_pool import DriverPool, _PooledDriver
+
+    pool = DriverPool(max_tasks_per_driver=3)
+    revives = []
+
+    class _PooledWorker(_CountingWorker):
+        def __init__(self, profile_name):
+            super().__init__(profile_name)
+            self._attach()
+
+        def _attach(self):
+            self.driver = object()
+            pool._busy[id(self.driver)] = _PooledDriver(self.profile_name, self.driver)
+
+        def revive(self):
+            revives.append(self.driver)
+            pool._busy.pop(id(self.driver))
+            self._attach()
+            return True
+
+    class Scheduler(PromptBatchScheduler):
+        def _make_worker(self, profile_path):
+            return _PooledWorker(os.path.basename(profile_path))
+
+    scheduler = Scheduler([{"name": "a.srt", "path": _srt(tmp_path, 7)}], [str(tmp_path / "p.json")], str(tmp_path),
+                          chunk_size=1, gemini_url="u", prompt_cache=PromptResponseCache(str(tmp_path / "cache"), enabled=False),
+                          driver_pool=pool)
+    assert [r["status"] for r in scheduler.run()] == ["success"]
+    # 7 chunk, mỗi driver tối đa 3 -> thay 2 lần (hết việc thì không mở thêm bản mới)
+    assert len(revives) == 2
+
+
+def test_visual_progress_follows_retries_and_background_downloads(tmp_path):
+    import time
+    from concurrent.futures import Future
+
+    downloads, attempts = [], []
+
+    class _DownloadingWorker(_BrokenPipelineWorker):
+        """Mỗi cảnh thử 2 lần trong driver, ảnh tải nền (Future) do test quyết định xong / lỗi"""
+        driver = None
+
+        def uses_pipeline(self):
+            return False
+
+        def generate_scene(self, index, prompt, output_path, on_attempt=None):
+            on_attempt(1)
+            on_attempt(2)
+            fut = Future()
+            downloads.append(fut)
+            return fut
+
+    prompts = tmp_path / "a.json"
+    prompts.write_text(json.dumps([{"index": 1, "visual_prompt": "a cat"}, {"index": 2, "visual_prompt": "a dog"}]), encoding="utf-8")
+
+    class Scheduler(VisualBatchScheduler):
+        def _make_worker(self, profile_path):
+            return _DownloadingWorker(os.path.basename(profile_path))
+
+    scheduler = Scheduler([{"name": "a.json", "path": str(prompts)}], [str(tmp_path / "p.json")], str(tmp_path / "out"),
+                          image_store=ImageStore(str(tmp_path / "store"), enabled=False))
+    scheduler.progress.subscribe(lambda snap: snap["attempt"] > 1 and attempts.append(snap["label"]))
+    results = []
+    runner = threading.Thread(target=lambda: results.extend(scheduler.run()), daemon=True)
+    runner.start()
+    deadline = time.time() + 10
+    while len(downloads) < 2 and time.time() < deadline:
+        time.sleep(0.05)
+
+    # Đã gửi xong cả 2 cảnh nhưng ảnh chưa tải -> chưa tính là xong
+    snap = scheduler.progress.snapshot("a.json")
+    assert (snap["done"], snap["failed"]) == (0, 0)
+    assert attempts == ["Cảnh 1", "Cảnh 2"]
+
+    downloads[0].set_result(True)
+    downloads[1].set_result(False)  # lỗi tải nền -> thất bại
+    runner.join(timeout=10)
+    snap = scheduler.progress.snapshot("a.json")
+    assert (snap["done"], snap["failed"]) == (1, 1)
+    assert [r["status"] for r in results] == ["failed"]
@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.chunk_budget import ChunkBudget
+
+
+LINES = ["x" * 9] * 10  # mỗi dòng 10 ký tự (tính cả xuống dòng)
+
+
+def _budget(**kwargs):
+    options = dict(start=30, min_chars=10, max_chars=60, step=20, max_lines=5)
+    options.update(kwargs)
+    return ChunkBudget(**options)
+
+
+def test_fixed_size_cuts_n_lines():
+    budget = ChunkBudget(chunk_size=4)
+    assert not budget.adaptive
+    assert [budget.take(LINES, s) for s in (0, 4, 8, 10)] == [4, 4, 2, 0]
+    budget.incomplete()
+    assert budget.take(LINES) == 4
+    assert budget.describe() == "4 dòng / chunk"
+
+
+def test_adaptive_fills_character_budget():
+    budget = _budget()
+    assert budget.adaptive
+    assert budget.take(LINES) == 3
+    assert budget.take(LINES, 8) == 2
+    assert budget.take(LINES, 10) == 0
+    assert budget.describe() == "~30 ký tự / chunk"
+
+
+def test_long_line_still_goes_out_alone():
+    budget = _budget()
+    assert budget.take(["y" * 500, "short"]) == 1
+
+
+def test_max_lines_caps_short_lines():
+    budget = _budget(start=60)
+    assert budget.take(["a"] * 50) == 5
+
+
+def test_success_grows_and_incomplete_halves_within_bounds():
+    budget = _budget()
+    budget.success()
+    assert budget.chars == 50
+    budget.success()
+    assert budget.chars == 60  # không vượt max
+    budget.incomplete()
+    assert budget.chars == 30
+    for _ in range(5):
+        budget.incomplete()
+    assert budget.chars == 10  # không dưới min
+    assert budget.take(LINES) == 1
+
+
+def test_start_is_clamped_to_bounds():
+    assert _budget(start=1000).chars == 60
+    assert _budget(start=1).chars == 10
@@ -0,0 +1,13 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cli import worst_status
+
+
+def test_worst_status():
+    assert worst_status([]) == "success"
+    assert worst_status(["success", "skipped"]) == "success"
+    assert worst_status(["success", "partial"]) == "partial"
+    assert worst_status(["partial", "failed", "success"]) == "failed"
@@ -0,0 +1,56 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.driver_pool import DriverPool, _PooledDriver
+
+
+class _FakeDriver:
+    window_handles = ["tab"]
+
+    def __init__(self):
+        self.quit_called = False
+
+    def execute_script(self, script, *args):
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+def _lend(pool, key="p1"):
+    driver = _FakeDriver()
+    pool._busy[id(driver)] = _PooledDriver(key, driver)
+    pool._busy_profiles.add(key)
+    return driver
+
+
+def test_work_is_counted_per_unit_not_per_lease():
+    pool = DriverPool(max_tasks_per_driver=3)
+    driver = _lend(pool)
+    assert not pool.add_work(driver)
+    assert not pool.add_work(driver)
+    assert pool.add_work(driver)
+
+    pool.release(driver)
+    assert driver.quit_called
+    assert pool.idle_count() == 0
+
+
+def test_driver_under_limit_is_kept_warm():
+    pool = DriverPool(max_tasks_per_driver=3)
+    driver = _lend(pool)
+    pool.add_work(driver, 2)
+    pool.release(driver)
+    assert not driver.quit_called
+    assert pool.idle_count() == 1
+
+
+def test_shutdown_include_busy_quits_lent_drivers():
+    pool = DriverPool()
+    busy = _lend(pool, "p1")
+    assert pool.shutdown() == 0
+    assert not busy.quit_called
+    assert pool.shutdown(include_busy=True) == 1
+    assert busy.quit_called
@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.helpers import extract_json_from_text
+
+
+def test_objects_are_pulled_out_of_chatter():
+    text = 'Sure! Here you go:\n```json\n[{"index": "1", "visual_prompt": "a"}, {"index": "2", "visual_prompt": "b"}]\n```\nEnjoy.'
+    assert extract_json_from_text(text) == [{"index": "1", "visual_prompt": "a"}, {"index": "2", "visual_prompt": "b"}]
+
+
+def test_nested_objects_stay_inside_their_parent():
+    text = '[{"index": "1", "meta": {"mood": "calm", "tags": {"a": 1}}}]'
+    assert extract_json_from_text(text) == [{"index": "1", "meta": {"mood": "calm", "tags": {"a": 1}}}]
+
+
+def test_braces_and_quotes_inside_strings_are_ignored():
+    text = r'[{"index": "1", "text": "he said \"}{\" then {left"}, {"index": "2", "text": "ok"}]'
+    assert [o["index"] for o in extract_json_from_text(text)] == ["1", "2"]
+    assert extract_json_from_text(text)[0]["text"] == 'he said "}{" then {left'
+
+
+def test_truncated_answer_keeps_complete_objects():
+    text = '[{"index": "1", "visual_prompt": "a"}, {"index": "2", "visual_prompt": "b"}, {"index": "3", "visual_pro'
+    assert [o["index"] for o in extract_json_from_text(text)] == ["1", "2"]
+
+
+def test_stray_brace_in_chatter_does_not_hide_later_objects():
+    text = 'Note: use {curly} style.\n{"index": "1", "visual_prompt": "a"}'
+    assert extract_json_from_text(text) == [{"index": "1", "visual_prompt": "a"}]
+
+
+def test_nothing_to_extract():
+    assert extract_json_from_text("") == []
+    assert extract_json_from_text(None) == []
+    assert extract_json_from_text("You've reached your limit.") == []
+    assert extract_json_from_text("[1, 2, 3]") == []
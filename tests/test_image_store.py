@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.image_store import ImageStore, image_key
+
+
+def _image(tmp_path, name, data=b"png"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_key_ignores_case_and_extra_whitespace_but_not_engine():
+    key = image_key("flow", "A  cat\non a mat")
+    assert image_key("flow", " a cat on A MAT ") == key
+    assert image_key("whisk", "a cat on a mat") != key
+    assert image_key("flow", "a dog on a mat") != key
+
+
+def test_same_prompt_is_linked_from_store(tmp_path):
+    store = ImageStore(str(tmp_path / "store"))
+    out = tmp_path / "out"
+    out.mkdir()
+    first = _image(out, "1.png", b"cat")
+    assert not store.materialize("flow", "a cat", first)
+    store.add("flow", "a cat", first)
+
+    second = str(out / "7.png")
+    assert store.materialize("flow", "A  cat", second)
+    with open(second, "rb") as f:
+        assert f.read() == b"cat"
+    assert (store.hits, store.misses, store.stored) == (1, 1, 1)
+
+
+def test_store_is_found_again_after_restart(tmp_path):
+    store = ImageStore(str(tmp_path / "store"))
+    store.add("flow", "a cat", _image(tmp_path, "1.png"))
+
+    again = ImageStore(str(tmp_path / "store"))
+    assert again.stats()["images"] == 1
+    assert again.materialize("flow", "a cat", str(tmp_path / "2.png"))
+
+
+def test_existing_output_counts_as_hit(tmp_path):
+    store = ImageStore(str(tmp_path / "store"))
+    path = _image(tmp_path, "1.png")
+    store.add("flow", "a cat", path)
+    assert store.materialize("flow", "a cat", path)  # profile khác vừa vẽ xong cùng cảnh
+
+
+def test_disabled_store_does_nothing(tmp_path):
+    store = ImageStore(str(tmp_path / "store"), enabled=False)
+    store.add("flow", "a cat", _image(tmp_path, "1.png"))
+    assert not store.materialize("flow", "a cat", str(tmp_path / "2.png"))
+    assert not os.path.exists(tmp_path / "store")
+
+
+def test_over_limit_evicts_least_recently_used(tmp_path):
+    store = ImageStore(str(tmp_path / "store"))
+    store.max_bytes = 8
+    for name in ("cat", "dog"):
+        store.add("flow", name, _image(tmp_path, f"{name}.png", b"1234"))
+        time.sleep(0.01)
+    assert store.materialize("flow", "cat", str(tmp_path / "cat2.png"))  # chạm lại -> dog thành cũ nhất
+    time.sleep(0.01)
+    store.add("flow", "owl", _image(tmp_path, "owl.png", b"1234"))
+
+    assert store.stats()["images"] == 2
+    assert not store.materialize("flow", "dog", str(tmp_path / "dog2.png"))
+    assert store.materialize("flow", "owl", str(tmp_path / "owl2.png"))
+    assert os.path.exists(tmp_path / "dog.png")  # ảnh đã xuất ra dự án vẫn còn
+
+
+def test_report_and_reset(tmp_path):
+    store = ImageStore(str(tmp_path / "store"))
+    store.add("flow", "a cat", _image(tmp_path, "1.png"))
+    store.materialize("flow", "a cat", str(tmp_path / "2.png"))
+    assert store.report().startswith("1 trúng / 0 trượt, +1 ảnh mới (kho: 1 ảnh")
+    store.reset_stats()
+    assert (store.hits, store.misses, store.stored) == (0, 0, 0)
@@ -0,0 +1,147 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.job_queue as job_queue
+from utils.job_queue import JobQueue
+
+
+def _queue(tmp_path, **kwargs):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), **kwargs)
+
+
+def _files(*names):
+    return [{"name": n, "path": f"/p/{n}"} for n in names]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Đồng hồ giả cho hạn thuê task: clock["now"] += N để tua thời gian"""
+    now = {"now": 1000.0}
+    monkeypatch.setattr(job_queue.time, "time", lambda: now["now"])
+    return now
+
+
+def test_partial_result_is_not_done_and_can_be_retried(tmp_path):
+    q = _queue(tmp_path)
+    job_id, _ = q.enqueue("proj", 2, _files("a.srt", "b.srt"))
+    _, tasks = q.lease("w1")
+
+    assert q.complete(tasks[0]["id"], "w1", "done", "OK")
+    assert q.complete(tasks[1]["id"], "w1", "partial", "Thiếu 2/10 dòng")
+    job = q.jobs()[0]
+    assert job["status"] == "partial"
+    assert job["counts"] == {"done": 1, "partial": 1}
+
+    assert q.retry(job_id) == 1
+    assert q.jobs()[0]["status"] == "queued"
+
+
+def test_complete_rejects_unknown_status(tmp_path):
+    q = _queue(tmp_path)
+    q.enqueue("proj", 2, _files("a.srt"))
+    _, tasks = q.lease("w1")
+    with pytest.raises(ValueError):
+        q.complete(tasks[0]["id"], "w1", True)
+
+
+def test_lease_takes_oldest_job_and_skips_files_already_queued(tmp_path):
+    q = _queue(tmp_path)
+    first, _ = q.enqueue("proj", 2, _files("a.srt", "b.srt"))
+    second, skipped = q.enqueue("proj", 2, _files("b.srt", "c.srt"))
+    assert skipped == 1
+    assert q.enqueue("proj", 2, _files("a.srt")) == (None, 1)
+
+    job, tasks = q.lease("w1", limit=1)
+    assert job["id"] == first
+    assert [(t["name"], t["status"], t["worker"], t["attempts"]) for t in tasks] == [("a.srt", "leased", "w1", 1)]
+    job, tasks = q.lease("w2")
+    assert (job["id"], [t["name"] for t in tasks]) == (first, ["b.srt"])
+    job, tasks = q.lease("w2")
+    assert (job["id"], [t["name"] for t in tasks]) == (second, ["c.srt"])
+    assert q.lease("w3") == (None, [])
+
+
+def test_lease_only_jobs_for_allowed_profiles(tmp_path):
+    q = _queue(tmp_path)
+    q.enqueue("proj", 2, _files("a.srt"), profiles=["p1.json", "p2.json"])
+    assert q.lease("w1", profiles=["p3.json"]) == (None, [])
+
+    job, tasks = q.lease("w2", profiles=["p2.json", "p3.json"])
+    assert job["profiles"] == ["p2.json"]
+    assert len(tasks) == 1
+
+
+def test_heartbeat_keeps_lease_alive(tmp_path, clock):
+    q = _queue(tmp_path, lease_seconds=60)
+    q.enqueue("proj", 2, _files("a.srt"))
+    _, tasks = q.lease("w1")
+    task_id = tasks[0]["id"]
+
+    for _ in range(3):
+        clock["now"] += 45
+        assert q.heartbeat("w1", [task_id]) == {task_id}
+    assert q.lease("w2") == (None, [])
+    assert q.heartbeat("w2", [task_id]) == set()  # không phải task của w2
+    assert q.heartbeat("w1", []) == set()
+
+
+def test_expired_lease_goes_to_another_worker(tmp_path, clock):
+    q = _queue(tmp_path, lease_seconds=60)
+    q.enqueue("proj", 2, _files("a.srt"))
+    _, tasks = q.lease("w1")
+    task_id = tasks[0]["id"]
+
+    clock["now"] += 61
+    _, tasks = q.lease("w2")
+    assert [(t["id"], t["attempts"]) for t in tasks] == [(task_id, 2)]
+    assert [(a["worker"], a["status"]) for a in q.attempts(task_id)] == [("w1", "expired"), ("w2", "running")]
+    assert "w1" in q.attempts(task_id)[0]["msg"]
+
+    # w1 sống lại: không còn giữ task, kết quả của nó bị bỏ qua
+    assert q.heartbeat("w1", [task_id]) == set()
+    assert not q.complete(task_id, "w1", "done")
+    assert q.complete(task_id, "w2", "done")
+    assert q.jobs()[0]["status"] == "done"
+
+
+def test_release_requeues_until_attempts_run_out(tmp_path):
+    q = _queue(tmp_path, max_attempts=2)
+    q.enqueue("proj", 2, _files("a.srt"))
+    _, tasks = q.lease("w1")
+    task_id = tasks[0]["id"]
+
+    q.release(task_id, "w1", "Trình duyệt bị đóng")
+    assert q.tasks(tasks[0]["job_id"])[0]["status"] == "queued"
+    q.lease("w1")
+    q.release(task_id, "w1", "Trình duyệt bị đóng")
+
+    task = q.tasks(tasks[0]["job_id"])[0]
+    assert task["status"] == "failed"
+    assert task["msg"].startswith("Hết 2 lượt thử")
+    assert q.jobs()[0]["status"] == "failed"
+    q.release(task_id, "w1")  # không còn giữ -> bỏ qua
+
+
+def test_progress_only_from_lease_owner(tmp_path):
+    q = _queue(tmp_path)
+    job_id, _ = q.enqueue("proj", 2, _files("a.srt"))
+    _, tasks = q.lease("w1")
+    q.progress(tasks[0]["id"], "w1", "3/10", {"done": 3})
+    q.progress(tasks[0]["id"], "w2", "9/10", {"done": 9})
+    task = q.tasks(job_id)[0]
+    assert (task["msg"], task["progress"]) == ("3/10", {"done": 3})
+    assert q.active_paths("proj", 2) == {"/p/a.srt": "leased"}
+
+
+def test_cancel_leaves_running_tasks_alone(tmp_path):
+    q = _queue(tmp_path)
+    job_id, _ = q.enqueue("proj", 2, _files("a.srt", "b.srt"))
+    _, tasks = q.lease("w1", limit=1)
+    assert q.cancel(job_id) == 1
+    assert [t["status"] for t in q.tasks(job_id)] == ["leased", "cancelled"]
+    assert q.complete(tasks[0]["id"], "w1", "done")
+    assert q.jobs()[0]["status"] == "cancelled"
@@ -0,0 +1,83 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.pacing as pacing
+from utils.pacing import Pacer
+
+
+POLICIES = {
+    "test": {"page_load": {"delay": 2}, "send": {"gap": 5}},
+    "fast": {"page_load": {"delay": 0}},
+}
+
+
+def _pacer(monkeypatch, policy="test"):
+    """Pacer với đồng hồ giả: time.sleep chỉ cộng dồn, không chờ thật"""
+    clock = {"now": 1000.0, "slept": []}
+    monkeypatch.setattr(pacing, "PACING_PROFILES", POLICIES)
+    monkeypatch.setattr(pacing.time, "time", lambda: clock["now"])
+    monkeypatch.setattr(pacing.time, "sleep", lambda s: clock["slept"].append(s))
+    return Pacer("p1", policy), clock
+
+
+def test_delay_waits_fixed_time_every_call(monkeypatch):
+    pacer, clock = _pacer(monkeypatch)
+    assert pacer.wait("page_load") == 2
+    assert pacer.wait("page_load") == 2
+    assert clock["slept"] == [2, 2]
+
+
+def test_gap_reserves_slots_for_concurrent_callers(monkeypatch):
+    pacer, clock = _pacer(monkeypatch)
+    # 3 tab gửi cùng lúc -> lần lượt cách nhau 5s, không dồn vào 1 thời điểm
+    assert [pacer.wait("send") for _ in range(3)] == [0, 5, 10]
+    assert clock["slept"] == [5, 10]  # lần đầu không chờ
+
+
+def test_gap_already_elapsed_does_not_wait(monkeypatch):
+    pacer, clock = _pacer(monkeypatch)
+    pacer.wait("send")
+    clock["now"] += 60
+    assert pacer.wait("send") == 0
+
+
+def test_unknown_action_does_not_wait(monkeypatch):
+    pacer, clock = _pacer(monkeypatch)
+    assert pacer.wait("scroll") == 0
+    assert clock["slept"] == []
+
+
+def test_unknown_policy_falls_back_to_default(monkeypatch):
+    monkeypatch.setattr(pacing, "PACING_PROFILE", "test")
+    pacer, _ = _pacer(monkeypatch, policy="missing")
+    assert pacer.wait("page_load") == 2
+
+
+def test_report_and_reset(monkeypatch):
+    pacer, _ = _pacer(monkeypatch)
+    pacer.wait("page_load")
+    pacer.wait("page_load")
+    pacer.wait("send")
+    pacer.wait("send")
+    assert pacer.total_waited() == 9
+    assert pacer.report() == "9s (send 5s/2, page_load 4s/2)"
+    pacer.reset_stats()
+    assert pacer.total_waited() == 0
+    assert pacer.report() == "0s"
+
+
+def test_set_pacing_profile_switches_existing_pacers(monkeypatch):
+    monkeypatch.setattr(pacing, "PACING_PROFILES", POLICIES)
+    monkeypatch.setattr(pacing, "_PACERS", {})
+    monkeypatch.setattr(pacing, "_ACTIVE_POLICY", {"name": "test"})
+    pacer = pacing.get_pacer("p1")
+    assert pacing.get_pacer("p1") is pacer
+
+    pacing.set_pacing_profile("fast")
+    assert pacer.policy_name == "fast"
+    assert pacing.get_pacing_profile() == "fast"
+
+    pacing.set_pacing_profile("missing")  # tên lạ -> giữ nguyên
+    assert pacing.get_pacing_profile() == "fast"
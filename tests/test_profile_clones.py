@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.browser_setup as browser_setup
+from utils.browser_setup import clone_profile, remove_clone, gc_clones
+
+
+def _profile(tmp_path, monkeypatch):
+    """Profile đã giải nén sẵn: p.json + thư mục p/ (có cache và file khóa của Chrome)"""
+    monkeypatch.setattr(browser_setup, "CLONES_DIR", str(tmp_path / "_clones"))
+    json_path = tmp_path / "p.json"
+    json_path.write_text("{}", encoding="utf-8")
+    default = tmp_path / "p" / "Default"
+    (default / "Cache").mkdir(parents=True)
+    (default / "Cache" / "data_0").write_bytes(b"x" * 1024)
+    (default / "Cookies").write_bytes(b"session")
+    (default / "Preferences").write_text("{}", encoding="utf-8")
+    (tmp_path / "p" / "SingletonLock").write_text("host-1", encoding="utf-8")
+    (tmp_path / "p" / "lockfile").write_text("", encoding="utf-8")
+    return str(json_path)
+
+
+def test_clone_copies_login_state_without_cache_or_locks(tmp_path, monkeypatch):
+    clone = clone_profile(_profile(tmp_path, monkeypatch), log_callback=lambda msg: None)
+
+    assert os.path.dirname(clone) == str(tmp_path / "_clones")
+    assert os.path.basename(clone).startswith("p__")
+    with open(os.path.join(clone, "Default", "Cookies"), "rb") as f:
+        assert f.read() == b"session"
+    assert os.path.exists(os.path.join(clone, "Default", "Preferences"))
+    assert not os.path.exists(os.path.join(clone, "Default", "Cache"))
+    assert not os.path.exists(os.path.join(clone, "SingletonLock"))
+    assert not os.path.exists(os.path.join(clone, "lockfile"))
+
+
+def test_clone_never_writes_back_to_source(tmp_path, monkeypatch):
+    clone = clone_profile(_profile(tmp_path, monkeypatch), log_callback=lambda msg: None)
+    with open(os.path.join(clone, "Default", "Cookies"), "wb") as f:
+        f.write(b"changed")
+    assert (tmp_path / "p" / "Default" / "Cookies").read_bytes() == b"session"
+
+
+def test_each_clone_is_separate_and_removable(tmp_path, monkeypatch):
+    json_path = _profile(tmp_path, monkeypatch)
+    first = clone_profile(json_path, log_callback=lambda msg: None)
+    second = clone_profile(json_path, log_callback=lambda msg: None)
+    assert first != second
+
+    remove_clone(first)
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+
+
+def test_broken_profile_json_gives_no_clone(tmp_path, monkeypatch):
+    json_path = _profile(tmp_path, monkeypatch)
+    with open(json_path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    assert clone_profile(json_path, log_callback=lambda msg: None) is None
+
+
+def test_gc_removes_only_old_clones_not_in_use(tmp_path, monkeypatch):
+    json_path = _profile(tmp_path, monkeypatch)
+    in_use = clone_profile(json_path, log_callback=lambda msg: None)
+    leftover = tmp_path / "_clones" / "p__crashed"
+    leftover.mkdir()
+    fresh = tmp_path / "_clones" / "p__starting"
+    fresh.mkdir()
+    old = time.time() - 7200
+    for path in (in_use, leftover):
+        os.utime(path, (old, old))
+
+    try:
+        assert gc_clones(max_age=3600) == 1
+        assert not leftover.exists()
+        assert os.path.exists(in_use)
+        assert fresh.exists()
+    finally:
+        remove_clone(in_use)
+
+
+def test_gc_without_clone_dir_is_noop(tmp_path, monkeypatch):
+    monkeypatch.setattr(browser_setup, "CLONES_DIR", str(tmp_path / "missing"))
+    assert gc_clones() == 0
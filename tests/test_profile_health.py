@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.job_queue import JobQueue
+from utils.profile_health import ProfileHealth, classify_limit
+
+
+def test_cooldown_is_shared_between_processes(tmp_path):
+    db = str(tmp_path / "jobs.sqlite3")
+    worker_a = ProfileHealth({"quota": 3600, "rate_limit": 600}, store=JobQueue(db))
+    worker_b = ProfileHealth({"quota": 3600, "rate_limit": 600}, store=JobQueue(db))
+
+    assert worker_a.mark_limited("p1", "quota") == 3600
+    assert not worker_b.is_healthy("p1")
+    assert set(worker_b.cooling()) == {"p1"}
+    assert worker_b.cooling()["p1"][1] == "quota"
+
+
+def test_clear_from_ui_releases_profile_for_every_worker(tmp_path):
+    db = str(tmp_path / "jobs.sqlite3")
+    worker = ProfileHealth(store=JobQueue(db))
+    ui = ProfileHealth(store=JobQueue(db))
+
+    worker.mark_limited("p1", "rate_limit")
+    assert worker.cooldown_left("p1") > 0
+    ui.clear()
+    assert worker.cooldown_left("p1") == 0
+    assert ui.cooling() == {}
+
+
+def test_expired_cooldown_is_healthy(tmp_path):
+    health = ProfileHealth({"rate_limit": -1}, store=JobQueue(str(tmp_path / "jobs.sqlite3")))
+    health.mark_limited("p1", "rate_limit")
+    assert health.is_healthy("p1")
+
+
+def test_without_store_cooldown_stays_in_memory():
+    health = ProfileHealth({"rate_limit": 600})
+    health.mark_limited("p1", "rate_limit")
+    assert 0 < health.cooldown_left("p1") <= 600
+
+
+def test_classify_limit():
+    assert classify_limit("You have reached your daily limit") == "quota"
+    assert classify_limit("Too many requests, please slow down") == "rate_limit"
+    assert classify_limit("Here is your image") is None
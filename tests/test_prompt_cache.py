@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.prompt_cache import PromptResponseCache, cache_key
+
+
+CHUNK = ["1: Hello there.", "2: General Kenobi."]
+ITEMS = [{"index": "1", "visual_prompt": "a"}, {"index": "2", "visual_prompt": "b"}]
+
+
+def test_key_ignores_surrounding_whitespace_but_not_rules_or_gem():
+    key = cache_key(CHUNK, "rules", "https://gem/1")
+    assert cache_key([f"  {b} " for b in CHUNK], " rules\n", "https://gem/1 ") == key
+    assert cache_key(CHUNK, "other rules", "https://gem/1") != key
+    assert cache_key(CHUNK, "rules", "https://gem/2") != key
+    assert cache_key(CHUNK[:1], "rules", "https://gem/1") != key
+
+
+def test_put_then_get_survives_restart(tmp_path):
+    cache = PromptResponseCache(str(tmp_path))
+    assert cache.get(CHUNK, "rules", "u") is None
+    cache.put(CHUNK, "rules", "u", ITEMS)
+    assert cache.get(CHUNK, "rules", "u") == ITEMS
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    assert PromptResponseCache(str(tmp_path)).get(CHUNK, "rules", "u") == ITEMS
+
+
+def test_empty_answers_and_disabled_cache_store_nothing(tmp_path):
+    cache = PromptResponseCache(str(tmp_path))
+    cache.put(CHUNK, "rules", "u", [])
+    assert cache.get(CHUNK, "rules", "u") is None
+
+    off = PromptResponseCache(str(tmp_path / "off"), enabled=False)
+    off.put(CHUNK, "rules", "u", ITEMS)
+    assert off.get(CHUNK, "rules", "u") is None
+    assert not os.path.exists(tmp_path / "off")
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = PromptResponseCache(str(tmp_path))
+    cache.put(CHUNK, "rules", "u", ITEMS)
+    with open(cache._path(cache_key(CHUNK, "rules", "u")), "w", encoding="utf-8") as f:
+        f.write('{"items": [')
+    assert cache.get(CHUNK, "rules", "u") is None
+
+
+def test_over_limit_evicts_least_recently_used(tmp_path):
+    cache = PromptResponseCache(str(tmp_path))
+    chunks = [[f"{i}: line {i}"] for i in range(3)]
+    cache.put(chunks[0], "r", "u", ITEMS)
+    entry = os.path.getsize(cache._path(cache_key(chunks[0], "r", "u")))
+    cache.max_bytes = entry * 2
+
+    cache.put(chunks[1], "r", "u", ITEMS)
+    time.sleep(0.01)
+    assert cache.get(chunks[0], "r", "u")  # chạm lại -> chunk 1 thành cũ nhất
+    time.sleep(0.01)
+    cache.put(chunks[2], "r", "u", ITEMS)
+
+    assert cache.get(chunks[0], "r", "u") == ITEMS
+    assert cache.get(chunks[1], "r", "u") is None
+    assert cache.get(chunks[2], "r", "u") == ITEMS
+
+
+def test_clear_removes_everything(tmp_path):
+    cache = PromptResponseCache(str(tmp_path))
+    cache.put(CHUNK, "rules", "u", ITEMS)
+    assert cache.size_mb() > 0
+    cache.clear()
+    assert cache.size_mb() == 0
+    assert cache.get(CHUNK, "rules", "u") is None
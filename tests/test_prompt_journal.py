@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.prompt_journal import PromptJournal, journal_path_for
+
+
+def _item(index):
+    return {"index": str(index), "visual_prompt": f"scene {index}"}
+
+
+def _journal(tmp_path):
+    return PromptJournal(str(tmp_path / "a_prompts.json"))
+
+
+def test_journal_sits_next_to_prompts_file(tmp_path):
+    assert journal_path_for(str(tmp_path / "a_prompts.json")) == str(tmp_path / "a_prompts.journal.jsonl")
+
+
+def test_recorded_chunks_survive_restart(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record(["1: a", "2: b"], [_item(1), _item(2)])
+    assert os.path.exists(journal.path)
+
+    again = _journal(tmp_path)
+    assert len(again) == 1
+    assert again.has_chunk(["1: a", "2: b"])
+    assert again.has_chunk([" 2: b "])  # khóa theo nội dung block, không theo vị trí
+    assert not again.has_chunk(["1: a", "3: c"])
+
+
+def test_items_follow_file_order_and_skip_edited_blocks(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record(["3: c"], [_item(3)])
+    journal.record(["1: a", "2: b"], [_item(1), _item(2)])
+
+    # Mỗi dòng nhật ký chỉ lấy 1 lần dù nhiều block trỏ tới
+    assert journal.items_for(["1: a", "2: b", "3: c"]) == [_item(1), _item(2), _item(3)]
+    # Block 3 đã bị sửa trong SRT -> dữ liệu cũ không dùng lại
+    assert journal.items_for(["1: a", "2: b", "3: edited"]) == [_item(1), _item(2)]
+
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record(["1: a"], [_item(1)])
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"blocks": ["abc"], "items": [{"ind')
+
+    again = _journal(tmp_path)
+    assert len(again) == 1
+    assert again.items_for(["1: a"]) == [_item(1)]
+
+
+def test_remove_clears_disk_and_memory(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record(["1: a"], [_item(1)])
+    journal.remove()
+    assert not os.path.exists(journal.path)
+    assert len(journal) == 0
+    assert not journal.has_chunk(["1: a"])
+    journal.remove()  # chưa có file -> không lỗi
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.prompt_generator import VisualPromptGenerator
+from utils.profile_health import ProfileLimited
+
+
+class _FakeDriver:
+    def __init__(self, notices=(), response=None):
+        self.page = {"notices": list(notices), "response": response}
+
+    def execute_script(self, script, *args):
+        return self.page
+
+
+def _generator(**page):
+    gen = VisualPromptGenerator()
+    gen.driver = _FakeDriver(**page)
+    return gen
+
+
+def test_json_answer_echoing_limit_words_is_not_a_limit():
+    answer = '[{"index": "1", "text": "Slow down, error 429!", "visual_prompt": "a man waving"}]'
+    gen = _generator(response=answer)
+    gen._check_limit(answer, old_count=0)
+
+
+def test_plain_limit_answer_is_a_limit():
+    gen = _generator()
+    with pytest.raises(ProfileLimited) as err:
+        gen._check_limit("You've reached your daily limit. Try again tomorrow.")
+    assert err.value.kind == "quota"
+
+
+def test_alert_is_checked_even_when_answer_has_json():
+    gen = _generator(notices=["Too many requests. Please slow down."], response='[{"index": "1", "visual_prompt": "x"}]')
+    with pytest.raises(ProfileLimited) as err:
+        gen._check_limit(old_count=0)
+    assert err.value.kind == "rate_limit"
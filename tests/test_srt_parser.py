@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.srt_parser import iter_srt
+
+
+def _write(tmp_path, text):
+    path = tmp_path / "a.srt"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_duplicate_index_is_renumbered(tmp_path):
+    path = _write(tmp_path, "1\n00:00:01,000 --> 00:00:02,000\nYeah.\n\n1\n00:00:03,000 --> 00:00:04,000\nNo.\n")
+    cues = list(iter_srt(path))
+    assert [(c.index, c.text) for c in cues] == [(1, "Yeah."), (2, "No.")]
+
+
+def test_decreasing_index_is_renumbered(tmp_path):
+    path = _write(tmp_path, (
+        "5\n00:00:01,000 --> 00:00:02,000\nA\n\n"
+        "6\n00:00:02,000 --> 00:00:03,000\nB\n\n"
+        "2\n00:00:03,000 --> 00:00:04,000\nC\n\n"
+        "10\n00:00:04,000 --> 00:00:05,000\nD\n"
+    ))
+    cues = list(iter_srt(path))
+    assert [c.index for c in cues] == [5, 6, 7, 10]
+    assert len({c.prompt_line() for c in cues}) == 4
@@ -1,12 +1,40 @@
 import os
 import json
+import time
+import uuid
+import shutil
 import zipfile
 import threading
+import contextlib
 import undetected_chromedriver as uc
-from config.settings import ORBITA_PATH, DRIVER_PATH, ROOT_PATH
+from config.settings import ORBITA_PATH, DRIVER_PATH, ROOT_PATH, CLONES_DIR, CLONE_GC_AGE, LEAN_BLOCKLISTS, LEAN_RESOURCE_PATTERNS
 
-# Khóa an toàn toàn cục (Dùng chung cho cả Step 2 và Step 3 để tránh xung đột file zip)
-DRIVER_INIT_LOCK = threading.Lock()
+# Chỉ bước vá (patch) file chromedriver là phải chạy tuần tự: uc ghi đè trực tiếp lên DRIVER_PATH.
+# Vá 1 lần duy nhất -> các lần khởi động sau chỉ đọc file đã vá -> nhiều Orbita mở song song được.
+DRIVER_PATCH_LOCK = threading.Lock()
+_DRIVER_PATCHED = False
+
+# Khóa giải nén THEO PROFILE (2 luồng cùng 1 profile mới phải chờ nhau, profile khác chạy song song)
+_EXTRACT_LOCKS = {}
+_EXTRACT_LOCKS_GUARD = threading.Lock()
+
+def _extract_lock(working_profile_dir):
+    key = os.path.normcase(os.path.abspath(working_profile_dir))
+    with _EXTRACT_LOCKS_GUARD:
+        return _EXTRACT_LOCKS.setdefault(key, threading.Lock())
+
+def ensure_driver_patched(log_callback=print):
+    """Vá chromedriver (undetected) đúng 1 lần cho cả app. Trả về True nếu OK."""
+    global _DRIVER_PATCHED
+    if _DRIVER_PATCHED: return True
+    with DRIVER_PATCH_LOCK:
+        if _DRIVER_PATCHED: return True
+        try:
+            uc.Patcher(executable_path=DRIVER_PATH).auto()
+            _DRIVER_PATCHED = True
+        except Exception as e:
+            log_callback(f"⚠️ Không vá trước được chromedriver ({e}) -> Để uc tự vá khi khởi động.")
+        return _DRIVER_PATCHED
 
 def create_proxy_auth_extension(host, port, user, password, plugin_dir):
     """Tạo Extension đăng nhập Proxy (Vì Chrome không hỗ trợ user:pass trực tiếp)"""
@@ -40,18 +68,8 @@ def create_proxy_auth_extension(host, port, user, password, plugin_dir):
     with open(os.path.join(plugin_dir, "manifest.json"), "w") as f: f.write(manifest_json)
     with open(os.path.join(plugin_dir, "background.js"), "w") as f: f.write(background_js)
 
-def init_driver_from_profile(json_profile_path, log_callback=print, download_dir=None):
-    """
-    Hàm khởi tạo Driver chuẩn cho Orbita Browser.
-    """
-    try:
-        with open(json_profile_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except Exception as e:
-        log_callback(f"❌ Lỗi đọc file JSON profile: {e}")
-        return None
-
-    # --- 1. XỬ LÝ PROFILE PATH & GIẢI NÉN ---
+def ensure_profile_extracted(json_profile_path, data, log_callback=print):
+    """Giải nén profile (nếu chưa có). Trả về thư mục user-data-dir, hoặc None nếu lỗi."""
     json_dir = os.path.dirname(json_profile_path)
     # Lấy đường dẫn file zip từ JSON (nếu có)
     profile_zip_path = data.get("Path") 
@@ -69,11 +87,15 @@ def init_driver_from_profile(json_profile_path, log_callback=print, download_dir
         
         if full_zip_path and os.path.exists(full_zip_path):
             try:
-                # Dùng Lock để tránh 2 luồng cùng giải nén 1 lúc gây lỗi file
-                with DRIVER_INIT_LOCK:
+                # Lock theo profile: 2 luồng không giải nén chồng lên cùng 1 thư mục,
+                # giải nén ra thư mục tạm rồi đổi tên -> không bao giờ có profile giải nén dở
+                with _extract_lock(working_profile_dir):
                     if not os.path.exists(working_profile_dir):
+                        tmp_dir = f"{working_profile_dir}.extracting"
+                        shutil.rmtree(tmp_dir, ignore_errors=True)
                         with zipfile.ZipFile(full_zip_path, 'r') as zip_ref:
-                            zip_ref.extractall(working_profile_dir)
+                            zip_ref.extractall(tmp_dir)
+                        os.replace(tmp_dir, working_profile_dir)
                         log_callback(f"✅ Giải nén xong.")
             except Exception as e:
                 log_callback(f"❌ Lỗi giải nén: {e}")
@@ -81,6 +103,138 @@ def init_driver_from_profile(json_profile_path, log_callback=print, download_dir
         else:
             log_callback(f"⚠️ Không tìm thấy file Zip. Sẽ tạo Profile trắng mới.")
             os.makedirs(working_profile_dir, exist_ok=True)
+    return working_profile_dir
+
+# =========================================================
+# BẢN SAO TẠM CỦA PROFILE (chạy song song cùng 1 tài khoản)
+# =========================================================
+# Chỉ chép trạng thái đăng nhập (Cookies, Local Storage, IndexedDB, Preferences...),
+# bỏ cache + file khóa của Chrome -> bản sao nhỏ, tạo nhanh.
+CLONE_SKIP_DIRS = {
+    "Cache", "Code Cache", "GPUCache", "ShaderCache", "GrShaderCache", "GraphiteDawnCache", "DawnCache",
+    "CacheStorage", "ScriptCache", "Crashpad", "BrowserMetrics", "component_crx_cache",
+    "optimization_guide_model_store", "Safe Browsing", "OnDeviceHeadSuggestModel", "proxy_auth_plugin",
+}
+CLONE_SKIP_FILES = ("Singleton", "lockfile", "LOCK")
+FICLONE = 0x40049409  # ioctl copy-on-write (Linux: btrfs / xfs)
+
+_ACTIVE_CLONES = set()
+_CLONES_GUARD = threading.Lock()
+
+def _clone_file(src, dst):
+    """Copy-on-write (reflink) nếu hệ thống file hỗ trợ, không thì chép thường"""
+    try:
+        import fcntl
+        with open(src, "rb") as fs, open(dst, "wb") as fd:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        shutil.copystat(src, dst)
+        return dst
+    except Exception:
+        return shutil.copy2(src, dst)
+
+def _clone_ignore(directory, names):
+    return [n for n in names if n in CLONE_SKIP_DIRS or n.startswith(CLONE_SKIP_FILES) or n.endswith(".tmp")]
+
+def clone_profile(json_profile_path, log_callback=print):
+    """
+    Tạo bản sao tạm của profile trong CLONES_DIR. Trả về đường dẫn bản sao, hoặc None nếu lỗi.
+    Không dùng hardlink: Chrome ghi đè SQLite (Cookies...) tại chỗ -> sẽ làm hỏng profile gốc.
+    """
+    try:
+        with open(json_profile_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        log_callback(f"❌ Lỗi đọc file JSON profile: {e}")
+        return None
+
+    source_dir = ensure_profile_extracted(json_profile_path, data, log_callback)
+    if not source_dir: return None
+
+    folder_name = os.path.splitext(os.path.basename(json_profile_path))[0]
+    clone_dir = os.path.join(CLONES_DIR, f"{folder_name}__{uuid.uuid4().hex[:8]}")
+    started = time.time()
+    try:
+        os.makedirs(CLONES_DIR, exist_ok=True)
+        shutil.copytree(source_dir, clone_dir, ignore=_clone_ignore, copy_function=_clone_file)
+    except Exception as e:
+        log_callback(f"❌ Lỗi tạo bản sao profile: {e}")
+        shutil.rmtree(clone_dir, ignore_errors=True)
+        return None
+
+    with _CLONES_GUARD:
+        _ACTIVE_CLONES.add(clone_dir)
+    log_callback(f"🧬 Đã tạo bản sao {folder_name} ({time.time() - started:.1f}s).")
+    return clone_dir
+
+def remove_clone(clone_dir):
+    with _CLONES_GUARD:
+        _ACTIVE_CLONES.discard(clone_dir)
+    shutil.rmtree(clone_dir, ignore_errors=True)
+
+def gc_clones(max_age=CLONE_GC_AGE):
+    """Dọn bản sao không còn dùng (bị bỏ lại do crash...). Trả về số bản sao đã xóa."""
+    if not os.path.isdir(CLONES_DIR): return 0
+    removed = 0
+    now = time.time()
+    for name in os.listdir(CLONES_DIR):
+        path = os.path.join(CLONES_DIR, name)
+        with _CLONES_GUARD:
+            if path in _ACTIVE_CLONES: continue
+        try:
+            if now - os.path.getmtime(path) < max_age: continue
+        except OSError:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    return removed
+
+def lean_patterns(lean):
+    """Tên blocklist ("text" / "visual") -> list mẫu URL bị chặn. None / tên lạ -> [] (không chặn gì)"""
+    config = LEAN_BLOCKLISTS.get(lean) if lean else None
+    if not config: return []
+    patterns = list(config.get("urls", []))
+    for res_type in config.get("types", []):
+        patterns.extend(LEAN_RESOURCE_PATTERNS.get(res_type, []))
+    return list(dict.fromkeys(patterns))
+
+def apply_lean_mode(driver, lean=None, log_callback=print):
+    """
+    Chặn tài nguyên thừa cho tab HIỆN TẠI qua DevTools (mỗi tab 1 target -> tab mới phải gọi lại).
+    lean=None -> bỏ chặn (driver ấm từ task trước được trả lại trạng thái bình thường).
+    """
+    patterns = lean_patterns(lean)
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        driver.lean_mode = lean  # open_tabs đọc lại để chặn tương tự cho tab mới
+        if patterns: log_callback(f"🪶 Chế độ tiết kiệm ({lean}): chặn {len(patterns)} mẫu URL.")
+        return True
+    except Exception as e:
+        if patterns: log_callback(f"⚠️ Không bật được chế độ tiết kiệm: {e}")
+        return False
+
+def init_driver_from_profile(json_profile_path, log_callback=print, download_dir=None, user_data_dir=None, lean=None):
+    """
+    Hàm khởi tạo Driver chuẩn cho Orbita Browser.
+    user_data_dir: chạy trên thư mục khác thư mục gốc của profile (VD: bản sao tạm từ clone_profile).
+    lean: tên blocklist trong LEAN_BLOCKLISTS ("text" / "visual") -> chặn tài nguyên thừa ngay từ đầu.
+    """
+    try:
+        with open(json_profile_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        log_callback(f"❌ Lỗi đọc file JSON profile: {e}")
+        return None
+
+    # --- 1. XỬ LÝ PROFILE PATH & GIẢI NÉN ---
+    folder_name = os.path.splitext(os.path.basename(json_profile_path))[0]
+    working_profile_dir = ensure_profile_extracted(json_profile_path, data, log_callback)
+    if not working_profile_dir:
+        return None
+    # Chạy trên bản sao tạm (profile gốc đang bị trình duyệt khác khóa)
+    if user_data_dir:
+        working_profile_dir = user_data_dir
+        folder_name = f"{folder_name} (bản sao)"
 
     log_callback(f"🚀 Khởi động Orbita cho: {folder_name}")
 
@@ -140,7 +294,11 @@ def init_driver_from_profile(json_profile_path, log_callback=print, download_dir
         options.add_experimental_option("prefs", prefs)
 
     # --- 6. KHỞI TẠO DRIVER ---
-    with DRIVER_INIT_LOCK:
+    # Driver đã vá sẵn -> không cần khóa, các profile khởi động song song.
+    # Vá trước thất bại -> quay về khởi động tuần tự như cũ (uc tự vá bên trong)
+    patched = ensure_driver_patched(log_callback)
+    launch_lock = contextlib.nullcontext() if patched else DRIVER_PATCH_LOCK
+    with launch_lock:
         try:
             driver = uc.Chrome(
                 options=options,
@@ -150,7 +308,8 @@ def init_driver_from_profile(json_profile_path, log_callback=print, download_dir
                 use_subprocess=True,
                 headless=False,
             )
-            return driver
         except Exception as e:
             log_callback(f"❌ Lỗi khởi tạo Chrome: {e}")
-            return None
\ No newline at end of file
+            return None
+    if lean: apply_lean_mode(driver, lean, log_callback)
+    return driver
\ No newline at end of file
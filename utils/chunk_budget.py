@@ -0,0 +1,55 @@
+import threading
+
+from config.settings import CHUNK_BUDGET
+
+class ChunkBudget:
+    """
+    Quyết định mỗi chunk Step 2 lấy bao nhiêu dòng.
+    - Chế độ tự điều chỉnh (chunk_size=None): gom dòng tới khi đủ ngân sách ký tự.
+      Gemini trả đủ -> tăng ngân sách thêm 1 bước (ít lượt gửi hơn).
+      Trả thiếu / lỗi -> giảm 1 nửa (câu trả lời ngắn lại, JSON ít bị cắt cụt).
+    - chunk_size = N: cắt cố định N dòng như cũ, không tự điều chỉnh.
+    Dùng chung cho mọi profile trong 1 lần chạy (an toàn đa luồng).
+    """
+    def __init__(self, chunk_size=None, start=CHUNK_BUDGET["START"], min_chars=CHUNK_BUDGET["MIN"],
+                 max_chars=CHUNK_BUDGET["MAX"], step=CHUNK_BUDGET["STEP"], max_lines=CHUNK_BUDGET["MAX_LINES"]):
+        self.chunk_size = chunk_size
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.step = step
+        self.max_lines = max_lines
+        self.chars = max(min_chars, min(max_chars, start))
+        self._lock = threading.Lock()
+
+    @property
+    def adaptive(self):
+        return not self.chunk_size
+
+    def take(self, lines, start=0):
+        """Số dòng của chunk tiếp theo, tính từ lines[start] (ít nhất 1 dòng)"""
+        left = len(lines) - start
+        if not self.adaptive:
+            return min(self.chunk_size, left)
+        with self._lock:
+            budget = self.chars
+        count, used = 0, 0
+        while count < min(left, self.max_lines):
+            used += len(lines[start + count]) + 1
+            if count and used > budget: break
+            count += 1
+        return max(1, count) if left else 0
+
+    def success(self):
+        if not self.adaptive: return
+        with self._lock:
+            self.chars = min(self.max_chars, self.chars + self.step)
+
+    def incomplete(self):
+        if not self.adaptive: return
+        with self._lock:
+            self.chars = max(self.min_chars, self.chars // 2)
+
+    def describe(self):
+        if not self.adaptive: return f"{self.chunk_size} dòng / chunk"
+        with self._lock:
+            return f"~{self.chars} ký tự / chunk"
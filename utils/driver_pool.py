@@ -0,0 +1,222 @@
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+from config.settings import DRIVER_POOL_MAX_TASKS, DRIVER_POOL_IDLE_TIMEOUT, PROFILE_CLONES_ENABLED, MAX_CLONES_PER_PROFILE
+from utils.browser_setup import init_driver_from_profile, clone_profile, remove_clone, gc_clones, apply_lean_mode
+from utils.tabs import close_extra_tabs
+
+
+class _PooledDriver:
+    """Bọc 1 driver đang sống + số việc đã chạy (chunk / cảnh, để biết khi nào cần thay mới)"""
+    def __init__(self, profile_key, driver, clone_dir=None):
+        self.profile_key = profile_key
+        self.driver = driver
+        self.clone_dir = clone_dir  # != None: driver chạy trên bản sao tạm, trả về là tắt + xóa bản sao
+        self.tasks_done = 0
+        self.last_used = time.time()
+
+
+class DriverPool:
+    """
+    Kho trình duyệt "ấm" dùng chung cho Step 2 và Step 3.
+    - Mỗi profile chỉ có tối đa 1 driver sống (Chrome khóa --user-data-dir).
+    - acquire(): trả driver đã mở sẵn (nếu có), nếu không thì khởi động mới.
+    - add_work(): người mượn báo mỗi chunk / cảnh xong. Đủ N việc -> người mượn nên trả driver (hoặc hồi sinh) để thay bản mới.
+    - release(): kiểm tra sức khỏe, đủ N việc thì tắt để lần sau mở bản mới.
+    - Profile đang bận + cho phép clone -> mở thêm trình duyệt trên bản sao tạm thay vì đứng chờ.
+    """
+    def __init__(self, max_tasks_per_driver=DRIVER_POOL_MAX_TASKS, idle_timeout=DRIVER_POOL_IDLE_TIMEOUT):
+        self.max_tasks_per_driver = max_tasks_per_driver
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        self._idle = {}             # profile_key -> _PooledDriver đang rảnh
+        self._busy = {}             # id(driver) -> _PooledDriver đang cho mượn
+        self._busy_profiles = set() # profile đang có người dùng (kể cả lúc đang khởi động)
+        self._clones = {}           # profile_key -> số bản sao đang chạy
+
+    @staticmethod
+    def _key(profile_json_path):
+        return os.path.normcase(os.path.abspath(profile_json_path))
+
+    @staticmethod
+    def _is_alive(driver):
+        """Health-check nhẹ: còn cửa sổ và còn chạy được JS"""
+        try:
+            if not driver.window_handles: return False
+            driver.execute_script("return 1;")
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _quit(entry):
+        try: entry.driver.quit()
+        except: pass
+
+    @staticmethod
+    def _set_download_dir(driver, download_dir):
+        """Driver ấm được mở từ task trước -> đổi lại thư mục download qua DevTools"""
+        try:
+            driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "allow", "downloadPath": download_dir})
+        except: pass
+
+    def acquire(self, profile_json_path, log_callback=print, download_dir=None, timeout=None, allow_clone=PROFILE_CLONES_ENABLED, lean=None):
+        """
+        Mượn driver cho 1 profile. Profile đang bận -> mở trên bản sao tạm (nếu cho phép), không thì chờ.
+        lean: blocklist của task ("text" / "visual" / None) -> áp lại mỗi lần mượn (driver ấm có thể từ task khác).
+        Trả về driver hoặc None nếu không khởi động được / hết thời gian chờ.
+        """
+        key = self._key(profile_json_path)
+        use_clone = False
+        with self._cond:
+            while key in self._busy_profiles:
+                if allow_clone and self._clones.get(key, 0) < MAX_CLONES_PER_PROFILE:
+                    self._clones[key] = self._clones.get(key, 0) + 1
+                    use_clone = True
+                    break
+                if not self._cond.wait(timeout):
+                    return None
+            if not use_clone:
+                self._busy_profiles.add(key)
+                entry = self._idle.pop(key, None)
+
+        if use_clone:
+            return self._acquire_clone(key, profile_json_path, log_callback, download_dir, lean)
+        return self._acquire_own(key, entry, profile_json_path, log_callback, download_dir, lean)
+
+    def _acquire_clone(self, key, profile_json_path, log_callback, download_dir, lean=None):
+        log_callback("🧬 Profile đang bận -> Chạy trên bản sao tạm.")
+        clone_dir = clone_profile(profile_json_path, log_callback)
+        driver = None
+        if clone_dir:
+            driver = init_driver_from_profile(profile_json_path, log_callback=log_callback,
+                                              download_dir=download_dir, user_data_dir=clone_dir, lean=lean)
+        if not driver:
+            if clone_dir: remove_clone(clone_dir)
+            self._free_clone(key)
+            return None
+        with self._cond:
+            self._busy[id(driver)] = _PooledDriver(key, driver, clone_dir)
+        return driver
+
+    def _free_clone(self, key):
+        with self._cond:
+            self._clones[key] = max(0, self._clones.get(key, 0) - 1)
+            self._cond.notify_all()
+
+    def _acquire_own(self, key, entry, profile_json_path, log_callback, download_dir, lean=None):
+        try:
+            if entry:
+                expired = time.time() - entry.last_used > self.idle_timeout
+                if expired or not self._is_alive(entry.driver):
+                    log_callback("♻️ Trình duyệt cũ đã chết/quá hạn -> Mở mới.")
+                    self._quit(entry)
+                    entry = None
+                else:
+                    log_callback(f"♨️ Dùng lại trình duyệt đang mở (đã chạy {entry.tasks_done} việc).")
+                    if download_dir: self._set_download_dir(entry.driver, download_dir)
+                    if lean or getattr(entry.driver, "lean_mode", None):
+                        apply_lean_mode(entry.driver, lean, log_callback)
+
+            if entry is None:
+                driver = init_driver_from_profile(profile_json_path, log_callback=log_callback, download_dir=download_dir, lean=lean)
+                if not driver:
+                    self._free_profile(key)
+                    return None
+                entry = _PooledDriver(key, driver)
+        except Exception:
+            self._free_profile(key)
+            raise
+
+        with self._cond:
+            self._busy[id(entry.driver)] = entry
+        return entry.driver
+
+    def add_work(self, driver, n=1):
+        """Driver vừa chạy xong n việc (chunk / cảnh). Trả về True nếu đã đủ max_tasks_per_driver (nên thay bản mới)"""
+        with self._cond:
+            entry = self._busy.get(id(driver))
+            if entry is None: return False
+            entry.tasks_done += n
+            return entry.tasks_done >= self.max_tasks_per_driver
+
+    def release(self, driver, discard=False):
+        """
+        Trả driver về kho.
+        discard=True: driver lỗi -> tắt luôn (VD: Chrome sập giữa chừng).
+        """
+        if driver is None: return
+        with self._cond:
+            entry = self._busy.pop(id(driver), None)
+
+        # Driver không phải của kho -> tắt như cũ
+        if entry is None:
+            try: driver.quit()
+            except: pass
+            return
+
+        # Bản sao tạm: không giữ ấm, tắt + xóa luôn
+        if entry.clone_dir:
+            self._quit(entry)
+            remove_clone(entry.clone_dir)
+            self._free_clone(entry.profile_key)
+            return
+
+        entry.last_used = time.time()
+        recycle = discard or entry.tasks_done >= self.max_tasks_per_driver or not self._is_alive(driver)
+        if recycle:
+            self._quit(entry)
+        else:
+            # Worker chạy nhiều tab -> chỉ giữ lại 1 tab cho người mượn sau
+            close_extra_tabs(driver)
+
+        with self._cond:
+            if not recycle:
+                self._idle[entry.profile_key] = entry
+            self._busy_profiles.discard(entry.profile_key)
+            self._cond.notify_all()
+
+    def _free_profile(self, key):
+        with self._cond:
+            self._busy_profiles.discard(key)
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, profile_json_path, log_callback=print, download_dir=None, lean=None):
+        """with DRIVER_POOL.lease(path) as driver: ... (driver có thể là None)"""
+        driver = self.acquire(profile_json_path, log_callback=log_callback, download_dir=download_dir, lean=lean)
+        try:
+            yield driver
+        finally:
+            if driver: self.release(driver)
+
+    def idle_count(self):
+        with self._cond:
+            return len(self._idle)
+
+    def shutdown(self, include_busy=False):
+        """
+        Tắt toàn bộ driver đang rảnh. Driver đang chạy sẽ tự tắt khi trả về.
+        include_busy=True (thoát hẳn: Ctrl+C / SIGTERM) -> tắt luôn driver đang cho mượn.
+        """
+        with self._cond:
+            entries = list(self._idle.values())
+            self._idle.clear()
+            if include_busy:
+                entries += list(self._busy.values())
+                self._busy.clear()
+        for entry in entries:
+            self._quit(entry)
+            if entry.clone_dir: remove_clone(entry.clone_dir)
+        return len(entries)
+
+
+# Kho dùng chung cho cả app (Streamlit rerun không import lại module -> driver vẫn sống)
+DRIVER_POOL = DriverPool()
+atexit.register(DRIVER_POOL.shutdown)
+# Dọn bản sao bị bỏ lại từ lần chạy trước (crash...), thoát app thì dọn hết bản sao không còn dùng
+gc_clones()
+atexit.register(gc_clones, 0)
@@ -1,9 +1,12 @@
 # utils.py
 import os
 import json
+import time
 import streamlit as st
-from config.settings import WORKSPACE
-import re
+import pandas as pd
+from config.settings import WORKSPACE, JOB_UI_REFRESH_SECONDS, JOB_STALL_SECONDS
+from utils.job_queue import JOB_QUEUE
+from utils.progress import format_seconds
 
 def save_file(content, filename, is_json=False):
     """Lưu file vào WORKSPACE với mã hóa UTF-8"""
@@ -15,13 +18,6 @@ def save_file(content, filename, is_json=False):
             f.write(content)
     return path
 
-def split_srt_blocks(file_path):
-    """Đọc file SRT và tách thành các block text (nhóm theo 2 dấu xuống dòng)"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    # Tách dựa trên 2 dấu xuống dòng (chuẩn SRT)
-    return [b.strip() for b in re.split(r'\n\n+', content) if b.strip()]
-
 def render_artifact_viewer(file_path, title):
     """Hiển thị khung xem trước và nút tải về"""
     if not os.path.exists(file_path):
@@ -58,40 +54,47 @@ def render_artifact_viewer(file_path, title):
 def extract_json_from_text(text_content):
     """
     Hàm lọc sạn: Chỉ lấy phần JSON hợp lệ từ lời nói nhảm của AI.
+    Quét 1 lượt, đếm ngoặc (bỏ qua ngoặc nằm trong chuỗi) -> lấy MỌI object {...} hoàn chỉnh ở ngoài cùng:
+    - Object lồng nhau không làm vỡ kết quả.
+    - JSON bị cắt cụt giữa chừng -> vẫn giữ các object đã đủ, chỉ bỏ object dở cuối.
     Trả về: List các object (hoặc list rỗng nếu lỗi)
     """
-    try:
-        # 1. Nếu AI dùng Markdown code block (```json ... ```), ưu tiên lấy nó trước
-        match = re.search(r'```json\s*(.*?)```', text_content, re.DOTALL)
-        if match:
-            text_content = match.group(1)
-
-        # 2. Tìm điểm bắt đầu '[' và kết thúc ']'
-        # (Giả sử AI trả về một list các object)
-        start_idx = text_content.find('[')
-        end_idx = text_content.rfind(']')
-        
-        if start_idx != -1 and end_idx != -1:
-            json_str = text_content[start_idx : end_idx+1]
-            return json.loads(json_str)
-            
-        # 3. Trường hợp AI trả về nhiều dòng JSON rời rạc (không nằm trong [])
-        # Thử ép kiểu từng dòng xem sao
-        objects = []
-        # Tìm tất cả các đoạn text nằm trong dấu {}
-        matches = re.findall(r'(\{.*?\})', text_content, re.DOTALL)
-        for m in matches:
-            try:
-                obj = json.loads(m)
-                objects.append(obj)
-            except:
-                pass
-        
-        return objects
+    objects = []
+    if not text_content: return objects
+    decoder = json.JSONDecoder()
+    pos, n = 0, len(text_content)
+    while pos < n:
+        start = text_content.find("{", pos)
+        if start == -1: break
+        end = _match_brace(text_content, start)
+        try:
+            if end is None: raise ValueError("chưa đóng ngoặc")
+            obj, _ = decoder.raw_decode(text_content[start:end + 1])
+        except ValueError:
+            # "{" lạc trong lời nói nhảm / object cuối bị cắt cụt -> thử lại từ ký tự tiếp theo
+            pos = start + 1
+            continue
+        if isinstance(obj, dict): objects.append(obj)
+        pos = end + 1
+    return objects
 
-    except Exception as e:
-        print(f"⚠️ Lỗi parse JSON: {e}")
-        return []
+def _match_brace(text, start):
+    """Vị trí "}" đóng của "{" tại start (bỏ qua ngoặc trong chuỗi JSON), None nếu chưa đóng"""
+    depth, in_str, escaped = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if escaped: escaped = False
+            elif ch == "\\": escaped = True
+            elif ch == '"': in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0: return i
+    return None
 
 def get_projects():
     """Trả về danh sách tên các folder dự án trong workspace"""
@@ -99,9 +102,72 @@ def get_projects():
         os.makedirs(WORKSPACE)
         return []
     
-    # Chỉ lấy các item là thư mục (folder), bỏ qua file lẻ
+    # Chỉ lấy các item là thư mục (folder), bỏ qua file lẻ và thư mục ẩn (.cache...)
     projects = [
         d for d in os.listdir(WORKSPACE) 
-        if os.path.isdir(os.path.join(WORKSPACE, d))
+        if os.path.isdir(os.path.join(WORKSPACE, d)) and not d.startswith(".")
     ]
-    return sorted(projects) # Sắp xếp A-Z
\ No newline at end of file
+    return sorted(projects) # Sắp xếp A-Z
+
+
+JOB_STATUS_ICONS = {"queued": "⏳ Chờ", "leased": "🏃 Đang chạy", "running": "🏃 Đang chạy", "done": "✅ Xong", "partial": "⚠️ Còn thiếu", "failed": "❌ Lỗi", "cancelled": "🚫 Đã hủy"}
+
+def render_job_queue(project, step):
+    """Bảng trạng thái các job (Step 2 / Step 3) của dự án trong hàng đợi, kèm nút Hủy / Chạy lại"""
+    c_title, c_refresh = st.columns([3, 1])
+    c_title.subheader("📬 Hàng đợi")
+    if c_refresh.button("🔄 Làm mới", key=f"jq_refresh_{step}", use_container_width=True): st.rerun()
+    _render_jobs(project, step)
+
+def _task_row(t, now):
+    """1 task -> 1 dòng bảng: % trong file, tốc độ, ETA (từ snapshot tiến độ worker ghi vào DB)"""
+    snap = t["progress"] or {}
+    total = snap.get("total") or 0
+    if t["status"] in ("done", "partial", "failed"):
+        ratio = 1.0
+    else:
+        ratio = (snap.get("done", 0) + snap.get("failed", 0)) / total if total else 0.0
+    note = t["msg"]
+    # Đang chạy mà lâu không có sự kiện nào -> có thể bị treo (chạy chậm vẫn có sự kiện lượt thử / chunk)
+    if t["status"] == "leased" and now - t["updated_at"] > JOB_STALL_SECONDS:
+        note = f"⚠️ Im lặng {format_seconds(now - t['updated_at'])} - {note}"
+    return {
+        "File": t["name"],
+        "Trạng thái": JOB_STATUS_ICONS.get(t["status"], t["status"]),
+        "Tiến độ": ratio,
+        "Tốc độ": f"{snap['rate']} {snap['unit']}/phút" if snap.get("rate") else "-",
+        "Còn lại": format_seconds(snap["eta"]) if t["status"] == "leased" and snap.get("eta") else "-",
+        "Lần thử": t["attempts"],
+        "Worker": t["worker"] or "-",
+        "Ghi chú": note,
+    }
+
+@st.fragment(run_every=JOB_UI_REFRESH_SECONDS)
+def _render_jobs(project, step):
+    # Fragment tự chạy lại mỗi JOB_UI_REFRESH_SECONDS giây -> tiến độ cập nhật trực tiếp, không chạy lại cả trang
+    jobs = JOB_QUEUE.jobs(project=project, step=step, limit=10)
+    if not jobs:
+        st.caption("Chưa có job nào. Bấm XẾP HÀNG, rồi chạy `python worker.py` để xử lý.")
+        return
+
+    now = time.time()
+    for job in jobs:
+        c = job["counts"]
+        total = sum(c.values())
+        finished = c.get("done", 0) + c.get("partial", 0) + c.get("failed", 0) + c.get("cancelled", 0)
+        created = time.strftime("%d/%m %H:%M", time.localtime(job["created_at"]))
+        label = f"{JOB_STATUS_ICONS.get(job['status'], job['status'])} Job #{job['id']} ({created}) - {finished}/{total} file"
+        with st.expander(label, expanded=job["status"] in ("queued", "running")):
+            tasks = JOB_QUEUE.tasks(job["id"])
+            rows = [_task_row(t, now) for t in tasks]
+            if rows: st.progress(sum(r["Tiến độ"] for r in rows) / len(rows))
+            st.dataframe(pd.DataFrame(rows), column_config={
+                "Tiến độ": st.column_config.ProgressColumn("Tiến độ", min_value=0.0, max_value=1.0, format="percent"),
+            }, use_container_width=True, hide_index=True)
+            b1, b2 = st.columns(2)
+            if c.get("queued") and b1.button("🚫 Hủy phần chưa chạy", key=f"jq_cancel_{job['id']}", use_container_width=True):
+                st.toast(f"Đã hủy {JOB_QUEUE.cancel(job['id'])} file.")
+                st.rerun()
+            if (c.get("failed") or c.get("partial") or c.get("cancelled")) and b2.button("🔁 Chạy lại file lỗi", key=f"jq_retry_{job['id']}", use_container_width=True):
+                st.toast(f"Đã xếp lại {JOB_QUEUE.retry(job['id'])} file.")
+                st.rerun()
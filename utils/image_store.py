@@ -0,0 +1,145 @@
+import os
+import time
+import shutil
+import hashlib
+import threading
+
+from config.settings import IMAGE_STORE_DIR, IMAGE_STORE_MAX_MB, IMAGE_STORE_ENABLED
+
+def normalize_prompt(prompt):
+    """Bỏ khác biệt vô nghĩa: khoảng trắng thừa, hoa/thường"""
+    return " ".join(str(prompt).split()).casefold()
+
+def image_key(engine, prompt):
+    return hashlib.sha256(f"{engine}\0{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+def link_or_copy(src, dst):
+    """Hardlink (không tốn thêm dung lượng). Khác ổ đĩa / FS không hỗ trợ -> copy"""
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError:
+        shutil.copy2(src, dst)
+
+class ImageStore:
+    """
+    Kho ảnh dùng chung cả workspace, khóa theo engine + prompt đã chuẩn hóa.
+    - Cảnh có prompt trùng (file khác, đánh lại index...) -> lấy ảnh từ kho bằng hardlink, không vẽ lại.
+    - Vượt max_mb -> xóa ảnh lâu không dùng nhất (LRU theo mtime). Ảnh đã link ra _assets vẫn còn nguyên.
+    """
+    def __init__(self, store_dir=IMAGE_STORE_DIR, max_mb=IMAGE_STORE_MAX_MB, enabled=IMAGE_STORE_ENABLED):
+        self.store_dir = store_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._index = None  # key -> [đường dẫn, size, last_used] (quét thư mục lần đầu dùng)
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def _path(self, key, ext):
+        return os.path.join(self.store_dir, key[:2], f"{key}{ext}")
+
+    def _load_index(self):
+        if self._index is not None: return
+        self._index, self._total = {}, 0
+        if not os.path.isdir(self.store_dir): return
+        for sub in os.scandir(self.store_dir):
+            if not sub.is_dir(): continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".part"): continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                self._index[os.path.splitext(entry.name)[0]] = [entry.path, st.st_size, st.st_mtime]
+                self._total += st.st_size
+
+    def materialize(self, engine, prompt, output_path):
+        """Có ảnh trong kho -> link ra output_path, trả về True. Không có -> False"""
+        if not self.enabled: return False
+        key = image_key(engine, prompt)
+        with self._lock:
+            self._load_index()
+            entry = self._index.get(key)
+            src = entry[0] if entry else None
+            if not src or not os.path.exists(src):
+                self.misses += 1
+                return False
+            try:
+                link_or_copy(src, output_path)
+            except FileExistsError:
+                pass  # Cảnh đã có ảnh (profile khác vừa vẽ xong)
+            except OSError as e:
+                print(f"[ImageStore] ⚠️ Không lấy được ảnh từ kho: {e}")
+                self.misses += 1
+                return False
+            self.hits += 1
+            entry[2] = time.time()
+        try: os.utime(src)
+        except OSError: pass
+        return True
+
+    def add(self, engine, prompt, output_path):
+        """Ảnh vừa vẽ xong -> đưa vào kho (hardlink, gần như không tốn thêm dung lượng)"""
+        if not self.enabled or not os.path.exists(output_path): return
+        key = image_key(engine, prompt)
+        dst = self._path(key, os.path.splitext(output_path)[1])
+        tmp = f"{dst}.{threading.get_ident()}.part"
+        try:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            link_or_copy(output_path, tmp)
+            os.replace(tmp, dst)
+            size = os.path.getsize(dst)
+        except OSError as e:
+            print(f"[ImageStore] ⚠️ Không lưu được ảnh vào kho: {e}")
+            try: os.remove(tmp)
+            except OSError: pass
+            return
+        with self._lock:
+            self._load_index()
+            old = self._index.get(key)
+            if old:
+                self._total -= old[1]
+                if old[0] != dst:
+                    try: os.remove(old[0])
+                    except OSError: pass
+            self._index[key] = [dst, size, time.time()]
+            self._total += size
+            self.stored += 1
+            self._evict()
+
+    def _evict(self):
+        """Gọi khi đang giữ self._lock: xóa ảnh cũ nhất tới khi tổng dung lượng <= max_bytes"""
+        if self._total <= self.max_bytes: return
+        for key, (path, size, _) in sorted(self._index.items(), key=lambda kv: kv[1][2]):
+            if self._total <= self.max_bytes: break
+            try: os.remove(path)
+            except OSError: pass
+            del self._index[key]
+            self._total -= size
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.stored = 0
+
+    def stats(self):
+        with self._lock:
+            self._load_index()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stored": self.stored,
+                "images": len(self._index),
+                "size_mb": round(self._total / (1024 * 1024), 1),
+            }
+
+    def report(self):
+        s = self.stats()
+        return f"{s['hits']} trúng / {s['misses']} trượt, +{s['stored']} ảnh mới (kho: {s['images']} ảnh, {s['size_mb']} MB)"
+
+
+# Kho dùng chung cho cả app
+IMAGE_STORE = ImageStore()
@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import sqlite3
+import contextlib
+
+from config.settings import JOB_QUEUE_DB, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    profiles TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    msg TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    progress TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id INTEGER NOT NULL REFERENCES tasks(id),
+    worker TEXT NOT NULL,
+    status TEXT NOT NULL,
+    msg TEXT NOT NULL DEFAULT '',
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS profile_cooldowns (
+    profile TEXT PRIMARY KEY,
+    until REAL NOT NULL,
+    kind TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_job ON tasks(job_id, status);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, lease_until);
+"""
+
+# Trạng thái task: queued -> leased -> done / partial / failed (hoặc cancelled khi người dùng hủy)
+# partial: đã lưu file nhưng còn thiếu (VD: Step 2 thiếu dòng) -> chạy lại để bù, không tính là xong
+ACTIVE = ("queued", "leased")
+RESULT_STATUSES = ("done", "partial", "failed")
+
+class JobQueue:
+    """
+    Hàng đợi job bền vững (SQLite trong workspace), dùng chung cho giao diện và worker.py.
+    - 1 job = 1 lần bấm CHẠY (1 dự án, 1 bước, bộ tham số + profile). 1 task = 1 file.
+    - Worker "thuê" task có thời hạn (lease), chạy xong báo kết quả, đang chạy thì gia hạn.
+    - Worker chết / máy khởi động lại -> hết hạn thuê, task tự về hàng đợi (tối đa JOB_MAX_ATTEMPTS lần).
+    - Mỗi lần thuê ghi 1 dòng attempts -> xem lại được task đã chạy ở đâu, lỗi gì.
+    - Profile đang nghỉ (dính quota / rate limit) cũng lưu ở đây -> mọi worker + giao diện thấy chung, khởi động lại không mất.
+    Mỗi lệnh mở kết nối riêng -> an toàn giữa nhiều luồng / nhiều tiến trình.
+    """
+    def __init__(self, db_path=JOB_QUEUE_DB, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._ready = False
+
+    @contextlib.contextmanager
+    def _connect(self, write=False):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not self._ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                # DB tạo từ bản cũ (chưa có cột progress) -> thêm cột
+                if "progress" not in {r["name"] for r in conn.execute("PRAGMA table_info(tasks)")}:
+                    conn.execute("ALTER TABLE tasks ADD COLUMN progress TEXT")
+                self._ready = True
+            # BEGIN IMMEDIATE: giữ khóa ghi ngay từ đầu -> 2 worker không thuê trùng 1 task
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    # --- Giao diện: xếp job & xem trạng thái ---
+    def enqueue(self, project, step, files, params=None, profiles=None):
+        """
+        files: list {"name", "path"}. File đang chờ / đang chạy ở job khác (cùng dự án + bước) bị bỏ qua.
+        Trả về (job_id, số file bỏ qua). Không còn file nào -> job_id = None.
+        """
+        now = time.time()
+        with self._connect(write=True) as conn:
+            busy = {r["path"] for r in conn.execute(
+                "SELECT t.path FROM tasks t JOIN jobs j ON j.id = t.job_id "
+                "WHERE j.project = ? AND j.step = ? AND t.status IN (?, ?)", (project, step, *ACTIVE))}
+            fresh = [f for f in files if f["path"] not in busy]
+            if not fresh: return None, len(files)
+            cur = conn.execute(
+                "INSERT INTO jobs (project, step, params, profiles, status, created_at, updated_at) VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (project, step, json.dumps(params or {}, ensure_ascii=False), json.dumps(list(profiles or [])), now, now))
+            job_id = cur.lastrowid
+            conn.executemany(
+                "INSERT INTO tasks (job_id, name, path, status, updated_at) VALUES (?, ?, ?, 'queued', ?)",
+                [(job_id, f["name"], f["path"], now) for f in fresh])
+        return job_id, len(files) - len(fresh)
+
+    def jobs(self, project=None, step=None, limit=20):
+        """Job mới nhất trước, kèm số task theo trạng thái"""
+        sql, args = "SELECT * FROM jobs WHERE 1 = 1", []
+        if project is not None:
+            sql += " AND project = ?"; args.append(project)
+        if step is not None:
+            sql += " AND step = ?"; args.append(step)
+        sql += " ORDER BY id DESC LIMIT ?"; args.append(limit)
+        with self._connect() as conn:
+            rows = [self._job_dict(r) for r in conn.execute(sql, args)]
+            for job in rows:
+                job["counts"] = self._counts(conn, job["id"])
+        return rows
+
+    def tasks(self, job_id):
+        with self._connect() as conn:
+            rows = [dict(r) for r in conn.execute("SELECT * FROM tasks WHERE job_id = ? ORDER BY id", (job_id,))]
+        for t in rows:
+            t["progress"] = json.loads(t["progress"]) if t["progress"] else None
+        return rows
+
+    def attempts(self, task_id):
+        with self._connect() as conn:
+            return [dict(r) for r in conn.execute("SELECT * FROM attempts WHERE task_id = ? ORDER BY id", (task_id,))]
+
+    def active_paths(self, project, step):
+        """Đường dẫn các file đang chờ / đang chạy -> giao diện hiện '⏳ Trong hàng đợi'"""
+        with self._connect() as conn:
+            return {r["path"]: r["status"] for r in conn.execute(
+                "SELECT t.path, t.status FROM tasks t JOIN jobs j ON j.id = t.job_id "
+                "WHERE j.project = ? AND j.step = ? AND t.status IN (?, ?)", (project, step, *ACTIVE))}
+
+    def cancel(self, job_id):
+        """Hủy các task chưa chạy (task đang chạy vẫn chạy nốt)"""
+        with self._connect(write=True) as conn:
+            n = conn.execute("UPDATE tasks SET status = 'cancelled', msg = 'Đã hủy', updated_at = ? WHERE job_id = ? AND status = 'queued'",
+                             (time.time(), job_id)).rowcount
+            self._refresh_job(conn, job_id)
+        return n
+
+    def retry(self, job_id):
+        """Xếp lại các task thất bại / còn thiếu / đã hủy (đếm lại số lần thử từ đầu)"""
+        with self._connect(write=True) as conn:
+            n = conn.execute("UPDATE tasks SET status = 'queued', attempts = 0, worker = NULL, lease_until = NULL, msg = '', updated_at = ? "
+                             "WHERE job_id = ? AND status IN ('failed', 'partial', 'cancelled')", (time.time(), job_id)).rowcount
+            self._refresh_job(conn, job_id)
+        return n
+
+    # --- Worker: thuê task, gia hạn, báo kết quả ---
+    def lease(self, worker, limit=20, profiles=None):
+        """
+        Thuê tối đa `limit` task của job cũ nhất còn việc (cùng job -> chạy chung 1 scheduler).
+        profiles: profile worker được dùng (None = mọi profile). Job chỉ chọn profile ngoài danh sách -> để worker khác.
+        Trả về (job, list task) hoặc (None, []).
+        """
+        now = time.time()
+        with self._connect(write=True) as conn:
+            self._expire(conn, now)
+            for row in conn.execute("SELECT DISTINCT j.* FROM jobs j JOIN tasks t ON t.job_id = j.id WHERE t.status = 'queued' ORDER BY j.id").fetchall():
+                job = self._job_dict(row)
+                if profiles is not None and job["profiles"]:
+                    job["profiles"] = [p for p in job["profiles"] if p in profiles]
+                    if not job["profiles"]: continue
+                rows = conn.execute("SELECT * FROM tasks WHERE job_id = ? AND status = 'queued' ORDER BY id LIMIT ?", (job["id"], limit)).fetchall()
+                tasks = []
+                for t in rows:
+                    conn.execute("UPDATE tasks SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, msg = 'Đang chạy', progress = NULL, updated_at = ? WHERE id = ?",
+                                 (worker, now + self.lease_seconds, now, t["id"]))
+                    conn.execute("INSERT INTO attempts (task_id, worker, status, started_at) VALUES (?, ?, 'running', ?)", (t["id"], worker, now))
+                    tasks.append({**dict(t), "status": "leased", "worker": worker, "attempts": t["attempts"] + 1})
+                self._refresh_job(conn, job["id"])
+                return job, tasks
+        return None, []
+
+    def heartbeat(self, worker, task_ids):
+        """Gia hạn các task worker đang giữ. Trả về id task vẫn còn thuộc worker này"""
+        if not task_ids: return set()
+        now = time.time()
+        marks = ",".join("?" * len(task_ids))
+        with self._connect(write=True) as conn:
+            conn.execute(f"UPDATE tasks SET lease_until = ? WHERE worker = ? AND status = 'leased' AND id IN ({marks})",
+                         (now + self.lease_seconds, worker, *task_ids))
+            return {r["id"] for r in conn.execute(f"SELECT id FROM tasks WHERE worker = ? AND status = 'leased' AND id IN ({marks})", (worker, *task_ids))}
+
+    def progress(self, task_id, worker, msg, data=None):
+        """Tiến độ trong file (snapshot của ProgressTracker) -> giao diện đọc lại để hiện %, tốc độ, ETA"""
+        with self._connect(write=True) as conn:
+            conn.execute("UPDATE tasks SET msg = ?, progress = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                         (msg, json.dumps(data, ensure_ascii=False) if data is not None else None, time.time(), task_id, worker))
+
+    def complete(self, task_id, worker, status, msg="", result=None):
+        """
+        Báo kết quả 1 task (status: done / partial / failed).
+        Task đã hết hạn thuê (worker khác đã nhận) -> bỏ qua, trả về False.
+        """
+        if status not in RESULT_STATUSES: raise ValueError(f"Trạng thái không hợp lệ: {status}")
+        now = time.time()
+        with self._connect(write=True) as conn:
+            row = conn.execute("SELECT job_id FROM tasks WHERE id = ? AND worker = ? AND status = 'leased'", (task_id, worker)).fetchone()
+            if row is None: return False
+            conn.execute("UPDATE tasks SET status = ?, msg = ?, result = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+                         (status, msg, json.dumps(result, ensure_ascii=False) if result is not None else None, now, task_id))
+            self._close_attempt(conn, task_id, worker, status, msg, now)
+            self._refresh_job(conn, row["job_id"])
+        return True
+
+    def release(self, task_id, worker, msg=""):
+        """Worker dừng giữa chừng -> trả task về hàng đợi (hết lượt thử thì đánh dấu thất bại)"""
+        now = time.time()
+        with self._connect(write=True) as conn:
+            row = conn.execute("SELECT job_id, attempts FROM tasks WHERE id = ? AND worker = ? AND status = 'leased'", (task_id, worker)).fetchone()
+            if row is None: return
+            self._requeue(conn, task_id, row["attempts"], msg, now)
+            self._close_attempt(conn, task_id, worker, "released", msg, now)
+            self._refresh_job(conn, row["job_id"])
+
+    # --- Profile nghỉ (dùng chung giữa các worker / cli.py / giao diện) ---
+    def set_cooldown(self, profile, until, kind):
+        now = time.time()
+        with self._connect(write=True) as conn:
+            conn.execute("DELETE FROM profile_cooldowns WHERE until <= ?", (now,))
+            conn.execute("INSERT OR REPLACE INTO profile_cooldowns (profile, until, kind) VALUES (?, ?, ?)", (profile, until, kind))
+
+    def cooldowns(self):
+        """{profile: (thời điểm hết nghỉ, loại giới hạn)} của các profile còn đang nghỉ"""
+        with self._connect() as conn:
+            return {r["profile"]: (r["until"], r["kind"]) for r in conn.execute(
+                "SELECT * FROM profile_cooldowns WHERE until > ?", (time.time(),))}
+
+    def clear_cooldown(self, profile=None):
+        with self._connect(write=True) as conn:
+            if profile is None: conn.execute("DELETE FROM profile_cooldowns")
+            else: conn.execute("DELETE FROM profile_cooldowns WHERE profile = ?", (profile,))
+
+    # --- Nội bộ ---
+    def _expire(self, conn, now):
+        """Task hết hạn thuê (worker chết / mất kết nối) -> về hàng đợi"""
+        rows = conn.execute("SELECT id, job_id, worker, attempts FROM tasks WHERE status = 'leased' AND lease_until < ?", (now,)).fetchall()
+        for r in rows:
+            msg = f"Worker {r['worker']} mất liên lạc"
+            self._requeue(conn, r["id"], r["attempts"], msg, now)
+            self._close_attempt(conn, r["id"], r["worker"], "expired", msg, now)
+        for job_id in {r["job_id"] for r in rows}:
+            self._refresh_job(conn, job_id)
+
+    def _requeue(self, conn, task_id, attempts, msg, now):
+        if attempts >= self.max_attempts:
+            conn.execute("UPDATE tasks SET status = 'failed', msg = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+                         (f"Hết {self.max_attempts} lượt thử ({msg})", now, task_id))
+        else:
+            conn.execute("UPDATE tasks SET status = 'queued', worker = NULL, lease_until = NULL, msg = ?, updated_at = ? WHERE id = ?",
+                         (msg, now, task_id))
+
+    @staticmethod
+    def _close_attempt(conn, task_id, worker, status, msg, now):
+        conn.execute("UPDATE attempts SET status = ?, msg = ?, finished_at = ? WHERE task_id = ? AND worker = ? AND status = 'running'",
+                     (status, msg, now, task_id, worker))
+
+    @staticmethod
+    def _counts(conn, job_id):
+        return {r["status"]: r["n"] for r in conn.execute("SELECT status, COUNT(*) AS n FROM tasks WHERE job_id = ? GROUP BY status", (job_id,))}
+
+    def _refresh_job(self, conn, job_id):
+        c = self._counts(conn, job_id)
+        if c.get("leased"): status = "running"
+        elif c.get("queued"): status = "queued"
+        elif c.get("failed"): status = "failed"
+        elif c.get("partial"): status = "partial"
+        elif c.get("cancelled"): status = "cancelled"
+        else: status = "done"
+        conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), job_id))
+
+    @staticmethod
+    def _job_dict(row):
+        job = dict(row)
+        job["params"] = json.loads(job["params"] or "{}")
+        job["profiles"] = json.loads(job["profiles"] or "[]")
+        return job
+
+
+# Hàng đợi dùng chung cho cả app (giao diện + worker.py)
+JOB_QUEUE = JobQueue()
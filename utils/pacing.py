@@ -0,0 +1,96 @@
+import time
+import random
+import threading
+
+from config.settings import PACING_PROFILES, PACING_PROFILE
+
+
+class Pacer:
+    """
+    Nhịp thao tác của 1 profile (thay cho time.sleep(random...) rải rác trong driver).
+    Mỗi loại thao tác (action) có luật riêng trong PACING_PROFILES:
+    - delay: chờ cố định sau thao tác (VD: đợi UI ổn định sau khi tải trang)
+    - gap: khoảng cách tối thiểu giữa 2 lần cùng thao tác trên profile này (VD: gửi prompt)
+    - jitter: cộng thêm ngẫu nhiên 0..jitter giây cho giống người
+    Dùng chung cho mọi tab / mọi worker của cùng 1 profile (an toàn đa luồng).
+    """
+    def __init__(self, profile_name, policy_name=PACING_PROFILE):
+        self.profile_name = profile_name
+        self.policy_name = policy_name
+        self._lock = threading.Lock()
+        self._last = {}     # action -> thời điểm được phép gần nhất
+        self._waited = {}   # action -> tổng số giây đã chờ
+        self._counts = {}   # action -> số lần gọi
+
+    @property
+    def policy(self):
+        return PACING_PROFILES.get(self.policy_name) or PACING_PROFILES[PACING_PROFILE]
+
+    def wait(self, action):
+        """Chờ theo luật của `action`. Trả về số giây đã chờ."""
+        rule = self.policy.get(action, {})
+        jitter = random.uniform(0, rule.get("jitter", 0))
+        with self._lock:
+            now = time.time()
+            delay = rule.get("delay", 0) + jitter
+            gap = rule.get("gap", 0)
+            if gap:
+                # Giữ chỗ trước -> nhiều tab/luồng cùng profile không gửi dồn 1 lúc
+                ready_at = max(now + delay, self._last.get(action, 0) + gap + jitter)
+                self._last[action] = ready_at
+                delay = ready_at - now
+            self._waited[action] = self._waited.get(action, 0) + delay
+            self._counts[action] = self._counts.get(action, 0) + 1
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def total_waited(self):
+        with self._lock:
+            return sum(self._waited.values())
+
+    def report(self):
+        """VD: '42s (page_load 20s/6, type 12s/5, ...)'"""
+        with self._lock:
+            parts = [f"{a} {s:.0f}s/{self._counts[a]}" for a, s in sorted(self._waited.items(), key=lambda x: -x[1]) if s >= 0.5]
+            total = sum(self._waited.values())
+        return f"{total:.0f}s" + (f" ({', '.join(parts)})" if parts else "")
+
+    def reset_stats(self):
+        with self._lock:
+            self._waited.clear()
+            self._counts.clear()
+
+
+# =========================================================
+# PACER THEO PROFILE (dùng chung cho Step 2 + Step 3)
+# =========================================================
+_PACERS = {}
+_PACERS_LOCK = threading.Lock()
+_ACTIVE_POLICY = {"name": PACING_PROFILE}
+
+def get_pacer(profile_name):
+    with _PACERS_LOCK:
+        if profile_name not in _PACERS:
+            _PACERS[profile_name] = Pacer(profile_name, _ACTIVE_POLICY["name"])
+        return _PACERS[profile_name]
+
+def set_pacing_profile(policy_name):
+    """Đổi nhịp cho mọi profile (kể cả pacer đã tạo)"""
+    if policy_name not in PACING_PROFILES: return
+    with _PACERS_LOCK:
+        _ACTIVE_POLICY["name"] = policy_name
+        for pacer in _PACERS.values():
+            pacer.policy_name = policy_name
+
+def get_pacing_profile():
+    return _ACTIVE_POLICY["name"]
+
+def pacing_report(profile_names):
+    """Tổng hợp thời gian chờ của các profile -> 1 dòng log"""
+    lines = []
+    for name in profile_names:
+        with _PACERS_LOCK:
+            pacer = _PACERS.get(name)
+        if pacer and pacer.total_waited() >= 0.5: lines.append(f"{name}: {pacer.report()}")
+    return " | ".join(lines)
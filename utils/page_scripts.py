@@ -0,0 +1,222 @@
+# utils/page_scripts.py
+# Các đoạn JS chạy trong trang (execute_script / execute_async_script).
+# Gom về 1 chỗ để các service dùng chung, tránh mỗi lần poll phải gọi WebDriver nhiều lần.
+
+# =========================================================
+# 1. GEMINI: CHỜ CÂU TRẢ LỜI MỚI VIẾT XONG (execute_async_script)
+# =========================================================
+# arguments: [selector câu trả lời, số câu trả lời cũ, ms im lặng, ms timeout, selector nút Stop, callback]
+# Trả về: {status: 'done' | 'timeout', text, count}
+# - MutationObserver bắt mọi thay đổi DOM, timer 250ms (chạy trong trang, không tốn HTTP) để đo "im lặng".
+# - Xong khi: có model-response MỚI, text không đổi trong quietMs, và không còn nút Stop.
+WAIT_FOR_NEW_RESPONSE_JS = """
+var selector = arguments[0], oldCount = arguments[1], quietMs = arguments[2],
+    timeoutMs = arguments[3], stopSelector = arguments[4];
+var done = arguments[arguments.length - 1];
+var start = Date.now(), lastText = null, lastChange = Date.now(), finished = false;
+
+function finish(result) {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearInterval(timer);
+    done(result);
+}
+
+function check() {
+    if (finished) return;
+    var els = document.querySelectorAll(selector);
+    if (els.length > oldCount) {
+        var el = els[els.length - 1];
+        var text = el.innerText || el.textContent || '';
+        if (text !== lastText) { lastText = text; lastChange = Date.now(); }
+        var busy = stopSelector && document.querySelector(stopSelector);
+        if (text.trim() && !busy && Date.now() - lastChange >= quietMs) {
+            return finish({status: 'done', text: text, count: els.length});
+        }
+    }
+    if (Date.now() - start > timeoutMs) {
+        finish({status: 'timeout', text: lastText, count: els.length});
+    }
+}
+
+var observer = new MutationObserver(check);
+observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+var timer = setInterval(check, 250);
+check();
+"""
+
+# Bản KHÔNG CHỜ (execute_script) cho chế độ nhiều tab: ghé tab, xem 1 lần rồi sang tab khác.
+# arguments: [selector câu trả lời, số câu trả lời cũ, selector nút Stop]
+# Trả về: {count, text (câu trả lời mới nhất nếu có câu MỚI, ngược lại null), busy}
+PEEK_RESPONSE_JS = """
+var els = document.querySelectorAll(arguments[0]);
+var last = els.length > arguments[1] ? els[els.length - 1] : null;
+return {
+    count: els.length,
+    text: last ? (last.innerText || last.textContent || '') : null,
+    busy: !!(arguments[2] && document.querySelector(arguments[2]))
+};
+"""
+
+# =========================================================
+# 2. FLOW: THEO DÕI ẢNH MỚI + THÔNG BÁO LỖI (cài 1 lần trước khi gửi prompt)
+# =========================================================
+# arguments: [selector ảnh, danh sách src mốc (null = lấy ảnh hiện có làm mốc), regex thông báo giới hạn (tuỳ chọn)]
+# Trả về: list src đang có trên trang (để so ảnh "ma" sau khi F5)
+# - Ảnh có src chưa từng thấy -> đợi load xong -> đẩy vào window.__memeMediaWatch.fresh
+# - Alert mới có chữ "Failed"/"lỗi" (hoặc khớp regex giới hạn) -> đẩy vào .alerts
+INSTALL_MEDIA_WATCHER_JS = """
+var selector = arguments[0], baseline = arguments[1];
+var limitRe = arguments[2] ? new RegExp(arguments[2], 'i') : null;
+var prev = window.__memeMediaWatch;
+if (prev && prev.observer) prev.observer.disconnect();
+
+function isMedia(src) { return src && (src.indexOf('blob:') !== -1 || src.indexOf('http') !== -1); }
+var current = Array.prototype.map.call(document.querySelectorAll(selector), function (e) { return e.src; })
+                                  .filter(function (s) { return !!s; });
+var watch = {seen: new Set(baseline || current), fresh: [], alerts: []};
+
+function consider(el) {
+    if (!el || el.nodeType !== 1 || !el.matches || !el.matches(selector)) return;
+    var src = el.src;
+    if (!isMedia(src) || watch.seen.has(src)) return;
+    watch.seen.add(src);
+    var push = function () {
+        watch.fresh.push({src: src, alt: el.alt || '', width: el.naturalWidth || 0, t: Date.now()});
+    };
+    if (el.complete && el.naturalWidth > 0) push();
+    else el.addEventListener('load', push, {once: true});
+}
+
+function checkAlert(el) {
+    if (!el || el.nodeType !== 1) return;
+    var box = el.closest ? el.closest("[role*='alert']") : null;
+    if (!box) return;
+    var text = (box.innerText || '').trim();
+    if (text && (text.indexOf('Failed') !== -1 || text.toLowerCase().indexOf('lỗi') !== -1 || (limitRe && limitRe.test(text)))) watch.alerts.push(text);
+}
+
+function scan(node) {
+    if (node.nodeType !== 1) return;
+    consider(node);
+    node.querySelectorAll(selector).forEach(consider);
+    checkAlert(node);
+    node.querySelectorAll("[role*='alert']").forEach(checkAlert);
+}
+
+var observer = new MutationObserver(function (mutations) {
+    mutations.forEach(function (m) {
+        if (m.type === 'attributes') consider(m.target);
+        else if (m.type === 'characterData') checkAlert(m.target.parentElement);
+        else m.addedNodes.forEach(scan);
+    });
+});
+observer.observe(document.body, {childList: true, subtree: true, characterData: true, attributes: true, attributeFilter: ['src']});
+watch.observer = observer;
+window.__memeMediaWatch = watch;
+
+// Ảnh đã có trên trang nhưng không nằm trong mốc (VD: ảnh của lần trước hiện ra sau F5)
+document.querySelectorAll(selector).forEach(consider);
+return current;
+"""
+
+# arguments: [ms timeout, callback]
+# Trả về: {status: 'media', item: {src, alt, width}} | {status: 'error', text} | {status: 'timeout'} | {status: 'no_watcher'}
+WAIT_FOR_NEW_MEDIA_JS = """
+var timeoutMs = arguments[0];
+var done = arguments[arguments.length - 1];
+var watch = window.__memeMediaWatch;
+if (!watch) return done({status: 'no_watcher'});
+var start = Date.now();
+var timer = setInterval(function () {
+    if (watch.fresh.length) { clearInterval(timer); return done({status: 'media', item: watch.fresh.shift()}); }
+    if (watch.alerts.length) { clearInterval(timer); return done({status: 'error', text: watch.alerts.shift()}); }
+    if (Date.now() - start > timeoutMs) { clearInterval(timer); done({status: 'timeout'}); }
+}, 200);
+"""
+
+# =========================================================
+# 3. SNAPSHOT DOM GỘP (1 lần execute_script thay cho N lần get_attribute / is_displayed)
+# =========================================================
+# arguments: [opts] với opts = {media, ids, id_child, alerts, popups (list XPath cần bấm đóng)}
+# Trả về JSON thuần: {media: [{src, width, visible}], ids: [{id, text, child: {src, width}}], alerts: [text], popups_closed}
+DOM_SNAPSHOT_JS = """
+var opts = arguments[0] || {};
+var out = {media: [], ids: [], alerts: [], popups_closed: 0};
+
+function visible(el) {
+    var r = el.getBoundingClientRect(), st = window.getComputedStyle(el);
+    return r.width > 0 && r.height > 0 && st.visibility !== 'hidden' && st.display !== 'none';
+}
+
+if (opts.media) {
+    document.querySelectorAll(opts.media).forEach(function (e) {
+        out.media.push({src: e.src || '', width: e.naturalWidth || 0, visible: visible(e)});
+    });
+}
+if (opts.ids) {
+    document.querySelectorAll(opts.ids).forEach(function (e) {
+        var item = {id: e.id || '', text: (e.innerText || '').slice(0, 300)};
+        if (opts.id_child) {
+            var c = e.querySelector(opts.id_child);
+            if (c) item.child = {src: c.src || '', width: c.naturalWidth || 0};
+        }
+        out.ids.push(item);
+    });
+}
+if (opts.alerts) {
+    document.querySelectorAll(opts.alerts).forEach(function (e) {
+        var t = (e.innerText || '').trim();
+        if (t) out.alerts.push(t);
+    });
+}
+if (opts.popups) {
+    opts.popups.forEach(function (xp) {
+        var r = document.evaluate(xp, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (var i = 0; i < r.snapshotLength; i++) {
+            var el = r.snapshotItem(i);
+            if (visible(el)) { el.click(); out.popups_closed++; }
+        }
+    });
+}
+return out;
+"""
+
+# =========================================================
+# 4. LẤY BYTE ẢNH NGAY TRONG TRÌNH DUYỆT (blob: hoặc ảnh đã nằm trong HTTP cache)
+# =========================================================
+# arguments: [url, callback]
+# Trả về: {ok: true, data: 'data:<mime>;base64,...', size} | {ok: false, error}
+FETCH_AS_DATA_URL_JS = """
+var url = arguments[0];
+var done = arguments[arguments.length - 1];
+fetch(url, {cache: 'force-cache'})
+    .then(function (r) {
+        if (!r.ok) throw new Error('HTTP ' + r.status);
+        return r.blob();
+    })
+    .then(function (blob) {
+        var reader = new FileReader();
+        reader.onload = function () { done({ok: true, data: reader.result, size: blob.size}); };
+        reader.onerror = function () { done({ok: false, error: 'FileReader error'}); };
+        reader.readAsDataURL(blob);
+    })
+    .catch(function (e) { done({ok: false, error: String(e)}); });
+"""
+
+# =========================================================
+# 5. THÔNG BÁO TRÊN TRANG (để nhận diện hết quota / rate limit)
+# =========================================================
+# arguments: [selector câu trả lời (tuỳ chọn), số câu trả lời cũ]
+# Trả về: {notices: text của alert / snackbar / toast, response: câu trả lời MỚI cuối cùng (nguyên văn) hoặc null}
+NOTICE_TEXT_JS = """
+var out = {notices: [], response: null};
+document.querySelectorAll("[role*='alert'], snack-bar-container, mat-snack-bar-container, [class*='toast'], [class*='snackbar']")
+    .forEach(function (e) { var t = (e.innerText || '').trim(); if (t) out.notices.push(t.slice(0, 500)); });
+if (arguments[0]) {
+    var els = document.querySelectorAll(arguments[0]);
+    if (els.length > (arguments[1] || 0)) out.response = els[els.length - 1].innerText || '';
+}
+return out;
+"""
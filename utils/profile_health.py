@@ -0,0 +1,100 @@
+import re
+import time
+import threading
+
+from config.settings import PROFILE_COOLDOWNS
+from config.selectors import LIMIT_PATTERNS
+from utils.job_queue import JOB_QUEUE
+
+
+class ProfileLimited(Exception):
+    """Trang báo profile hết quota / bị giới hạn tốc độ -> dừng profile này, nhường việc cho profile khác"""
+    def __init__(self, kind, message=""):
+        super().__init__(f"{kind}: {message[:120]}")
+        self.kind = kind
+        self.message = message
+
+
+def classify_limit(text):
+    """Đoán loại giới hạn từ text trên trang. Trả về 'quota' / 'rate_limit' hoặc None"""
+    if not text: return None
+    low = text.lower()
+    # Quota xét trước: thông báo hết lượt thường kèm luôn câu "thử lại sau"
+    for kind in ("quota", "rate_limit"):
+        for pattern in LIMIT_PATTERNS.get(kind, []):
+            if re.search(pattern, low):
+                return kind
+    return None
+
+
+def limit_regex():
+    """Gộp mọi pattern thành 1 regex (dùng trong JS watcher của trang)"""
+    return "|".join(f"(?:{p})" for kind in LIMIT_PATTERNS for p in LIMIT_PATTERNS[kind])
+
+
+class ProfileHealth:
+    """
+    Theo dõi profile đang bị nghỉ (cooldown) sau khi dính quota / rate limit.
+    Scheduler không giao việc cho profile đang nghỉ cho tới khi hết hạn.
+    store (JobQueue): lưu thời hạn nghỉ vào DB chung -> worker khác / cli.py / giao diện đều thấy, "Bỏ nghỉ" có tác dụng thật.
+    store=None -> chỉ nhớ trong tiến trình này.
+    """
+    def __init__(self, cooldowns=PROFILE_COOLDOWNS, store=None):
+        self.cooldowns = cooldowns
+        self.store = store
+        self._lock = threading.Lock()
+        self._until = {}    # profile -> (thời điểm hết nghỉ, loại giới hạn)
+
+    def _sync(self):
+        """Đọc lại từ store (profile vừa bị worker khác cho nghỉ / vừa được bỏ nghỉ). Lỗi DB -> dùng bản trong bộ nhớ"""
+        if self.store is None: return
+        try:
+            until = self.store.cooldowns()
+        except Exception as e:
+            print(f"[ProfileHealth] ⚠️ Không đọc được trạng thái nghỉ: {e}")
+            return
+        with self._lock: self._until = until
+
+    def mark_limited(self, profile_name, kind):
+        seconds = self.cooldowns.get(kind, self.cooldowns.get("rate_limit", 600))
+        until = time.time() + seconds
+        with self._lock:
+            self._until[profile_name] = (until, kind)
+        if self.store is not None:
+            try:
+                self.store.set_cooldown(profile_name, until, kind)
+            except Exception as e:
+                print(f"[ProfileHealth] ⚠️ Không lưu được trạng thái nghỉ: {e}")
+        return seconds
+
+    def cooldown_left(self, profile_name):
+        """Số giây còn phải nghỉ (0 = khỏe)"""
+        self._sync()
+        with self._lock:
+            until, _ = self._until.get(profile_name, (0, None))
+            left = until - time.time()
+            if left <= 0:
+                self._until.pop(profile_name, None)
+                return 0
+            return left
+
+    def is_healthy(self, profile_name):
+        return self.cooldown_left(profile_name) <= 0
+
+    def cooling(self):
+        """{profile: (số giây còn lại, loại giới hạn)} của các profile đang nghỉ"""
+        self._sync()
+        with self._lock:
+            now = time.time()
+            return {p: (u - now, k) for p, (u, k) in self._until.items() if u > now}
+
+    def clear(self, profile_name=None):
+        with self._lock:
+            if profile_name is None: self._until.clear()
+            else: self._until.pop(profile_name, None)
+        if self.store is not None:
+            self.store.clear_cooldown(profile_name)
+
+
+# Dùng chung cho cả app (Step 2 + Step 3), thời hạn nghỉ lưu trong DB hàng đợi job (chung mọi tiến trình)
+PROFILE_HEALTH = ProfileHealth(store=JOB_QUEUE)
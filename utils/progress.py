@@ -0,0 +1,125 @@
+import time
+import threading
+
+class ProgressTracker:
+    """
+    Kênh tiến độ trong 1 file (chunk / cảnh) từ scheduler + generator tới giao diện / CLI / worker.
+    - Luồng worker gọi start / advance / attempt (an toàn đa luồng).
+    - Mỗi thay đổi -> gửi snapshot (dict) cho mọi hàm đã subscribe, gọi ngoài khóa.
+    - Tốc độ (đơn vị / phút) = phần đã chạy thật trong lần này / thời gian chạy (không tính phần có sẵn từ nhật ký / kho).
+      Mọi profile cùng làm mọi file (work-stealing) -> dùng tốc độ chung. ETA = phần còn lại / tốc độ.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._files = {}        # tên file -> state
+        self._listeners = []
+        self._started = None    # lúc file đầu tiên được đăng ký (bắt đầu lần chạy)
+        self._worked = 0        # tổng đơn vị đã chạy trong lần này (mọi file)
+
+    def subscribe(self, callback):
+        """callback(snapshot) được gọi từ luồng worker -> phải nhanh, không đụng Streamlit trực tiếp"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def start(self, name, total, done=0, unit="dòng"):
+        """done: phần đã có sẵn (nhật ký, cache, ảnh cũ) -> tính vào tiến độ, không tính vào tốc độ"""
+        now = time.time()
+        with self._lock:
+            self._files[name] = {
+                "file": name, "unit": unit, "total": total, "done": done, "failed": 0,
+                "attempt": 0, "label": "", "updated": now,
+            }
+            if self._started is None: self._started = now
+        self._emit(name)
+
+    def advance(self, name, done=0, failed=0):
+        now = time.time()
+        with self._lock:
+            state = self._files.get(name)
+            if state is None: return
+            state["done"] += done
+            state["failed"] += failed
+            state["updated"] = now
+            state["attempt"], state["label"] = 0, ""  # Chunk / cảnh vừa xong -> hết trạng thái thử lại
+            self._worked += done + failed
+        self._emit(name)
+
+    def attempt(self, name, label, n):
+        """Lượt thử hiện tại của 1 chunk / cảnh (lần 2, 3... = đang thử lại)"""
+        with self._lock:
+            state = self._files.get(name)
+            if state is None: return
+            state["attempt"] = n
+            state["label"] = label
+            state["updated"] = time.time()
+        self._emit(name)
+
+    def snapshot(self, name):
+        with self._lock:
+            return self._snapshot(name, time.time())
+
+    def snapshots(self):
+        now = time.time()
+        with self._lock:
+            return [self._snapshot(name, now) for name in self._files]
+
+    def _rate(self, now):
+        if not self._worked or self._started is None: return None
+        return self._worked / max((now - self._started) / 60, 1 / 60)
+
+    def _snapshot(self, name, now):
+        """Gọi khi đang giữ self._lock"""
+        state = self._files.get(name)
+        if state is None: return None
+        rate = self._rate(now)
+        left = max(0, state["total"] - state["done"] - state["failed"])
+        return {
+            **{k: state[k] for k in ("file", "unit", "total", "done", "failed", "attempt", "label")},
+            "rate": round(rate, 1) if rate else None,
+            "eta": round(left / rate * 60) if rate and left else (0 if not left else None),
+            "updated": state["updated"],  # hoạt động gần nhất -> phân biệt chạy chậm với bị treo
+        }
+
+    def _emit(self, name):
+        with self._lock:
+            snap = self._snapshot(name, time.time())
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(snap)
+            except Exception as e:
+                print(f"[Progress] ⚠️ Lỗi listener: {e}")
+
+
+def format_seconds(seconds):
+    if seconds is None: return "?"
+    if seconds < 60: return f"{int(seconds)} giây"
+    if seconds < 3600: return f"{seconds / 60:.0f} phút"
+    return f"{seconds / 3600:.1f} giờ"
+
+def describe(snap):
+    """Snapshot -> 1 dòng: '12/40 dòng · 5.2 dòng/phút · còn ~5 phút · Chunk 3 lần 2'"""
+    if not snap: return ""
+    parts = [f"{snap['done']}/{snap['total']} {snap['unit']}"]
+    if snap["failed"]: parts.append(f"{snap['failed']} lỗi")
+    if snap["rate"]: parts.append(f"{snap['rate']} {snap['unit']}/phút")
+    if snap["eta"]: parts.append(f"còn ~{format_seconds(snap['eta'])}")
+    if snap["attempt"] > 1: parts.append(f"{snap['label']} lần {snap['attempt']}")
+    return " · ".join(parts)
+
+
+class ThrottledListener:
+    """Bọc 1 listener: mỗi file tối đa 1 lần / `interval` giây (file xong luôn được gửi) -> không ghi DB / in log dồn dập"""
+    def __init__(self, callback, interval=2.0):
+        self.callback = callback
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last = {}
+
+    def __call__(self, snap):
+        finished = snap["done"] + snap["failed"] >= snap["total"]
+        now = time.time()
+        with self._lock:
+            if not finished and now - self._last.get(snap["file"], 0) < self.interval: return
+            self._last[snap["file"]] = now
+        self.callback(snap)
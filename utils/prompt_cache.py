@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from config.settings import PROMPT_CACHE_DIR, PROMPT_CACHE_MAX_MB, PROMPT_CACHE_ENABLED
+
+def cache_key(chunk, system_prompt, gemini_url):
+    """sha256(chunk + luật + link Gem) -> đổi luật / đổi Gem là tự thành key khác"""
+    h = hashlib.sha256()
+    for part in (system_prompt.strip(), gemini_url.strip(), "\n".join(b.strip() for b in chunk)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+class PromptResponseCache:
+    """
+    Cache câu trả lời Gemini theo NỘI DUNG chunk (dùng chung mọi dự án, nằm trong WORKSPACE/.cache).
+    - Mỗi entry 1 file JSON: {"items": [...]} (list object đã parse từ extract_json_from_text).
+    - Khác nhật ký (xóa khi file xong): cache giữ lâu dài -> sửa vài dòng SRT chỉ tốn các chunk bị đổi.
+    - Vượt max_mb -> xóa entry lâu không dùng nhất (LRU theo mtime, mỗi lần trúng cache là "chạm" lại).
+    """
+    def __init__(self, cache_dir=PROMPT_CACHE_DIR, max_mb=PROMPT_CACHE_MAX_MB, enabled=PROMPT_CACHE_ENABLED):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._index = None  # key -> [size, last_used] (quét thư mục lần đầu dùng)
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        if self._index is not None: return
+        self._index, self._total = {}, 0
+        if not os.path.isdir(self.cache_dir): return
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir(): continue
+            for entry in os.scandir(sub.path):
+                if not entry.name.endswith(".json"): continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                self._index[entry.name[:-5]] = [st.st_size, st.st_mtime]
+                self._total += st.st_size
+
+    def get(self, chunk, system_prompt, gemini_url):
+        """Trả về list items đã lưu, hoặc None nếu chưa có"""
+        if not self.enabled: return None
+        key = cache_key(chunk, system_prompt, gemini_url)
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                items = json.load(f).get("items")
+        except (OSError, ValueError, AttributeError):
+            items = None
+        with self._lock:
+            if not items:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._load_index()
+            now = time.time()
+            if key in self._index: self._index[key][1] = now
+        try: os.utime(path, (now, now))
+        except OSError: pass
+        return items
+
+    def put(self, chunk, system_prompt, gemini_url, items):
+        if not self.enabled or not items: return
+        key = cache_key(chunk, system_prompt, gemini_url)
+        path = self._path(key)
+        data = json.dumps({"items": items}, ensure_ascii=False).encode("utf-8")
+        # Ghi nguyên tử: file tạm -> os.replace (đang ghi mà crash không để lại JSON dở)
+        tmp = f"{path}.{threading.get_ident()}.part"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[PromptCache] ⚠️ Không ghi được cache: {e}")
+            try: os.remove(tmp)
+            except OSError: pass
+            return
+        with self._lock:
+            self._load_index()
+            old = self._index.get(key)
+            if old: self._total -= old[0]
+            self._index[key] = [len(data), time.time()]
+            self._total += len(data)
+            self._evict()
+
+    def _evict(self):
+        """Gọi khi đang giữ self._lock: xóa entry cũ nhất tới khi tổng dung lượng <= max_bytes"""
+        if self._total <= self.max_bytes: return
+        for key, (size, _) in sorted(self._index.items(), key=lambda kv: kv[1][1]):
+            if self._total <= self.max_bytes: break
+            try: os.remove(self._path(key))
+            except OSError: pass
+            del self._index[key]
+            self._total -= size
+
+    def size_mb(self):
+        with self._lock:
+            self._load_index()
+            return self._total / (1024 * 1024)
+
+    def clear(self):
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                try: os.remove(self._path(key))
+                except OSError: pass
+            self._index, self._total = {}, 0
+
+
+# Cache dùng chung cho cả app
+PROMPT_CACHE = PromptResponseCache()
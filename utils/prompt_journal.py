@@ -0,0 +1,80 @@
+import os
+import json
+import hashlib
+import threading
+
+def journal_path_for(output_json_path):
+    """VD: 2_prompts/abc_prompts.json -> 2_prompts/abc_prompts.journal.jsonl"""
+    return f"{os.path.splitext(output_json_path)[0]}.journal.jsonl"
+
+def block_key(block_text):
+    return hashlib.sha1(block_text.strip().encode("utf-8")).hexdigest()
+
+class PromptJournal:
+    """
+    Nhật ký (JSONL) các chunk đã xong, nằm cạnh file _prompts.json.
+    - Mỗi chunk xong -> ghi ngay 1 dòng {"blocks": [hash từng block SRT], "items": [...]}.
+    - Chạy lại: chunk nào mọi block đã có trong nhật ký thì bỏ qua.
+    - Khóa theo nội dung block (không theo số thứ tự chunk) -> đổi chunk size / sửa SRT vẫn dùng lại được phần không đổi.
+    """
+    def __init__(self, output_json_path):
+        self.path = journal_path_for(output_json_path)
+        self._lock = threading.Lock()
+        self._entries = []      # list (tuple hash block, items)
+        self._done_blocks = {}  # hash block -> vị trí entry trong self._entries
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path): return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line: continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Dòng cuối ghi dở khi bị crash -> bỏ qua
+                self._add(tuple(entry.get("blocks", [])), entry.get("items", []))
+
+    def _add(self, keys, items):
+        self._entries.append((keys, items))
+        for k in keys:
+            self._done_blocks[k] = len(self._entries) - 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def has_chunk(self, chunk):
+        return all(block_key(b) in self._done_blocks for b in chunk)
+
+    def items_for(self, blocks):
+        """
+        Dựng lại dữ liệu của cả file từ nhật ký, theo thứ tự block trong file.
+        Mỗi dòng nhật ký chỉ lấy 1 lần; dòng của SRT cũ (block đã bị sửa) bị bỏ qua.
+        """
+        with self._lock:
+            used, items = set(), []
+            for b in blocks:
+                pos = self._done_blocks.get(block_key(b))
+                if pos is None or pos in used: continue
+                used.add(pos)
+                items.extend(self._entries[pos][1])
+            return items
+
+    def record(self, chunk, items):
+        """Ghi 1 chunk vừa xong xuống đĩa ngay lập tức (an toàn đa luồng)"""
+        keys = [block_key(b) for b in chunk]
+        line = json.dumps({"blocks": keys, "items": items}, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._add(tuple(keys), items)
+
+    def remove(self):
+        """File _prompts.json đã đủ (hoặc chạy lại từ đầu) -> xóa nhật ký"""
+        with self._lock:
+            try: os.remove(self.path)
+            except FileNotFoundError: pass
+            self._entries, self._done_blocks = [], {}
@@ -0,0 +1,92 @@
+import re
+
+# 00:01:02,345 --> 00:01:04,000 (chấp nhận cả dấu '.' thay ',', giờ 1 chữ số và thiếu phần mili giây)
+TIMING_RE = re.compile(r"(\d+):(\d{1,2}):(\d{1,2})(?:[,.](\d{1,3}))?\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})(?:[,.](\d{1,3}))?")
+
+class SrtCue:
+    """1 câu phụ đề. __slots__ -> file SRT dài vài giờ vẫn nhẹ bộ nhớ"""
+    __slots__ = ("index", "start_ms", "end_ms", "text")
+
+    def __init__(self, index, start_ms, end_ms, text):
+        self.index = index
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.text = text
+
+    def prompt_line(self):
+        """Dòng gửi Gemini: chỉ số thứ tự + chữ (không gửi timing -> prompt ngắn hơn)"""
+        return f"{self.index}: {' '.join(self.text.split())}"
+
+    def __repr__(self):
+        return f"SrtCue({self.index}, {self.start_ms}-{self.end_ms}ms, {self.text!r})"
+
+def _to_ms(h, m, s, frac):
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int((frac or "0").ljust(3, "0"))
+
+def _parse_block(lines, next_index):
+    """
+    list dòng của 1 block -> (index, start_ms, end_ms, text), hoặc None nếu không có dòng timing.
+    Thiếu / sai số thứ tự -> dùng next_index.
+    """
+    for pos, line in enumerate(lines[:2]):
+        match = TIMING_RE.search(line)
+        if not match: continue
+        g = match.groups()
+        index = next_index
+        if pos == 1 and lines[0].strip().isdigit():
+            index = int(lines[0].strip())
+        return index, _to_ms(*g[:4]), _to_ms(*g[4:]), "\n".join(l.strip() for l in lines[pos + 1:]).strip()
+    return None
+
+def iter_srt(file_path):
+    """
+    Đọc SRT kiểu streaming (từng dòng, không đọc cả file) -> yield SrtCue.
+    - BOM (utf-8-sig) và CRLF được xử lý tự động.
+    - Block không có dòng timing (VD: chữ có dòng trống ở giữa) -> nối vào câu trước.
+    - Câu không có chữ -> bỏ qua.
+    - index luôn tăng dần, không trùng.
+    """
+    pending = None
+    next_index = 1
+    block = []
+
+    def flush():
+        nonlocal pending, next_index
+        parsed = _parse_block(block, next_index)
+        if parsed is None:
+            text = "\n".join(l.strip() for l in block).strip()
+            if pending is not None and text:
+                pending.text = f"{pending.text}\n{text}".strip()
+            return None
+        # Số thứ tự trùng / lùi (SRT bị ghép, sửa tay) -> đánh lại, mỗi câu 1 index riêng (Gemini khớp theo index)
+        if parsed[0] < next_index:
+            parsed = (next_index,) + parsed[1:]
+        done, pending = pending, SrtCue(*parsed)
+        next_index = pending.index + 1
+        return done
+
+    with open(file_path, "r", encoding="utf-8-sig", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line.strip():
+                block.append(line)
+                continue
+            if not block: continue
+            done = flush()
+            block = []
+            if done is not None and done.text: yield done
+    if block:
+        done = flush()
+        if done is not None and done.text: yield done
+    if pending is not None and pending.text:
+        yield pending
+
+def attach_timings(items, cues_by_index):
+    """Gắn start_ms / end_ms từ SRT vào từng object Gemini trả về (khớp theo index)"""
+    for item in items:
+        if not isinstance(item, dict): continue
+        cue = cues_by_index.get(str(item.get("index")).strip())
+        if cue is not None:
+            item["start_ms"] = cue.start_ms
+            item["end_ms"] = cue.end_ms
+    return items
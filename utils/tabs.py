@@ -0,0 +1,32 @@
+# utils/tabs.py
+# Nhiều tab trong CÙNG 1 trình duyệt (1 profile): mỗi tab chạy 1 hội thoại Gemini / 1 dự án Flow.
+# Selenium chỉ điều khiển được 1 tab tại 1 thời điểm -> worker tự chuyển tab lần lượt (cooperative),
+# không dùng nhiều luồng trên cùng 1 driver.
+
+from utils.browser_setup import apply_lean_mode
+
+def open_tabs(driver, count):
+    """Đảm bảo driver có đủ `count` tab. Trả về list handle (tab hiện tại đứng đầu)."""
+    first = driver.current_window_handle
+    handles = [first]
+    # Chặn tài nguyên theo từng tab (DevTools) -> tab mới chặn giống tab đầu
+    lean = getattr(driver, "lean_mode", None)
+    for _ in range(max(0, count - 1)):
+        driver.switch_to.new_window("tab")
+        if lean: apply_lean_mode(driver, lean, log_callback=lambda *_: None)
+        handles.append(driver.current_window_handle)
+    driver.switch_to.window(first)
+    return handles
+
+def close_extra_tabs(driver, keep_handle=None):
+    """Đóng mọi tab trừ keep_handle (mặc định tab đầu tiên) -> trả driver về pool sạch sẽ"""
+    try:
+        handles = driver.window_handles
+        keep = keep_handle if keep_handle in handles else handles[0]
+        for h in handles:
+            if h == keep: continue
+            driver.switch_to.window(h)
+            driver.close()
+        driver.switch_to.window(keep)
+    except Exception:
+        pass
@@ -1,11 +1,11 @@
 import streamlit as st
 import os
 import time
-import glob
 import shutil
 
 # 👇 Import cấu hình
 from config.settings import WORKSPACE,get_project_structure
+from services.transcribe_service import list_audio_files, srt_output_path, transcribe_audio
 
 def render():
     # =========================================================
@@ -50,11 +50,8 @@ def render():
     # =========================================================
     # 2. CÁCH 1: CHỌN AUDIO ĐỂ THỰC THI (Lấy từ 0_audio_raw)
     # =========================================================
-    # Quét các file audio trong folder
-    search_pattern = os.path.join(DIR_INPUT, "*.*")
-    # Lọc đuôi file audio
-    valid_ext = ['.mp3', '.wav', '.m4a']
-    all_audio_paths = [f for f in glob.glob(search_pattern) if os.path.splitext(f)[1].lower() in valid_ext]
+    # Quét các file audio trong folder (lọc đuôi mp3 / wav / m4a)
+    all_audio_paths = list_audio_files(DIR_INPUT)
     
     if not all_audio_paths:
         st.warning(f"⚠️ Chưa có Audio nào trong `0_audio_raw`. Vui lòng upload hoặc copy file vào folder này.")
@@ -78,27 +75,11 @@ def render():
     if btn_run:
         # Định nghĩa đường dẫn output
         # Ví dụ: file gốc "meeting.mp3" -> output "meeting.srt" trong folder 1_input
-        base_name = os.path.splitext(selected_filename)[0]
-        output_srt_name = f"{base_name}.srt"
-        target_output_path = os.path.join(DIR_OUTPUT, output_srt_name)
+        output_srt_name = os.path.basename(srt_output_path(selected_audio_path, DIR_OUTPUT))
 
         with st.status("Đang xử lý Whisper...", expanded=True) as s:
-            st.write("🔹 Đang tải model Whisper...")
-            time.sleep(1) # Giả lập load model
-            
-            st.write(f"🔹 Đang transcribe file: {selected_filename}...")
-            # --- LOGIC GỌI WHISPER THỰC TẾ Ở ĐÂY ---
-            # Ví dụ giả lập kết quả trả về
-            time.sleep(2) 
-            
-            fake_srt_content = (
-                "1\n00:00:01 --> 00:00:05\nChào bạn, đây là nội dung từ file audio " + selected_filename + ".\n\n"
-                "2\n00:00:05 --> 00:00:10\nQuy trình này đảm bảo output step 1 vào đúng input step 2."
-            )
-            
-            # Lưu file vào folder 1_input
-            with open(target_output_path, "w", encoding="utf-8") as f:
-                f.write(fake_srt_content)
+            # Logic Whisper nằm ở services/transcribe_service.py (dùng chung với cli.py)
+            target_output_path = transcribe_audio(selected_audio_path, DIR_OUTPUT, status_callback=st.write)
             
             s.update(label="✅ Hoàn tất!", state="complete")
             
@@ -2,51 +2,14 @@ import streamlit as st
 import os
 import glob
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Import Settings
-from config.settings import get_project_structure, PROFILES_DIR
+from config.settings import get_project_structure, PROFILES_DIR, MAX_TABS_PER_PROFILE, LEAN_MODE, CHUNK_BUDGET
 from config.selectors import GEMINI_CONFIG
-from services.prompt_generator import VisualPromptGenerator
-
-def process_single_file(file_info, assigned_profile_json, gemini_url, chunk_size, dir_output):
-    """Worker xử lý 1 file SRT -> JSON"""
-    input_path = file_info['path']
-    file_name = file_info['name']
-    
-    base_name = os.path.splitext(file_name)[0]
-    output_filename = f"{base_name}_prompts.json"
-    output_path = os.path.join(dir_output, output_filename)
-    
-    local_gen = VisualPromptGenerator() 
-    
-    result_dict = {
-        "file": file_name,
-        "path": output_path,
-        "status": "failed",
-        "msg": "Unknown Error",
-        "profile": os.path.basename(assigned_profile_json)
-    }
-
-    try:
-        success = local_gen.generate_via_gemini_web(
-            input_srt_path=input_path,
-            output_json_path=output_path,
-            profile_json_path=assigned_profile_json,
-            chunk_size=chunk_size,
-            gemini_url=gemini_url
-        )
-        
-        if success:
-            result_dict["status"] = "success"
-            result_dict["msg"] = "OK"
-        else:
-            result_dict["msg"] = "Logic returned False"
-            
-    except Exception as e:
-        result_dict["msg"] = str(e)
-        
-    return result_dict
+from utils.job_queue import JOB_QUEUE
+from utils.pacing import get_pacing_profile
+from utils.prompt_journal import journal_path_for
+from utils.helpers import render_job_queue
 
 def render():
     current_proj = st.session_state.get("current_project")
@@ -103,10 +66,16 @@ def render():
     # 3. UI DATA EDITOR
     # =========================================================
     data_list = []
+    queued = JOB_QUEUE.active_paths(current_proj, 2)
     for item in file_options:
         f_name = item["name"]
         expected_json = os.path.join(DIR_OUTPUT, f"{os.path.splitext(f_name)[0]}_prompts.json")
         status_icon = "✅ Đã xong" if os.path.exists(expected_json) else "⚪ Chưa làm"
+        # Còn nhật ký = lần chạy trước bị ngắt/thiếu chunk -> chạy lại chỉ tốn phần còn thiếu
+        if os.path.exists(journal_path_for(expected_json)):
+            status_icon = "⏸️ Dở dang"
+        if item["path"] in queued:
+            status_icon = "🏃 Đang chạy" if queued[item["path"]] == "leased" else "⏳ Trong hàng đợi"
         
         data_list.append({
             "Chạy": False, 
@@ -151,48 +120,45 @@ def render():
         else:
             st.info("ℹ️ Đang chạy 1 Profile")
             max_threads = 1
-            
-        chunk_size = st.number_input("Chunk Size:", 1, 50, 20)
+
+        tabs = st.number_input("🗂️ Số tab / profile:", 1, MAX_TABS_PER_PROFILE, 1, help="Mỗi tab chạy 1 hội thoại Gemini riêng trong cùng trình duyệt (không tốn thêm profile/proxy).")
+        if tabs > 1:
+            st.caption(f"Tổng: {max_threads} profile x {tabs} tab = {max_threads * tabs} luồng")
+        adaptive = st.checkbox("📏 Chia chunk theo độ dài (tự điều chỉnh)", value=CHUNK_BUDGET["ADAPTIVE"], help="Gom dòng theo số ký tự. Gemini trả đủ -> chunk to dần (ít lượt gửi), trả thiếu/lỗi -> chunk nhỏ lại.")
+        chunk_size = None
+        if not adaptive:
+            chunk_size = st.number_input("Chunk Size:", 1, 50, 20)
+        reuse_chat = st.checkbox("💬 Giữ hội thoại", value=False, help="Mồi luật 1 lần, các chunk sau gửi tiếp trong cùng chat (không tải lại Gemini)")
+        max_turns = GEMINI_CONFIG["MAX_TURNS_PER_CHAT"]
+        if reuse_chat:
+            max_turns = st.number_input("Số lượt / chat:", 1, 50, GEMINI_CONFIG["MAX_TURNS_PER_CHAT"])
+        lean = st.checkbox("🪶 Chặn ảnh/font/analytics", value=LEAN_MODE, help="Step 2 chỉ cần chữ -> không tải ảnh, font, script thống kê qua proxy.")
         st.write("")
-        btn_start = st.button(f"🚀 CHẠY ({len(files_to_process)})", type="primary", disabled=not files_to_process, use_container_width=True)
+        btn_start = st.button(f"🚀 XẾP HÀNG ({len(files_to_process)})", type="primary", disabled=not files_to_process, use_container_width=True)
 
     # =========================================================
-    # 4. THỰC THI
+    # 4. XẾP HÀNG (worker.py chạy, giao diện chỉ theo dõi)
     # =========================================================
     if btn_start:
-        st.divider()
-        status_box = st.status(f"⏳ Đang xử lý {len(files_to_process)} files...", expanded=True)
-        log = status_box.empty()
-        pbar = status_box.progress(0)
-        results = []
-        
-        count = 0
-        with ThreadPoolExecutor(max_threads) as executor:
-            futures = {}
-            for i, f_info in enumerate(files_to_process):
-                # Round Robin Profile
-                prof = available_profiles_paths[i % len(available_profiles_paths)]
-                
-                futures[executor.submit(
-                    process_single_file, 
-                    f_info, prof, 
-                    GEMINI_CONFIG["URL"], 
-                    chunk_size, DIR_OUTPUT
-                )] = f_info["name"]
-
-            for future in as_completed(futures):
-                fname = futures[future]
-                try:
-                    data = future.result()
-                    results.append(data)
-                    icon = "✅" if data["status"] == "success" else "❌"
-                    log.write(f"{icon} **{fname}** ({data['profile']})")
-                except Exception as e:
-                    log.write(f"🔥 Lỗi {fname}: {e}")
-                
-                count += 1
-                pbar.progress(count / len(files_to_process))
-
-        status_box.update(label="Hoàn tất!", state="complete", expanded=False)
-        if results:
-            st.dataframe(pd.DataFrame(results)[["file", "status", "profile", "msg"]], use_container_width=True)
\ No newline at end of file
+        # Work-stealing theo chunk vẫn giữ nguyên: worker chạy PromptBatchScheduler với đúng các tham số này
+        job_id, skipped = JOB_QUEUE.enqueue(
+            current_proj, 2, files_to_process,
+            params={
+                "dir_output": DIR_OUTPUT,
+                "chunk_size": chunk_size,
+                "gemini_url": GEMINI_CONFIG["URL"],
+                "reuse_conversation": reuse_chat,
+                "max_turns_per_chat": max_turns,
+                "tabs_per_profile": tabs,
+                "lean_mode": lean,
+                "pacing": get_pacing_profile(),
+            },
+            profiles=selected_profile_names[:max_threads]
+        )
+        if job_id:
+            st.success(f"📬 Đã xếp Job #{job_id} ({len(files_to_process) - skipped} file). Worker (`python worker.py`) sẽ tự nhận.")
+        if skipped:
+            st.info(f"ℹ️ {skipped} file đang chờ / đang chạy ở job khác nên được bỏ qua.")
+
+    st.divider()
+    render_job_queue(current_proj, 2)
@@ -2,40 +2,11 @@ import streamlit as st
 import os
 import glob
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from config.settings import get_project_structure, PROFILES_DIR
-from services.visual_generator import VisualGenerator
-
-def process_visual_task(file_info, assigned_profile_json, engine, dir_output):
-    """Worker chạy đa luồng"""
-    input_path = file_info['path']
-    file_name = file_info['name']
-    
-    # Tạo folder chứa ảnh riêng cho từng file JSON
-    base_name = os.path.splitext(file_name)[0]
-    assets_folder = os.path.join(dir_output, f"{base_name}_assets")
-    if not os.path.exists(assets_folder): os.makedirs(assets_folder)
-
-    # Khởi tạo Generator
-    local_gen = VisualGenerator(engine=engine) 
-    
-    result = {"file": file_name, "profile": os.path.basename(assigned_profile_json), "status": "failed", "msg": "Unknown"}
-
-    try:
-        success = local_gen.generate_images(
-            input_prompts_path=input_path,
-            output_folder=assets_folder,
-            profile_json_path=assigned_profile_json
-        )
-        if success:
-            result["status"] = "success"
-            result["msg"] = f"Lưu tại: {os.path.basename(assets_folder)}"
-        else:
-            result["msg"] = "Có lỗi xảy ra (Xem log)"
-    except Exception as e:
-        result["msg"] = str(e)
-    
-    return result
+from config.settings import get_project_structure, PROFILES_DIR, CAPTURE_FROM_BROWSER, MAX_TABS_PER_PROFILE, LEAN_MODE
+from config.selectors import VISUAL_CONFIGS
+from utils.job_queue import JOB_QUEUE
+from utils.pacing import get_pacing_profile
+from utils.helpers import render_job_queue
 
 def render():
     current_proj = st.session_state.get("current_project")
@@ -104,6 +75,11 @@ def render():
         engine_label = st.radio("Model:", ["Flow (Flux)", "Google Veo"])
         engine_map = {"Flow (Flux)": "flow", "Google Veo": "google_veo"}
         selected_engine = engine_map[engine_label]
+        pipeline_depth = VISUAL_CONFIGS["flow"]["PIPELINE_DEPTH"]
+        if selected_engine == "flow":
+            pipeline_depth = st.number_input("🔗 Số prompt gửi trước (Flow):", 1, 8, pipeline_depth, help="1 = chờ xong ảnh mới gửi prompt tiếp. >1 = Flow vẽ nhiều ảnh cùng lúc trong 1 dự án.")
+        capture = st.checkbox("📥 Lấy ảnh từ trình duyệt", value=CAPTURE_FROM_BROWSER, help="Không tải lại ảnh qua proxy (tiết kiệm băng thông). Lỗi sẽ tự tải như cũ.")
+        lean = st.checkbox("🪶 Chặn font/analytics", value=LEAN_MODE, help="Không tải font, script thống kê qua proxy. Ảnh/video kết quả vẫn giữ nguyên.")
 
         # Fix lỗi Slider
         max_limit = len(profile_paths)
@@ -112,32 +88,40 @@ def render():
         else:
             st.info("ℹ️ Đang chạy 1 luồng (1 Profile)")
             max_threads = 1
-            
+
+        tabs = 1
+        if selected_engine == "flow":
+            tabs = st.number_input("🗂️ Số tab / profile:", 1, MAX_TABS_PER_PROFILE, 1, help="Mỗi tab chạy 1 dự án Flow riêng trong cùng trình duyệt (không tốn thêm profile/proxy).")
+        if tabs > 1:
+            st.caption(f"Tổng: {max_threads} profile x {tabs} tab = {max_threads * tabs} luồng")
         st.write("")
-        btn_start = st.button(f"🚀 CHẠY ({len(raw_files_to_run)})", type="primary", disabled=not raw_files_to_run)
+        btn_start = st.button(f"🚀 XẾP HÀNG ({len(raw_files_to_run)})", type="primary", disabled=not raw_files_to_run)
 
     # =========================================================
-    # 3. THỰC THI
+    # 3. XẾP HÀNG (worker.py chạy, giao diện chỉ theo dõi)
     # =========================================================
     if btn_start:
-        st.divider()
-        status = st.status(f"⏳ Đang chạy {max_threads} luồng với {selected_engine}...", expanded=True)
-        log = status.empty()
-        pbar = status.progress(0)
-        
-        with ThreadPoolExecutor(max_threads) as ex:
-            futures = {}
-            for i, f in enumerate(raw_files_to_run):
-                prof = profile_paths[i % len(profile_paths)]
-                futures[ex.submit(process_visual_task, f, prof, selected_engine, DIR_OUTPUT)] = f["name"]
-            
-            for i, fut in enumerate(as_completed(futures)):
-                res = fut.result()
-                icon = "✅" if res["status"] == "success" else "❌"
-                log.write(f"{icon} **{res['file']}** ({res['profile']}): {res['msg']}")
-                pbar.progress((i + 1) / len(raw_files_to_run))
-        
-        status.update(label="Xong!", state="complete")
+        # Chia theo CẢNH vẫn giữ nguyên: worker chạy VisualBatchScheduler với đúng các tham số này
+        job_id, skipped = JOB_QUEUE.enqueue(
+            current_proj, 3, raw_files_to_run,
+            params={
+                "dir_output": DIR_OUTPUT,
+                "engine": selected_engine,
+                "capture_in_browser": capture,
+                "pipeline_depth": pipeline_depth,
+                "tabs_per_profile": tabs,
+                "lean_mode": lean,
+                "pacing": get_pacing_profile(),
+            },
+            profiles=selected_profiles[:max_threads]
+        )
+        if job_id:
+            st.success(f"📬 Đã xếp Job #{job_id} ({len(raw_files_to_run) - skipped} file). Worker (`python worker.py`) sẽ tự nhận.")
+        if skipped:
+            st.info(f"ℹ️ {skipped} file đang chờ / đang chạy ở job khác nên được bỏ qua.")
+
+    st.divider()
+    render_job_queue(current_proj, 3)
 
     # =========================================================
     # 4. VIEW KẾT QUẢ (GALLERY)
@@ -1,19 +1,26 @@
 # views/step4_merge.py
 import streamlit as st
-import time
 import os
-from config.settings import WORKSPACE
-from utils.helpers import save_file, render_artifact_viewer
+from config.settings import get_project_structure
+from utils.helpers import render_artifact_viewer
+from services.merge_service import render_final_video
 
 def render():
+    current_proj = st.session_state.get("current_project")
+    if not current_proj:
+        st.warning("👈 Vui lòng chọn một Dự Án!")
+        return
+
+    # Video cuối nằm trong 4_final của dự án (cùng chỗ với cli.py)
+    final_path = os.path.join(get_project_structure(current_proj)["4_final"], "final_video.mp4")
+
     st.header("🏁 Bước 4: Hợp nhất Video cuối cùng")
     
     if st.button("🚀 Render Final Video", type="primary"):
         with st.spinner("Đang chạy FFmpeg..."):
-            time.sleep(2)
-            # Giả lập tạo video
-            save_file("fake_video_content", "final_video.mp4")
+            # Logic FFmpeg nằm ở services/merge_service.py (dùng chung với cli.py)
+            render_final_video(final_path)
             st.balloons()
             st.success("Render thành công!")
 
-    render_artifact_viewer(os.path.join(WORKSPACE, "final_video.mp4"), "Video Thành Phẩm")
\ No newline at end of file
+    render_artifact_viewer(final_path, "Video Thành Phẩm")
\ No newline at end of file
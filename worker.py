@@ -0,0 +1,168 @@
+"""
+Worker chạy job trong hàng đợi (Step 2 / Step 3 được xếp từ giao diện).
+
+VD:
+    python worker.py                                  # dùng mọi profile, chạy mãi
+    python worker.py --profiles a.json b.json --name may-1
+    python worker.py --once                           # hết việc thì thoát (cron)
+
+Nhiều worker chạy song song -> nên chia mỗi worker 1 nhóm profile riêng (--profiles),
+job chỉ được chạy trên các profile đã chọn lúc xếp hàng.
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import threading
+
+from config.settings import PROFILES_DIR, JOB_LEASE_SECONDS, JOB_POLL_SECONDS
+from services.batch_scheduler import PromptBatchScheduler, VisualBatchScheduler
+from utils.job_queue import JOB_QUEUE
+from utils.profiles_setup import get_available_profiles
+from utils.driver_pool import DRIVER_POOL
+from utils.pacing import set_pacing_profile
+from utils.progress import ThrottledListener, describe
+
+# Bước -> scheduler (params của job chính là tham số của scheduler)
+SCHEDULERS = {2: PromptBatchScheduler, 3: VisualBatchScheduler}
+# Trạng thái file của scheduler -> trạng thái task trong hàng đợi
+TASK_STATUS = {"success": "done", "partial": "partial"}
+STATUS_ICONS = {"done": "✅", "partial": "⚠️"}
+
+def _log(msg):
+    print(f"[Worker] {msg}", flush=True)
+
+class Heartbeat(threading.Thread):
+    """
+    Gia hạn thuê các task đang chạy (mỗi 1/3 thời hạn) tới khi dừng.
+    Task không còn thuộc worker này (hết hạn thuê, worker khác đã nhận / job bị hủy)
+    -> bỏ khỏi danh sách, gọi on_lost(ids) để ngừng chạy các file đó.
+    """
+    def __init__(self, worker, task_ids, on_lost=None):
+        super().__init__(daemon=True)
+        self.worker = worker
+        self.task_ids = set(task_ids)
+        self.on_lost = on_lost
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(max(1, JOB_LEASE_SECONDS / 3)):
+            with self._lock: held = set(self.task_ids)
+            try:
+                owned = JOB_QUEUE.heartbeat(self.worker, list(held))
+            except Exception as e:
+                _log(f"⚠️ Không gia hạn được task: {e}")
+                continue
+            with self._lock:
+                lost = (held - owned) & self.task_ids
+                self.task_ids -= lost
+            if lost:
+                _log(f"⚠️ Mất quyền thuê {len(lost)} task -> ngừng chạy các file đó")
+                if self.on_lost: self.on_lost(lost)
+
+    def owns(self, task_id):
+        with self._lock: return task_id in self.task_ids
+
+    def held(self):
+        with self._lock: return list(self.task_ids)
+
+    def done(self, task_id):
+        with self._lock: self.task_ids.discard(task_id)
+
+    def stop(self):
+        self._stop_event.set()
+
+def run_job(worker, job, tasks, allowed_profiles):
+    """Chạy 1 lô task của 1 job bằng đúng scheduler của giao diện"""
+    step = job["step"]
+    params = dict(job["params"])
+    dir_output = params.pop("dir_output")
+    pacing = params.pop("pacing", None)
+    if pacing: set_pacing_profile(pacing)
+    names = job["profiles"] or allowed_profiles
+    profile_paths = [os.path.join(PROFILES_DIR, n) for n in names]
+
+    by_name = {t["name"]: t for t in tasks}
+    by_id = {t["id"]: t for t in tasks}
+    files = [{"name": t["name"], "path": t["path"]} for t in tasks]
+    _log(f"▶️ Job #{job['id']} ({job['project']} - Step {step}): {len(files)} file, {len(profile_paths)} profile")
+
+    scheduler = None
+    def abandon(lost):
+        # Worker khác đã nhận lại task -> không chạy trùng, không ghi đè kết quả của họ
+        if scheduler is not None: scheduler.abandon({by_id[i]["name"] for i in lost})
+
+    beat = Heartbeat(worker, list(by_id), on_lost=abandon)
+    beat.start()
+    try:
+        scheduler = SCHEDULERS[step](files, profile_paths, dir_output, **params)
+
+        def report(snap):
+            # Tiến độ trong file -> DB, giao diện đọc lại (% chunk / cảnh, tốc độ, ETA, lượt thử)
+            task = by_name.get(snap["file"])
+            if task is None or not beat.owns(task["id"]): return
+            try:
+                JOB_QUEUE.progress(task["id"], worker, describe(snap), snap)
+            except Exception as e:
+                _log(f"⚠️ Không ghi được tiến độ: {e}")
+        scheduler.progress.subscribe(ThrottledListener(report))
+        for data in scheduler.run():
+            task = by_name.get(data["file"])
+            if task is None or not beat.owns(task["id"]): continue
+            status = TASK_STATUS.get(data["status"], "failed")
+            beat.done(task["id"])
+            if not JOB_QUEUE.complete(task["id"], worker, status, data["msg"], {k: v for k, v in data.items() if k != "path"}):
+                _log(f"⚠️ {data['file']}: task đã thuộc worker khác -> bỏ kết quả")
+                continue
+            _log(f"{STATUS_ICONS.get(status, '❌')} {data['file']} ({data.get('profile', '-')}) - {data['msg']}")
+        # File không có kết quả (không nên xảy ra) -> thất bại để không treo job
+        for task_id in beat.held():
+            JOB_QUEUE.complete(task_id, worker, "failed", "Không có kết quả")
+        if step == 3: _log(f"🗃️ Kho ảnh: {scheduler.image_summary()}")
+    except BaseException as e:
+        # Lỗi / Ctrl+C giữa chừng -> trả task về hàng đợi (đếm 1 lượt thử)
+        msg = "Worker dừng" if isinstance(e, KeyboardInterrupt) else str(e)
+        for task_id in beat.held():
+            JOB_QUEUE.release(task_id, worker, msg)
+        if not isinstance(e, Exception): raise
+        _log(f"❌ Job #{job['id']}: {e}")
+    finally:
+        beat.stop()
+
+def _stop_on_sigterm(signum, frame):
+    # systemd / kill -> dừng như Ctrl+C: trả task đang chạy về hàng đợi, tắt mọi trình duyệt (kể cả đang chạy)
+    raise KeyboardInterrupt
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lấy task từ hàng đợi job và chạy (Step 2 / Step 3).")
+    parser.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}", help="Tên worker (hiện trên giao diện)")
+    parser.add_argument("--profiles", nargs="+", help="Profile worker này được dùng (mặc định: tất cả)")
+    parser.add_argument("--batch", type=int, default=20, help="Số file tối đa thuê 1 lần (cùng 1 job)")
+    parser.add_argument("--poll", type=float, default=JOB_POLL_SECONDS, help="Hàng đợi rỗng -> chờ N giây rồi hỏi lại")
+    parser.add_argument("--once", action="store_true", help="Hết việc thì thoát")
+    args = parser.parse_args(argv)
+
+    allowed = args.profiles or get_available_profiles()
+    if not allowed:
+        parser.error(f"Không có profile nào trong {PROFILES_DIR}")
+    signal.signal(signal.SIGTERM, _stop_on_sigterm)
+    _log(f"🚀 {args.name}: {len(allowed)} profile, chờ việc...")
+    try:
+        while True:
+            job, tasks = JOB_QUEUE.lease(args.name, args.batch, allowed)
+            if job is None:
+                if args.once: break
+                time.sleep(args.poll)
+                continue
+            run_job(args.name, job, tasks, allowed)
+    except KeyboardInterrupt:
+        _log("🛑 Dừng worker.")
+    finally:
+        DRIVER_POOL.shutdown(include_busy=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())